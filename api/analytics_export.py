@@ -0,0 +1,175 @@
+"""
+Xuất dữ liệu dạng cột (Parquet / Arrow IPC) cho phân tích offline (DuckDB, pandas...).
+
+Bảng: orders, line_items (gồm cả đơn đã lưu trữ, đọc qua HoaDonTatCa / ChiTietHoaDonTatCa), products, customers.
+- Đọc bằng values_list().iterator(chunk_size) và ghi mỗi lô thành 1 row group / record batch
+  -> bộ nhớ chỉ giữ 1 lô, không dựng toàn bộ bảng
+- Xuất tăng dần theo ngay_cap_nhat của hóa đơn: [since, until) với until = thời điểm bắt đầu xuất;
+  lần sau dùng until của lần trước làm since. Đơn đổi trạng thái sẽ xuất hiện lại ở lần sau
+  -> khi gộp các file, giữ dòng có ngay_cap_nhat mới nhất theo id
+- products / customers không có cột thời gian cập nhật nên luôn xuất toàn bộ (bảng nhỏ)
+Tiền (DECIMAL không số lẻ) ghi dạng int64, thời gian dạng timestamp[us, UTC].
+
+Dùng qua `python manage.py export_analytics` hoặc GET /api/thong-ke/export/ (chủ shop).
+pyarrow chỉ được import khi xuất (không load lúc boot).
+"""
+import io
+
+from .models import ChiTietHoaDonTatCa, HoaDonTatCa, KhachHang, TuiXach
+
+DINH_DANG = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+}
+
+# Tên cột -> kiểu: int / tien / str / time / bool
+COT = {
+    'orders': (
+        ('id', 'int'), ('ma_hoa_don', 'str'), ('khach_hang_id', 'int'), ('nhan_vien_id', 'int'),
+        ('loai_hoa_don', 'str'), ('trang_thai', 'str'), ('phuong_thuc_tt', 'str'),
+        ('ho_ten_nguoi_nhan', 'str'), ('sdt_nguoi_nhan', 'str'), ('dia_chi_giao_hang', 'str'),
+        ('tong_tien_hang', 'tien'), ('giam_gia', 'tien'), ('thanh_tien', 'tien'), ('ghi_chu', 'str'),
+        ('ngay_tao', 'time'), ('ngay_cap_nhat', 'time'), ('so_san_pham', 'int'), ('luu_tru', 'bool'),
+    ),
+    'line_items': (
+        ('id', 'int'), ('hoa_don_id', 'int'), ('tui_xach_id', 'int'), ('so_luong', 'int'),
+        ('don_gia_luc_ban', 'tien'), ('ten_san_pham', 'str'), ('ngay_tao', 'time'), ('trang_thai', 'str'),
+    ),
+    'products': (
+        ('id', 'int'), ('danh_muc_id', 'int'), ('danh_muc', 'str'), ('ten_tui', 'str'),
+        ('mo_ta', 'str'), ('gia_tien', 'tien'), ('so_luong_ton', 'int'), ('da_ban', 'int'),
+        ('hinh_anh', 'str'), ('ngay_tao', 'time'),
+    ),
+    'customers': (
+        ('id', 'int'), ('user_id', 'int'), ('ho_ten', 'str'), ('so_dien_thoai', 'str'),
+        ('sdt_chuan_hoa', 'str'), ('email', 'str'), ('dia_chi', 'str'), ('tong_chi_tieu', 'tien'),
+        ('ngay_tham_gia', 'time'),
+    ),
+}
+BANG = tuple(COT)
+# Cột lấy qua quan hệ: tên cột xuất -> đường dẫn field cho values_list()
+NGUON = {
+    'products': {'danh_muc': 'danh_muc__ten_danh_muc'},
+}
+# Bảng xuất được theo ngay_cap_nhat (các bảng còn lại luôn xuất toàn bộ)
+BANG_TANG_DAN = ('orders', 'line_items')
+
+
+def _queryset(bang, since=None, until=None):
+    if bang in ('orders', 'line_items'):
+        don = HoaDonTatCa.objects.all()
+        if since is not None:
+            don = don.filter(ngay_cap_nhat__gte=since)
+        if until is not None:
+            don = don.filter(ngay_cap_nhat__lt=until)
+        if bang == 'orders':
+            return don
+        qs = ChiTietHoaDonTatCa.objects.all()
+        if since is not None or until is not None:
+            qs = qs.filter(hoa_don_id__in=don.values('id'))
+        return qs
+    if bang == 'products':
+        return TuiXach.objects.all()
+    return KhachHang.objects.all()
+
+
+def _schema(bang):
+    import pyarrow as pa
+
+    kieu = {
+        'int': pa.int64(), 'tien': pa.int64(), 'str': pa.string(),
+        'time': pa.timestamp('us', tz='UTC'), 'bool': pa.bool_(),
+    }
+    return pa.schema([pa.field(ten, kieu[k]) for ten, k in COT[bang]])
+
+
+def _record_batch(bang, schema, rows):
+    import pyarrow as pa
+
+    cot = list(zip(*rows))
+    arrays = []
+    for i, (_, k) in enumerate(COT[bang]):
+        gia_tri = cot[i]
+        if k == 'tien':
+            gia_tri = [None if v is None else int(v) for v in gia_tri]
+        arrays.append(pa.array(gia_tri, type=schema.field(i).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def cac_lo(bang, since=None, until=None, batch_size=10000):
+    """ Sinh từng lô dòng (list tuple theo COT[bang]) của bảng, đọc bằng iterator """
+    nguon = NGUON.get(bang, {})
+    ten_cot = [nguon.get(ten, ten) for ten, _ in COT[bang]]
+    rows = _queryset(bang, since, until).order_by().values_list(*ten_cot).iterator(chunk_size=batch_size)
+    lo = []
+    for row in rows:
+        lo.append(row)
+        if len(lo) >= batch_size:
+            yield lo
+            lo = []
+    if lo:
+        yield lo
+
+
+class _BoDem(io.RawIOBase):
+    """ Sink chỉ ghi: giữ các chunk đã ghi cho tới khi được lấy ra (stream HTTP từng phần) """
+
+    def __init__(self):
+        self._chunks = []
+        self._vi_tri = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._vi_tri += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._vi_tri
+
+    def lay_ra(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _ghi_tung_lo(bang, sink, dinh_dang, since, until, batch_size):
+    """ Ghi bảng vào sink, yield số dòng của mỗi lô ngay sau khi lô đó được ghi. Đóng writer khi xong """
+    import pyarrow as pa
+
+    schema = _schema(bang)
+    if dinh_dang == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(sink, schema)
+    try:
+        for lo in cac_lo(bang, since, until, batch_size):
+            batch = _record_batch(bang, schema, lo)
+            if dinh_dang == 'parquet':
+                writer.write_batch(batch, row_group_size=len(lo))  # 1 lô = 1 row group
+            else:
+                writer.write_batch(batch)
+            yield len(lo)
+    finally:
+        writer.close()
+
+
+def ghi(bang, sink, dinh_dang='parquet', since=None, until=None, batch_size=10000):
+    """ Ghi bảng vào sink (path hoặc file object). Trả về số dòng """
+    return sum(_ghi_tung_lo(bang, sink, dinh_dang, since, until, batch_size))
+
+
+def stream(bang, dinh_dang='parquet', since=None, until=None, batch_size=10000):
+    """ Generator bytes cho StreamingHttpResponse: nhả phần đã ghi sau mỗi lô (và footer khi đóng) """
+    import pyarrow as pa
+
+    bo_dem = _BoDem()
+    for _ in _ghi_tung_lo(bang, pa.PythonFile(bo_dem, mode='w'), dinh_dang, since, until, batch_size):
+        data = bo_dem.lay_ra()
+        if data:
+            yield data
+    yield bo_dem.lay_ra()
+
@@ -0,0 +1,112 @@
+"""
+Lưu trữ đơn hàng cũ: chuyển đơn đã đóng (HOAN_THANH / DA_HUY) quá ORDER_ARCHIVE_MONTHS tháng
+từ HoaDon/ChiTietHoaDon sang HoaDonLuuTru/ChiTietHoaDonLuuTru (lệnh `python manage.py archive_orders`).
+
+- Bảng HoaDon chỉ còn đơn gần đây + đơn đang xử lý -> danh sách đơn admin, lọc của nhân viên,
+  dashboard (hôm nay / tháng này / 7 ngày) chỉ quét bảng nhỏ
+- Bảng lưu trữ chia partition theo tháng (MySQL): báo cáo theo khoảng ngày chỉ đọc các partition liên quan
+- Báo cáo / lịch sử mua hàng đọc qua HoaDonTatCa / ChiTietHoaDonTatCa (VIEW UNION ALL cả 2 nơi)
+
+Bộ đếm doanh số (TuiXach.da_ban, DoanhSoSanPhamNgay) không đổi khi lưu trữ; rebuild_sales_counters đọc qua VIEW gộp.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ChiTietHoaDon, ChiTietHoaDonLuuTru, HoaDon, HoaDonLuuTru
+
+TRANG_THAI_DONG = ('HOAN_THANH', 'DA_HUY')
+BANG_PARTITION = ('api_hoadonluutru', 'api_chitiethoadonluutru')
+COT_HOA_DON = [f.attname for f in HoaDonLuuTru._meta.concrete_fields]  # Cùng tên cột với HoaDon
+COT_CHI_TIET = ['id', 'hoa_don_id', 'tui_xach_id', 'so_luong', 'don_gia_luc_ban', 'ten_san_pham', 'anh_san_pham']
+
+
+def _thang_sau(d):
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def moc_luu_tru(months, now=None):
+    """ Đầu tháng cách tháng hiện tại `months` tháng: đơn tạo trước mốc này mới được lưu trữ """
+    now = timezone.localtime(now)
+    thang = now.year * 12 + now.month - 1 - months
+    return now.replace(year=thang // 12, month=thang % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def don_can_luu_tru(moc):
+    return HoaDon.objects.filter(trang_thai__in=TRANG_THAI_DONG, ngay_tao__lt=moc)
+
+
+# =========================================================
+# PARTITION THEO THÁNG (MYSQL)
+# =========================================================
+def _bien_partition(table):
+    """ Cận trên (ngày) của các partition theo tháng hiện có, tăng dần (bỏ p_max) """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [table],
+        )
+        bien = []
+        for (desc,) in cursor.fetchall():
+            if desc and desc != 'MAXVALUE':
+                bien.append(date.fromisoformat(desc.strip("'")[:10]))
+        return bien
+
+
+def dam_bao_partition(tu, den):
+    """
+    Tách p_max thành partition từng tháng sao cho có partition cho mọi tháng trong [tu, den).
+    Dữ liệu lưu trữ luôn cũ hơn mốc nên p_max gần như rỗng -> REORGANIZE rẻ. Không phải MySQL thì bỏ qua.
+    Trả về số partition đã tạo.
+    """
+    if connection.vendor != 'mysql':
+        return 0
+    den = date(den.year, den.month, 1)
+    tao = 0
+    for table in BANG_PARTITION:
+        bien = _bien_partition(table)
+        # Tháng đầu tiên chưa có partition riêng (partition đầu tiên chứa luôn mọi dữ liệu cũ hơn)
+        thang = bien[-1] if bien else date(tu.year, tu.month, 1)
+        moi = []
+        while thang < den:
+            moi.append(thang)
+            thang = _thang_sau(thang)
+        if not moi:
+            continue
+        dinh_nghia = ", ".join(
+            f"PARTITION p{m.strftime('%Y%m')} VALUES LESS THAN ('{_thang_sau(m).isoformat()}')" for m in moi
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {table} REORGANIZE PARTITION p_max INTO "
+                f"({dinh_nghia}, PARTITION p_max VALUES LESS THAN (MAXVALUE))"
+            )
+        tao += len(moi)
+    return tao
+
+
+# =========================================================
+# CHUYỂN DỮ LIỆU
+# =========================================================
+def luu_tru_lo(moc, batch_size=500):
+    """ Chuyển 1 lô đơn (tối đa batch_size) sang bảng lưu trữ trong 1 transaction. Trả về (số đơn, số dòng chi tiết) """
+    ids = list(don_can_luu_tru(moc).order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return 0, 0
+    with transaction.atomic():
+        # Khóa + đọc lại: đơn có thể vừa đổi trạng thái giữa 2 câu lệnh
+        rows = list(don_can_luu_tru(moc).filter(id__in=ids).select_for_update().values(*COT_HOA_DON))
+        ids = [r['id'] for r in rows]
+        ngay_tao = {r['id']: r['ngay_tao'] for r in rows}
+        chi_tiet = list(ChiTietHoaDon.objects.filter(hoa_don_id__in=ids).values(*COT_CHI_TIET))
+
+        HoaDonLuuTru.objects.bulk_create([HoaDonLuuTru(**r) for r in rows])
+        ChiTietHoaDonLuuTru.objects.bulk_create(
+            [ChiTietHoaDonLuuTru(ngay_tao=ngay_tao[c['hoa_don_id']], **c) for c in chi_tiet]
+        )
+        ChiTietHoaDon.objects.filter(hoa_don_id__in=ids).delete()
+        HoaDon.objects.filter(id__in=ids).delete()
+    return len(rows), len(chi_tiet)
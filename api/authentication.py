@@ -0,0 +1,127 @@
+"""
+Xác thực JWT không cần query bảng auth_user ở mỗi request.
+
+MyTokenSerializer ký sẵn is_staff / is_superuser / khach_hang_id vào access token.
+StatelessJWTAuthentication dựng request.user từ các claim đó (LazyTokenUser):
+- Kiểm tra quyền (IsOwnerUser, IsStaffOrOwner, IsAuthenticated) chỉ đọc claim -> 0 query
+- Code nào cần User đầy đủ (username, email, gán FK...) thì User mới được load (1 query)
+
+Kiểm tra thu hồi (revocation) qua cache, TTL ngắn (JWT_REVOCATION_CHECK_TTL):
+- User bị khóa/xóa hoặc đổi quyền -> token cũ bị từ chối
+- Access token đã logout (jti nằm trong danh sách thu hồi) -> bị từ chối
+Logout ghi thu hồi vào cache và vào bảng blacklist (DB). Cache riêng từng process (không đặt REDIS_URL,
+vd web và events chạy riêng): process khác không thấy key trong cache -> hỏi DB, nhớ kết quả "chưa thu hồi"
+JWT_REVOCATION_CHECK_TTL giây -> logout có hiệu lực ở mọi process chậm nhất sau chừng đó thời gian.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import caching
+
+ROLE_CLAIMS = ('is_staff', 'is_superuser')
+
+
+def _status_key(user_id):
+    return f"auth:status:{user_id}"
+
+
+def _revoked_key(jti):
+    return f"auth:revoked:{jti}"
+
+
+def _checked_key(jti):
+    return f"auth:checked:{jti}"
+
+
+def xoa_cache_trang_thai(user_id):
+    """ Gọi khi User đổi is_active/is_staff/is_superuser (signals.py) """
+    cache.delete(_status_key(user_id))
+
+
+def thu_hoi_access_token(token):
+    """ Đánh dấu access token đã bị thu hồi (logout) tới khi nó hết hạn """
+    jti = token.get(api_settings.JTI_CLAIM)
+    exp = token.get('exp')
+    if jti and exp:
+        ttl = max(1, int(exp - timezone.now().timestamp()))
+        cache.set(_revoked_key(jti), True, ttl)
+        # Ghi cả DB: process có cache riêng không thấy key trên (xem _kiem_tra_thu_hoi)
+        outstanding, _ = OutstandingToken.objects.get_or_create(jti=jti, defaults={
+            'user_id': token.get(api_settings.USER_ID_CLAIM), 'token': str(token),
+            'expires_at': datetime.fromtimestamp(exp, tz=dt_timezone.utc),
+        })
+        BlacklistedToken.objects.get_or_create(token=outstanding)
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """ User dựng từ claim của token. id/quyền đọc từ claim, các field khác load User khi cần """
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: User.objects.get(pk=user_id))
+        # Ghi thẳng vào __dict__: setattr của LazyObject sẽ load User
+        self.__dict__['_claims'] = {
+            'id': user_id,
+            'is_staff': bool(token.get('is_staff')),
+            'is_superuser': bool(token.get('is_superuser')),
+        }
+
+    id = property(lambda self: self.__dict__['_claims']['id'])
+    pk = id
+    is_staff = property(lambda self: self.__dict__['_claims']['is_staff'])
+    is_superuser = property(lambda self: self.__dict__['_claims']['is_superuser'])
+    is_active = property(lambda self: True)  # Đã kiểm tra ở bước revocation
+    is_authenticated = property(lambda self: True)
+    is_anonymous = property(lambda self: False)
+
+    def __bool__(self):
+        return True
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """ Bật/tắt bằng JWT_STATELESS_AUTH (False -> hành vi gốc: load auth_user mỗi request) """
+
+    def get_user(self, validated_token):
+        if not getattr(settings, 'JWT_STATELESS_AUTH', True) or not all(c in validated_token for c in ROLE_CLAIMS):
+            # Token cũ (phát hành trước khi có claim quyền) -> đi đường cũ
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        self._kiem_tra_thu_hoi(validated_token, user_id)
+        return LazyTokenUser(validated_token)
+
+    def _kiem_tra_thu_hoi(self, token, user_id):
+        jti = token.get(api_settings.JTI_CLAIM)
+        status_key = _status_key(user_id)
+        revoked_key = _revoked_key(jti)
+        checked_key = _checked_key(jti)
+        found = cache.get_many([status_key, revoked_key, checked_key])
+        if found.get(revoked_key):
+            raise AuthenticationFailed("Token đã bị thu hồi.", code='token_revoked')
+        if not caching.cache_dung_chung() and not found.get(checked_key):
+            # Cache riêng từng process: logout ở process khác chỉ DB biết
+            if BlacklistedToken.objects.filter(token__jti=jti).exists():
+                cache.set(revoked_key, True, max(1, int(token['exp'] - timezone.now().timestamp())))
+                raise AuthenticationFailed("Token đã bị thu hồi.", code='token_revoked')
+            cache.set(checked_key, True, getattr(settings, 'JWT_REVOCATION_CHECK_TTL', 30))
+
+        status = found.get(status_key)
+        if status is None:
+            row = User.objects.filter(pk=user_id).values_list('is_active', 'is_staff', 'is_superuser').first()
+            status = row or (False, False, False)
+            cache.set(status_key, status, getattr(settings, 'JWT_REVOCATION_CHECK_TTL', 30))
+
+        is_active, is_staff, is_superuser = status
+        if not is_active:
+            raise AuthenticationFailed("Tài khoản không tồn tại hoặc đã bị khóa.", code='user_inactive')
+        if bool(token.get('is_staff')) != is_staff or bool(token.get('is_superuser')) != is_superuser:
+            raise AuthenticationFailed("Quyền tài khoản đã thay đổi, vui lòng đăng nhập lại.", code='role_changed')
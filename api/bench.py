@@ -0,0 +1,269 @@
+"""
+Bộ benchmark cho API (chạy in-process bằng APIClient, không cần server).
+
+- Dữ liệu: sinh bằng `python manage.py seed_bench --orders 1000000`
+- Chạy:    `python manage.py run_bench --requests 200 --out bench_results.json`
+- So sánh: `python manage.py run_bench --compare bench_results.json`
+
+Google Drive luôn được giả lập trong lúc chạy nên không cần token.json.
+"""
+import json
+import math
+import platform
+import random
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from unittest import mock
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import DanhMuc, TuiXach, KhachHang
+
+FAKE_DRIVE_LINK = 'https://drive.google.com/file/d/bench-fake/view?usp=drivesdk'
+
+
+def fake_drive():
+    """ Thay các hàm Drive bằng bản giả (trả link cố định, không gọi mạng) """
+    stack = ExitStack()
+    for target in ('api.drive_service.upload_file_to_drive', 'api.views.upload_file_to_drive'):
+        stack.enter_context(mock.patch(target, return_value=FAKE_DRIVE_LINK))
+    for target in ('api.drive_service.delete_file_from_drive', 'api.views.delete_file_from_drive'):
+        stack.enter_context(mock.patch(target, return_value=True))
+    return stack
+
+
+def percentile(values, p):
+    """ Phân vị theo nearest-rank (p: 0-100) """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[k]
+
+
+def client_for(user):
+    """ APIClient đăng nhập bằng JWT thật (đi qua toàn bộ tầng authentication) """
+    from .serializers import MyTokenSerializer
+    client = APIClient()
+    if user is not None:
+        token = MyTokenSerializer.get_token(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+# =========================================================
+# KỊCH BẢN (SCENARIOS)
+# =========================================================
+class Scenario:
+    """ Mỗi kịch bản: setup() chuẩn bị client/dữ liệu, call() gửi 1 request """
+    name = None
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def setup(self):
+        pass
+
+    def call(self):
+        raise NotImplementedError
+
+
+class CatalogBrowse(Scenario):
+    """ Khách vãng lai: xem danh mục, lọc/sắp xếp sản phẩm, xem chi tiết """
+    name = 'catalog_browse'
+
+    def setup(self):
+        self.client = client_for(None)
+        self.danh_muc = list(DanhMuc.objects.values_list('id', flat=True))
+        self.products = list(TuiXach.objects.filter(so_luong_ton__gt=0).values_list('id', flat=True)[:2000])
+
+    def call(self):
+        r = self.rng.random()
+        if r < 0.2:
+            return self.client.get('/api/categories/')
+        if r < 0.7 and self.danh_muc:
+            return self.client.get('/api/products/', {
+                'danh_muc': self.rng.choice(self.danh_muc),
+                'ordering': self.rng.choice(['gia_tien', '-gia_tien', '-ngay_tao']),
+            })
+        return self.client.get(f"/api/products/{self.rng.choice(self.products)}/")
+
+
+class Checkout(Scenario):
+    """ Khách có tài khoản đặt đơn online (POST /api/my-orders/) """
+    name = 'checkout'
+
+    def setup(self):
+        khach = KhachHang.objects.filter(user__isnull=False).select_related('user').first()
+        self.client = client_for(khach.user)
+        self.products = list(TuiXach.objects.filter(so_luong_ton__gte=1000).values_list('id', flat=True)[:500])
+
+    def call(self):
+        items = [{'id': pid, 'quantity': 1} for pid in self.rng.sample(self.products, k=self.rng.randint(1, 3))]
+        return self.client.post('/api/my-orders/', {
+            'cart_items': items, 'payment_method': 'COD', 'ghi_chu': 'bench',
+        }, format='json')
+
+
+class MyOrders(Scenario):
+    """ Khách xem lịch sử đơn hàng và chi tiết 1 đơn """
+    name = 'my_orders'
+
+    def setup(self):
+        khach = KhachHang.objects.filter(user__isnull=False, hoadon__isnull=False).select_related('user').first()
+        self.client = client_for(khach.user)
+        self.orders = list(khach.hoadon_set.values_list('id', flat=True)[:50])
+
+    def call(self):
+        if self.rng.random() < 0.5:
+            return self.client.get('/api/my-orders/')
+        return self.client.get(f"/api/my-orders/{self.rng.choice(self.orders)}/")
+
+
+class PosOrder(Scenario):
+    """ Nhân viên tạo đơn tại quầy, kèm khách mới/khách cũ theo SĐT """
+    name = 'pos_order'
+
+    def setup(self):
+        self.client = client_for(User.objects.get(username='bench_staff'))
+        self.products = list(TuiXach.objects.filter(so_luong_ton__gte=1000).values_list('id', flat=True)[:500])
+
+    def call(self):
+        items = [{'id': pid, 'quantity': 1} for pid in self.rng.sample(self.products, k=self.rng.randint(1, 3))]
+        return self.client.post('/api/quan-ly-don-hang/', {
+            'cart_items': items,
+            'ho_ten_moi': 'Khách Bench',
+            'sdt_moi': f"09{self.rng.randrange(10 ** 8):08d}",
+        }, format='json')
+
+
+class Dashboard(Scenario):
+    """ Chủ cửa hàng mở trang tổng quan """
+    name = 'dashboard'
+
+    def setup(self):
+        self.client = client_for(User.objects.get(username='bench_owner'))
+
+    def call(self):
+        if self.rng.random() < 0.7:
+            return self.client.get('/api/dashboard/summary/')
+        return self.client.get('/api/thong-ke-don-hang/')
+
+
+class ReportExport(Scenario):
+    """ Xuất dữ liệu báo cáo 30 ngày gần nhất """
+    name = 'report_export'
+
+    def setup(self):
+        self.client = client_for(User.objects.get(username='bench_owner'))
+        today = timezone.now().date()
+        self.params = {
+            'from_date': (today - timedelta(days=30)).isoformat(),
+            'to_date': today.isoformat(),
+        }
+
+    def call(self):
+        return self.client.get('/api/thong-ke/du_lieu_xuat_excel/', self.params)
+
+
+class AuthOnly(Scenario):
+    """ Endpoint gần như không làm gì ngoài xác thực + kiểm tra quyền -> đo riêng chi phí tầng auth """
+    name = 'auth'
+
+    def setup(self):
+        self.client = client_for(User.objects.get(username='bench_owner'))
+
+    def call(self):
+        return self.client.get('/api/perf/histograms/')
+
+
+SCENARIOS = {cls.name: cls for cls in (CatalogBrowse, Checkout, MyOrders, PosOrder, Dashboard, ReportExport, AuthOnly)}
+
+
+# =========================================================
+# CHẠY & GHI KẾT QUẢ
+# =========================================================
+def run_scenario(scenario, requests, warmup=5):
+    scenario.setup()
+    for _ in range(warmup):
+        scenario.call()
+
+    latencies, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        # queries_log giới hạn 9000 dòng: đầy rồi thì CaptureQueriesContext đếm ra 0
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            t0 = time.perf_counter()
+            response = scenario.call()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        queries.append(len(ctx.captured_queries))
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'queries_p50': percentile(queries, 50),
+        'queries_max': max(queries),
+        'throughput_rps': round(requests / elapsed, 1),
+    }
+
+
+def run_suite(names, requests, seed=42, warmup=5, auth_mode='stateless'):
+    """ auth_mode: 'stateless' (đọc quyền từ claim) | 'db' (load auth_user mỗi request như trước) """
+    rng = random.Random(seed)
+    results = {}
+    with fake_drive(), override_settings(JWT_STATELESS_AUTH=(auth_mode == 'stateless')):
+        for name in names:
+            results[name] = run_scenario(SCENARIOS[name](rng), requests, warmup)
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'db_vendor': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'requests_per_scenario': requests,
+            'auth_mode': auth_mode,
+        },
+        'scenarios': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.2):
+    """
+    So sánh với file baseline. Trả về danh sách các dòng regression:
+    - p95 chậm hơn quá `tolerance` (mặc định 20%)
+    - Số query mỗi request tăng lên
+    """
+    regressions = []
+    for name, cur in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        if base['p95_ms'] and cur['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if cur['queries_max'] > base['queries_max']:
+            regressions.append(f"{name}: queries/request {base['queries_max']} -> {cur['queries_max']}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
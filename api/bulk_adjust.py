@@ -0,0 +1,77 @@
+"""
+Điều chỉnh giá / tồn kho hàng loạt (đổi giá theo đợt, kiểm kê kho).
+
+Cả lô chạy trong 1 transaction: khóa các dòng (select_for_update), tính giá trị mới, ghi bằng
+bulk_update (UPDATE ... SET col = CASE id WHEN ... END theo lô) thay vì 1 lần save()/serializer mỗi dòng.
+Lỗi ở bất kỳ dòng nào (id không tồn tại, tồn kho âm) -> không ghi dòng nào.
+Cache phụ thuộc sản phẩm được làm mới 1 lần sau khi commit (caching.tang_phien_ban_san_pham).
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from . import caching
+from .models import TuiXach
+from .serializers import DieuChinhTuiXachSerializer
+
+BATCH_SIZE = 500
+
+
+def kiem_tra(data):
+    """ Body {"items": [...]} -> list dòng hợp lệ, lỗi -> serializers.ValidationError (HTTP 400) """
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise serializers.ValidationError({'items': ["Cần danh sách items."]})
+    toi_da = getattr(settings, 'BULK_ADJUST_MAX_ITEMS', 5000)
+    if len(items) > toi_da:
+        raise serializers.ValidationError({'items': [f"Tối đa {toi_da} dòng mỗi lần."]})
+
+    serializer = DieuChinhTuiXachSerializer(data=items, many=True)
+    serializer.is_valid(raise_exception=True)
+    rows = serializer.validated_data
+    trung = sorted(i for i, n in Counter(r['id'] for r in rows).items() if n > 1)
+    if trung:
+        raise serializers.ValidationError({'items': [f"Trùng id: {trung}"]})
+    return rows
+
+
+def dieu_chinh(rows, dry_run=False):
+    """ Áp dụng các dòng đã kiểm tra. Trả về {'so_dong', 'thay_doi', 'diff': [...]} """
+    with transaction.atomic():
+        hien_tai = TuiXach.objects.select_for_update().only('id', 'ten_tui', 'gia_tien', 'so_luong_ton').in_bulk(
+            [r['id'] for r in rows]
+        )
+        thieu = [r['id'] for r in rows if r['id'] not in hien_tai]
+        if thieu:
+            raise serializers.ValidationError({'items': [f"Không có sản phẩm id: {thieu}"]})
+
+        loi, diff, doi = [], [], []
+        for r in rows:
+            tui = hien_tai[r['id']]
+            moi = {}
+            if 'gia_tien' in r and r['gia_tien'] != tui.gia_tien:
+                moi['gia_tien'] = r['gia_tien']
+            ton = r['so_luong_ton'] if 'so_luong_ton' in r else tui.so_luong_ton + r.get('so_luong_ton_delta', 0)
+            if ton < 0:
+                loi.append(f"id {tui.id}: tồn kho sẽ âm ({tui.so_luong_ton} {r['so_luong_ton_delta']:+d})")
+                continue
+            if ton != tui.so_luong_ton:
+                moi['so_luong_ton'] = ton
+            if not moi:
+                continue
+            diff.append({
+                'id': tui.id, 'ten_tui': tui.ten_tui,
+                **{field: {'cu': getattr(tui, field), 'moi': value} for field, value in moi.items()},
+            })
+            for field, value in moi.items():
+                setattr(tui, field, value)
+            doi.append(tui)
+        if loi:
+            raise serializers.ValidationError({'items': loi})
+
+        if doi and not dry_run:
+            TuiXach.objects.bulk_update(doi, ['gia_tien', 'so_luong_ton'], batch_size=BATCH_SIZE)
+            transaction.on_commit(caching.tang_phien_ban_san_pham)
+    return {'so_dong': len(rows), 'thay_doi': len(doi), 'diff': diff}
@@ -0,0 +1,219 @@
+"""
+Nhập sản phẩm hàng loạt: file CSV/XLSX + (tùy chọn) file ZIP chứa ảnh.
+
+Cột: ten_tui, danh_muc (id, slug hoặc tên), gia_tien, so_luong_ton, mo_ta,
+     hinh_anh (tên file trong ZIP hoặc link http sẵn có)
+
+1. Đọc + kiểm tra toàn bộ các dòng trước: có dòng lỗi thì dừng, chưa upload / ghi gì
+2. Upload ảnh lên Drive song song (IMPORT_UPLOAD_WORKERS thread), mỗi ảnh chỉ upload 1 lần
+3. Ghi DB bằng bulk_create theo lô trong 1 transaction
+Dòng có ảnh upload lỗi bị bỏ qua và được báo lại theo số dòng (dòng tiêu đề là dòng 1).
+
+Dùng qua POST /api/tuixach/import/ hoặc `python manage.py import_products`.
+"""
+import csv
+import io
+import mimetypes
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import transaction
+
+from . import caching
+from .drive_service import upload_file_to_drive
+from .models import DanhMuc, TuiXach
+from .serializers import TuiXachImportSerializer
+
+COT = ('ten_tui', 'danh_muc', 'gia_tien', 'so_luong_ton', 'mo_ta', 'hinh_anh')
+
+
+class LoiNhap(Exception):
+    """ File không đọc được hoặc có dòng không hợp lệ; `loi` = [{'dong': n, 'loi': {...}}] """
+
+    def __init__(self, message, loi=None):
+        super().__init__(message)
+        self.loi = loi or []
+
+
+# =========================================================
+# ĐỌC FILE
+# =========================================================
+def _gia_tri(value):
+    # Excel trả số dạng float (1500000.0) -> bỏ phần .0 để DecimalField(decimal_places=0) nhận
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return '' if value is None else str(value).strip()
+
+
+def _doc_csv(data):
+    reader = csv.reader(io.StringIO(data.decode('utf-8-sig')))
+    return list(reader)
+
+
+def _doc_xlsx(f):
+    import openpyxl  # Chỉ cần khi nhập XLSX, không load lúc boot
+
+    wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+    try:
+        return [list(row) for row in wb.active.iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+
+def doc_bang(ten_file, f):
+    """ File CSV/XLSX -> list dict theo tên cột (viết thường), bỏ dòng trống """
+    duoi = os.path.splitext(ten_file)[1].lower()
+    try:
+        if duoi == '.csv':
+            bang = _doc_csv(f.read())
+        elif duoi == '.xlsx':
+            bang = _doc_xlsx(f)
+        else:
+            raise LoiNhap("Chỉ hỗ trợ file .csv hoặc .xlsx.")
+    except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, OSError) as e:
+        raise LoiNhap(f"Không đọc được file {ten_file}: {e}")
+    if not bang:
+        raise LoiNhap("File rỗng.")
+
+    tieu_de = [_gia_tri(c).lower() for c in bang[0]]
+    thieu = [c for c in ('ten_tui', 'danh_muc', 'gia_tien', 'hinh_anh') if c not in tieu_de]
+    if thieu:
+        raise LoiNhap(f"Thiếu cột: {', '.join(thieu)}.")
+    rows = []
+    for so_dong, dong in enumerate(bang[1:], start=2):
+        gia_tri = [_gia_tri(v) for v in dong]
+        if not any(gia_tri):
+            continue
+        # Ô trống = không nhập -> dùng giá trị mặc định của serializer (so_luong_ton=0, mo_ta='')
+        row = {c: v for c, v in zip(tieu_de, gia_tri) if c in COT and v}
+        row['_dong'] = so_dong
+        rows.append(row)
+    return rows
+
+
+# =========================================================
+# KIỂM TRA
+# =========================================================
+def _bang_danh_muc():
+    """ id / slug / tên (viết thường) -> id danh mục, 1 query cho cả file """
+    bang = {}
+    for dm_id, slug, ten in DanhMuc.objects.values_list('id', 'slug', 'ten_danh_muc'):
+        bang[str(dm_id)] = dm_id
+        bang[slug.lower()] = dm_id
+        bang[ten.strip().lower()] = dm_id
+    return bang
+
+
+def kiem_tra(rows, ten_anh=()):
+    """ Trả về list dữ liệu đã chuẩn hóa (kèm '_dong'); có dòng lỗi -> LoiNhap liệt kê mọi dòng lỗi """
+    context = {'danh_muc': _bang_danh_muc(), 'anh': set(ten_anh)}
+    hop_le, loi = [], []
+    for row in rows:
+        serializer = TuiXachImportSerializer(data=row, context=context)
+        if serializer.is_valid():
+            hop_le.append(dict(serializer.validated_data, _dong=row['_dong']))
+        else:
+            loi.append({'dong': row['_dong'], 'loi': serializer.errors})
+    if loi:
+        raise LoiNhap(f"{len(loi)} dòng không hợp lệ, chưa nhập dòng nào.", loi)
+    return hop_le
+
+
+# =========================================================
+# UPLOAD ẢNH
+# =========================================================
+def _upload(zf, ten, so_lan=2):
+    data = zf.read(ten)
+    for lan in range(so_lan):
+        f = io.BytesIO(data)
+        f.name = os.path.basename(ten)
+        f.content_type = mimetypes.guess_type(ten)[0] or 'application/octet-stream'
+        try:
+            link = upload_file_to_drive(f)
+            if link:
+                return link
+        except Exception:
+            if lan == so_lan - 1:
+                raise
+    raise Exception("Không nhận được link từ Drive")
+
+
+def tai_anh(zf, ten_anh, workers=None, tien_do=None):
+    """ Upload các ảnh (mỗi tên 1 lần) bằng thread pool giới hạn. Trả về {tên: link hoặc Exception} """
+    workers = workers or getattr(settings, 'IMPORT_UPLOAD_WORKERS', 8)
+    ket_qua = {}
+    # zipfile tự khóa file khi đọc nên các thread đọc chung 1 ZipFile được; phần chậm (upload HTTPS) chạy song song
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_upload, zf, ten): ten for ten in ten_anh}
+        for future in as_completed(futures):
+            ten = futures[future]
+            try:
+                ket_qua[ten] = future.result()
+            except Exception as e:
+                ket_qua[ten] = e
+            if tien_do:
+                tien_do('anh', ten, ket_qua[ten])
+    return ket_qua
+
+
+# =========================================================
+# NHẬP
+# =========================================================
+def nhap(rows, anh_zip=None, batch_size=500, workers=None, tien_do=None, dry_run=False):
+    """
+    rows: kết quả doc_bang(). anh_zip: file ZIP (path hoặc file object) hoặc None.
+    tien_do(loai, khoa, gia_tri): loai='anh' (tên file, link/lỗi) hoặc 'dong' (số dòng, 'ok'/lỗi)
+    Trả về {'so_dong', 'tao_moi', 'loi': [{'dong', 'loi'}]}
+    """
+    zf = None
+    try:
+        if anh_zip is not None:
+            try:
+                zf = zipfile.ZipFile(anh_zip)
+            except zipfile.BadZipFile:
+                raise LoiNhap("File ảnh không phải ZIP hợp lệ.")
+        # Tên ảnh trong ZIP: cho phép ghi 'ten.jpg' hoặc 'thu_muc/ten.jpg'
+        ten_trong_zip = {}
+        if zf is not None:
+            for ten in zf.namelist():
+                if not ten.endswith('/'):
+                    ten_trong_zip.setdefault(ten, ten)
+                    ten_trong_zip.setdefault(os.path.basename(ten), ten)
+
+        hop_le = kiem_tra(rows, ten_trong_zip)
+        if dry_run:
+            return {'so_dong': len(hop_le), 'tao_moi': 0, 'loi': []}
+
+        can_upload = {ten_trong_zip[r['hinh_anh']] for r in hop_le if not r['hinh_anh'].startswith('http')}
+        links = tai_anh(zf, sorted(can_upload), workers, tien_do) if can_upload else {}
+    finally:
+        if zf is not None:
+            zf.close()
+
+    loi, objs = [], []
+    for r in hop_le:
+        hinh_anh = r['hinh_anh']
+        if not hinh_anh.startswith('http'):
+            hinh_anh = links[ten_trong_zip[hinh_anh]]
+            if isinstance(hinh_anh, Exception):
+                loi.append({'dong': r['_dong'], 'loi': {'hinh_anh': [f"Upload ảnh lỗi: {hinh_anh}"]}})
+                if tien_do:
+                    tien_do('dong', r['_dong'], loi[-1]['loi'])
+                continue
+        objs.append((r['_dong'], TuiXach(
+            danh_muc_id=r['danh_muc'], ten_tui=r['ten_tui'], mo_ta=r['mo_ta'],
+            gia_tien=r['gia_tien'], so_luong_ton=r['so_luong_ton'], hinh_anh=hinh_anh,
+        )))
+
+    with transaction.atomic():
+        for i in range(0, len(objs), batch_size):
+            lo = objs[i:i + batch_size]
+            TuiXach.objects.bulk_create([obj for _, obj in lo])
+            if tien_do:
+                for so_dong, _ in lo:
+                    tien_do('dong', so_dong, 'ok')
+        if objs:
+            transaction.on_commit(caching.tang_phien_ban_san_pham)
+    return {'so_dong': len(hop_le), 'tao_moi': len(objs), 'loi': loi}
@@ -0,0 +1,101 @@
+"""
+Cache dùng chung cho app (backend theo CACHES trong settings: Redis khi đặt REDIS_URL, không thì LocMemCache
+riêng từng process -> xóa/tăng phiên bản ở process này không tới được process khác, xem cache_dung_chung()).
+
+Profile khách hàng: chỉ cache dữ liệu chỉ đọc (id, họ tên, mức giảm giá) theo user_id, tự xóa khi KhachHang
+được lưu/xóa (xem signals.py). Những chỗ cập nhật bằng queryset.update() (không phát signal) phải tự gọi
+xoa_khach_hang(). Sửa hồ sơ / tính tiền luôn đọc dòng mới từ DB, không dùng bản cache.
+Danh mục công khai: cache cả danh sách, tự xóa khi DanhMuc được lưu/xóa.
+Dữ liệu suy ra từ sản phẩm: key kèm phiên bản sản phẩm, tăng khi TuiXach được lưu/xóa
+(signals.py) hoặc 1 lần sau mỗi thao tác hàng loạt (bulk_create / bulk_update không phát signal).
+Báo cáo doanh thu kỳ đã đóng: key kèm phiên bản doanh thu cũ, chỉ tăng khi một đơn của ngày đã qua
+vào/ra trạng thái HOAN_THANH (sales_counters.py).
+"""
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .models import DanhMuc, KhachHang
+
+PROFILE_TTL = 300  # giây
+DANH_MUC_KEY = 'danh_muc:cong_khai'
+DANH_MUC_TTL = 3600
+SAN_PHAM_VERSION_KEY = 'san_pham:phien_ban'
+DOANH_THU_CU_VERSION_KEY = 'doanh_thu_cu:phien_ban'
+_KHONG_CO = 0  # Đánh dấu "user này không có profile" (cache.get trả None nghĩa là chưa cache)
+
+
+def _profile_key(user_id):
+    return f"khach_hang:user:{user_id}"
+
+
+def cache_dung_chung():
+    """ True nếu cache default dùng chung giữa các process (Redis/Memcached/DB), False với LocMem/Dummy """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def lay_khach_hang(user_id):
+    """ Hồ sơ khách của user dạng chỉ đọc {'id', 'ho_ten', 'muc_giam_gia'} (hoặc None), đọc từ cache trước """
+    if user_id is None:
+        return None
+    key = _profile_key(user_id)
+    khach = cache.get(key)
+    if khach is None:
+        obj = KhachHang.objects.only('id', 'ho_ten', 'tong_chi_tieu').filter(user_id=user_id).first()
+        khach = {'id': obj.id, 'ho_ten': obj.ho_ten, 'muc_giam_gia': obj.get_muc_giam_gia()} if obj else _KHONG_CO
+        cache.set(key, khach, PROFILE_TTL)
+    return khach or None
+
+
+def xoa_khach_hang(user_id):
+    if user_id is not None:
+        cache.delete(_profile_key(user_id))
+
+
+def lay_danh_muc():
+    """ Danh sách danh mục cho /api/categories/ (cùng dạng với DanhMucSerializer) """
+    data = cache.get(DANH_MUC_KEY)
+    if data is None:
+        data = list(DanhMuc.objects.order_by('id').values('id', 'ten_danh_muc', 'slug'))
+        cache.set(DANH_MUC_KEY, data, DANH_MUC_TTL)
+    return data
+
+
+def xoa_danh_muc():
+    cache.delete(DANH_MUC_KEY)
+
+
+def _phien_ban(key):
+    version = cache.get(key)
+    if version is None:
+        # Bắt đầu từ thời điểm hiện tại (ms) để không trùng phiên bản cũ nếu key bị đẩy khỏi cache
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def _tang_phien_ban(key):
+    try:
+        cache.incr(key)
+    except ValueError:  # Key chưa có / đã bị đẩy khỏi cache
+        _phien_ban(key)
+
+
+def phien_ban_san_pham():
+    """ Ghép vào key cache của dữ liệu phụ thuộc TuiXach -> đổi phiên bản là mọi key cũ tự hết hiệu lực """
+    return _phien_ban(SAN_PHAM_VERSION_KEY)
+
+
+def tang_phien_ban_san_pham():
+    _tang_phien_ban(SAN_PHAM_VERSION_KEY)
+
+
+def phien_ban_doanh_thu_cu():
+    """ Phiên bản số liệu doanh thu của các ngày đã qua (báo cáo kỳ đã đóng được cache không hết hạn) """
+    return _phien_ban(DOANH_THU_CU_VERSION_KEY)
+
+
+def tang_phien_ban_doanh_thu_cu():
+    _tang_phien_ban(DOANH_THU_CU_VERSION_KEY)
@@ -0,0 +1,105 @@
+"""
+So sánh doanh thu kỳ này / kỳ trước / cùng kỳ năm trước cho ThongKeViewSet.tong_quan.
+
+- Các kỳ là khoảng nửa mở [00:00 ngày đầu, 00:00 ngày sau ngày cuối) theo REPORT_TIME_ZONE (datetime aware)
+- 1 query: lọc đơn HOAN_THANH trong khoảng bao các kỳ, mỗi kỳ là 1 nhóm SUM/COUNT(... FILTER (WHERE ngay_tao ...))
+  thay vì mỗi kỳ 1 lần aggregate
+- Kỳ đã đóng (kết thúc trước hôm nay) được cache, key kèm caching.phien_ban_doanh_thu_cu()
+  (tăng khi đơn của ngày đã qua vào/ra HOAN_THANH). TTL hữu hạn (COMPARISON_CACHE_TTL) làm lưới an toàn
+  nếu có chỗ sửa dữ liệu mà không tăng phiên bản; không có cache dùng chung thì phiên bản chỉ tăng ở
+  process đã sửa -> cache ngắn (COMPARISON_LOCAL_CACHE_TTL)
+Gồm cả đơn đã lưu trữ (HoaDonTatCa).
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import caching
+from .models import HoaDonTatCa
+
+
+def _mui_gio():
+    return ZoneInfo(settings.REPORT_TIME_ZONE)
+
+
+def dau_ngay(d):
+    """ 00:00 của ngày d theo REPORT_TIME_ZONE (aware) """
+    return datetime.combine(d, time.min, tzinfo=_mui_gio())
+
+
+def lui_mot_nam(d):
+    try:
+        return d.replace(year=d.year - 1)
+    except ValueError:  # 29/02 -> 28/02
+        return d.replace(year=d.year - 1, day=28)
+
+
+def cac_ky(start, end, nam_truoc=False):
+    """ {tên kỳ: (ngày đầu, ngày cuối)}, kỳ trước dài bằng kỳ này và kết thúc ngay trước nó """
+    so_ngay = (end - start).days + 1
+    ky = {
+        'ky_nay': (start, end),
+        'ky_truoc': (start - timedelta(days=so_ngay), start - timedelta(days=1)),
+    }
+    if nam_truoc:
+        ky['cung_ky_nam_truoc'] = (lui_mot_nam(start), lui_mot_nam(end))
+    return ky
+
+
+def _tinh(ky):
+    aggs = {}
+    for ten, (tu, den) in ky.items():
+        trong_ky = Q(ngay_tao__gte=dau_ngay(tu), ngay_tao__lt=dau_ngay(den + timedelta(days=1)))
+        aggs[f'{ten}__doanh_thu'] = Sum('thanh_tien', filter=trong_ky)
+        aggs[f'{ten}__tien_hang'] = Sum('tong_tien_hang', filter=trong_ky)
+        aggs[f'{ten}__giam_gia'] = Sum('giam_gia', filter=trong_ky)
+        aggs[f'{ten}__so_don'] = Count('id', filter=trong_ky)
+    # Lọc bằng 1 khoảng bao trọn các kỳ (quét index 1 đoạn) thay vì OR từng kỳ
+    tu = min(k[0] for k in ky.values())
+    den = max(k[1] for k in ky.values())
+    row = HoaDonTatCa.objects.filter(
+        trang_thai='HOAN_THANH', ngay_tao__gte=dau_ngay(tu), ngay_tao__lt=dau_ngay(den + timedelta(days=1)),
+    ).aggregate(**aggs)
+
+    ket_qua = {}
+    for ten, (tu, den) in ky.items():
+        doanh_thu = int(row[f'{ten}__doanh_thu'] or 0)
+        so_don = row[f'{ten}__so_don']
+        ket_qua[ten] = {
+            'range': f"{tu} -> {den}",
+            'doanh_thu': doanh_thu,
+            'so_don': so_don,
+            'tien_hang': int(row[f'{ten}__tien_hang'] or 0),
+            'giam_gia': int(row[f'{ten}__giam_gia'] or 0),
+            'gia_tri_don_tb': round(doanh_thu / so_don) if so_don else 0,
+        }
+    return ket_qua
+
+
+def so_sanh(start, end, nam_truoc=False):
+    """ start/end: date theo REPORT_TIME_ZONE (gồm cả 2 đầu) """
+    ky = cac_ky(start, end, nam_truoc)
+    if end >= timezone.localdate(timezone=_mui_gio()):
+        return _tinh(ky)  # Kỳ còn mở: số liệu đổi theo từng đơn, không cache
+
+    key = f"so_sanh:{caching.phien_ban_doanh_thu_cu()}:{start}:{end}:{int(nam_truoc)}"
+    ket_qua = cache.get(key)
+    if ket_qua is None:
+        ket_qua = _tinh(ky)
+        if caching.cache_dung_chung():
+            ttl = getattr(settings, 'COMPARISON_CACHE_TTL', 86400)
+        else:
+            ttl = getattr(settings, 'COMPARISON_LOCAL_CACHE_TTL', 60)
+        cache.set(key, ket_qua, ttl)
+    return ket_qua
+
+
+def tang_truong(hien_tai, truoc):
+    """ % thay đổi, làm tròn 2 số lẻ. Trước đó 0 mà giờ có -> 100 """
+    if truoc > 0:
+        return round((hien_tai - truoc) / truoc * 100, 2)
+    return 100 if hien_tai > 0 else 0
@@ -1,9 +1,11 @@
 import os
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+import threading
 
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+from .perf import do_thoi_gian
+
+# googleapiclient / google.auth được import trong hàm (lần upload/xóa đầu tiên):
+# import ở đầu file tốn ~100ms + vài chục MB RAM cho mọi worker và mọi lệnh manage.py,
+# kể cả khi không bao giờ upload. Xem `python manage.py check_startup`.
 
 # =========================
 # CẤU HÌNH
@@ -17,12 +19,37 @@ TOKEN_FILE = os.path.join(BASE_DIR, 'token.json')
 
 PARENT_FOLDER_ID = '1tmoIEEcozT5KZkUN_uBmGDwnF5U1-YHf'
 
+# Service (kèm kết nối HTTPS tới Google) giữ lại theo từng thread: httplib2 không thread-safe
+_local = threading.local()
+
+
+def da_cau_hinh():
+    """ Đã có token.json (server này có upload lên Drive) """
+    return os.path.exists(TOKEN_FILE)
+
+
+def nap_truoc():
+    """ Import thư viện Google trước (gunicorn master khi preload) để các worker dùng chung bộ nhớ """
+    import google.auth.transport.requests  # noqa: F401
+    import google.oauth2.credentials  # noqa: F401
+    import googleapiclient.discovery  # noqa: F401
+    import googleapiclient.http  # noqa: F401
+
 
 def get_drive_service():
     """
     BE dùng token.json để upload tự động.
     Token hết hạn sẽ tự refresh bằng refresh_token.
+    Service được dùng lại trong cùng thread tới khi token hết hạn.
     """
+    service = getattr(_local, 'service', None)
+    if service is not None and _local.creds.valid:
+        return service
+
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+
     if not os.path.exists(TOKEN_FILE):
         raise Exception(
             "Chưa có token.json. Hãy chạy generate_token.py để OAuth 1 lần."
@@ -38,10 +65,15 @@ def get_drive_service():
         else:
             raise Exception("Token không hợp lệ, cần OAuth lại.")
 
-    return build('drive', 'v3', credentials=creds)
+    _local.creds = creds
+    _local.service = build('drive', 'v3', credentials=creds)
+    return _local.service
 
 
+@do_thoi_gian('drive')
 def upload_file_to_drive(file_obj):
+    from googleapiclient.http import MediaIoBaseUpload
+
     service = get_drive_service()
 
     file_metadata = {
@@ -76,6 +108,7 @@ def upload_file_to_drive(file_obj):
 
     return file.get('webViewLink')
 
+@do_thoi_gian('drive')
 def delete_file_from_drive(file_id):
     """
     Hàm xóa file trên Google Drive dựa vào File ID
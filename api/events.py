@@ -0,0 +1,238 @@
+"""
+Đẩy thay đổi KPI realtime cho dashboard chủ cửa hàng qua Server-Sent Events.
+
+    GET /api/events/dashboard/?token=<access token>     (EventSource không gửi được header Authorization)
+
+Dashboard gọi DashboardSummaryView / ThongKeDonHangView 1 lần lúc mở, sau đó chỉ nhận delta:
+    event: don_hang
+    data: {"hoa_don_id": 12, "trang_thai": "HOAN_THANH", ..., "delta": {"doanh_thu_hom_nay": 1500000, ...}}
+-> N dashboard đang mở tốn O(số sự kiện), không phải O(N x số lần poll x số query).
+
+Phân phối:
+- Trong process: Broker giữ 1 hàng đợi asyncio cho mỗi kết nối, publish() an toàn từ mọi thread
+- Nhiều process (API chạy gunicorn WSGI, stream chạy 1 process ASGI riêng): đặt SSE_BROKER_ADDR="host:port",
+  process ghi gửi sự kiện bằng 1 gói UDP tới process ASGI, process ASGI nhận rồi phân phối trong process
+Sự kiện chỉ được phát sau khi transaction commit (transaction.on_commit).
+"""
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100  # Client đọc chậm hơn thế này -> bỏ hàng đợi, gửi 'resync' (client gọi lại API tổng quan)
+
+
+class Subscription:
+    def __init__(self, loop, start_id):
+        self.loop = loop
+        self.start_id = start_id  # Sự kiện cuối cùng đã có lúc đăng ký
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+
+def _dua_vao(queue, event):
+    """ Chạy trên event loop của subscriber """
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'event': 'resync', 'id': event['id'], 'data': {}})
+
+
+class Broker:
+    """ Fan-out trong process: mỗi sự kiện được đánh số tăng dần, giữ `history` sự kiện gần nhất cho Last-Event-ID """
+
+    def __init__(self, history=200):
+        self._lock = threading.Lock()
+        self._subs = set()
+        self._history = deque(maxlen=history)
+        self._last_id = 0
+
+    def publish(self, event, data):
+        with self._lock:
+            self._last_id += 1
+            item = {'event': event, 'id': self._last_id, 'data': data}
+            self._history.append(item)
+            subs = list(self._subs)
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(_dua_vao, sub.queue, item)
+            except RuntimeError:  # Loop đã đóng
+                self.unsubscribe(sub)
+        return item
+
+    def subscribe(self, last_id=None):
+        """ Trả về (subscription, các sự kiện bị lỡ kể từ last_id hoặc None nếu không bù được) """
+        with self._lock:
+            sub = Subscription(asyncio.get_running_loop(), self._last_id)
+            self._subs.add(sub)
+            if last_id is None or last_id == self._last_id:
+                missed = []
+            elif self._history and self._history[0]['id'] - 1 <= last_id < self._last_id:
+                missed = [e for e in self._history if e['id'] > last_id]
+            else:
+                missed = None  # Quá cũ (đã rớt khỏi history) hoặc process stream vừa khởi động lại
+        return sub, missed
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    @property
+    def so_ket_noi(self):
+        return len(self._subs)
+
+
+broker = Broker()
+
+
+# =========================================================
+# CẦU NỐI GIỮA CÁC PROCESS (UDP)
+# =========================================================
+_send_sock = None
+_listeners = set()  # Event loop đã mở cổng nhận
+
+
+def _dia_chi():
+    addr = getattr(settings, 'SSE_BROKER_ADDR', None)
+    if not addr:
+        return None
+    host, _, port = addr.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def _gui(event, data):
+    addr = _dia_chi()
+    if addr is None:
+        broker.publish(event, data)
+        return
+    global _send_sock
+    if _send_sock is None:
+        _send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        _send_sock.setblocking(False)
+    try:
+        _send_sock.sendto(json.dumps({'event': event, 'data': data}).encode(), addr)
+    except OSError:
+        # Process stream chưa chạy / buffer đầy: dashboard sẽ tự đồng bộ lại khi kết nối lại
+        logger.warning("Không gửi được sự kiện SSE tới %s:%s", *addr)
+
+
+class _NhanUDP(asyncio.DatagramProtocol):
+    def datagram_received(self, payload, addr):
+        try:
+            msg = json.loads(payload)
+            broker.publish(msg['event'], msg['data'])
+        except (ValueError, KeyError):
+            logger.warning("Gói sự kiện SSE không hợp lệ từ %s", addr)
+
+
+async def dam_bao_nhan():
+    """ Process ASGI: mở cổng nhận UDP 1 lần (gọi khi có kết nối stream đầu tiên) """
+    addr = _dia_chi()
+    loop = asyncio.get_running_loop()
+    if addr is None or loop in _listeners:
+        return
+    _listeners.add(loop)
+    try:
+        await loop.create_datagram_endpoint(_NhanUDP, local_addr=addr)
+    except OSError:
+        _listeners.discard(loop)
+        logger.exception("Không mở được cổng nhận sự kiện SSE %s:%s", *addr)
+
+
+# =========================================================
+# SỰ KIỆN ĐƠN HÀNG
+# =========================================================
+def _delta(hoa_don, trang_thai_cu, ngay):
+    """ Mức thay đổi của các KPI trên DashboardSummaryView / ThongKeDonHangView """
+    today = timezone.localdate()
+    hom_nay = ngay == today
+    thang_nay = (ngay.year, ngay.month) == (today.year, today.month)
+    tien = int(hoa_don.thanh_tien or 0)
+
+    delta = {}
+    if trang_thai_cu is None:
+        delta['so_don'] = 1
+        if hom_nay:
+            delta['so_don_hom_nay'] = 1
+
+    def cho_duyet(trang_thai):
+        return hoa_don.loai_hoa_don == 'ONLINE' and trang_thai == 'CHO_XAC_NHAN'
+
+    doi = cho_duyet(hoa_don.trang_thai) - cho_duyet(trang_thai_cu)
+    if doi:
+        delta['don_cho_duyet'] = doi
+
+    doi = (hoa_don.trang_thai == 'HOAN_THANH') - (trang_thai_cu == 'HOAN_THANH')
+    if doi:
+        delta['doanh_thu'] = doi * tien
+        if thang_nay:
+            delta['doanh_thu_thang_nay'] = doi * tien
+            delta['don_hoan_thanh_thang_nay'] = doi
+        if hom_nay:
+            delta['doanh_thu_hom_nay'] = doi * tien
+    return delta
+
+
+def bao_thay_doi_don(hoa_don, trang_thai_cu=None):
+    """ Gọi sau khi tạo đơn (trang_thai_cu=None) hoặc đổi trạng thái; phát sau khi transaction commit """
+    ngay = timezone.localdate(hoa_don.ngay_tao) if hoa_don.ngay_tao else timezone.localdate()
+    data = {
+        'hoa_don_id': hoa_don.pk,
+        'ma_hoa_don': hoa_don.ma_hoa_don,
+        'loai_hoa_don': hoa_don.loai_hoa_don,
+        'trang_thai': hoa_don.trang_thai,
+        'trang_thai_cu': trang_thai_cu,
+        'thanh_tien': int(hoa_don.thanh_tien or 0),
+        'ngay': ngay.isoformat(),
+        'delta': _delta(hoa_don, trang_thai_cu, ngay),
+    }
+    transaction.on_commit(lambda: _gui('don_hang', data))
+
+
+def dinh_dang(item):
+    """ 1 sự kiện theo định dạng text/event-stream """
+    return f"id: {item['id']}\nevent: {item['event']}\ndata: {json.dumps(item['data'], ensure_ascii=False)}\n\n"
+
+
+async def stream(sub, missed, het_han=None, con_hieu_luc=None):
+    """
+    Nội dung StreamingHttpResponse: sự kiện bị lỡ (Last-Event-ID), sự kiện mới, heartbeat giữ kết nối.
+    het_han: exp (unix time) của access token; con_hieu_luc: coroutine kiểm tra lại token (thu hồi/khóa tài khoản)
+    mỗi heartbeat. Hết hạn hoặc bị thu hồi -> gửi 'het_han' rồi đóng, client lấy token mới và kết nối lại.
+    """
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT', 15)
+    try:
+        yield "retry: 3000\n\n"
+        if missed is None:
+            # Lỡ quá nhiều -> client gọi lại API tổng quan rồi nhận delta tiếp
+            yield dinh_dang({'event': 'resync', 'id': sub.start_id, 'data': {}})
+        else:
+            for item in missed:
+                yield dinh_dang(item)
+            yield dinh_dang({'event': 'ready', 'id': sub.start_id, 'data': {}})
+        while True:
+            cho = heartbeat if het_han is None else min(heartbeat, het_han - time.time())
+            if cho <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), cho)
+            except asyncio.TimeoutError:
+                if con_hieu_luc is not None and not await con_hieu_luc():
+                    break
+                yield ": ping\n\n"
+                continue
+            yield dinh_dang(item)
+        # Không kèm id: giữ nguyên Last-Event-ID để kết nối lại không lỡ sự kiện
+        yield "event: het_han\ndata: {}\n\n"
+    finally:
+        broker.unsubscribe(sub)
@@ -0,0 +1,84 @@
+"""
+Đếm facet cho bộ lọc cửa hàng (GET /api/products/facets/): số sản phẩm theo danh mục, theo khoảng giá,
+còn hàng / hết hàng - cho đúng ?search= và bộ lọc đang chọn.
+
+Cả 3 loại đếm bằng 1 query GROUP BY danh_muc_id với COUNT(... FILTER/CASE WHEN ...):
+- Đếm theo danh mục bỏ qua filter danh_muc (để hiện số lượng của các danh mục khác), giữ filter giá
+- Đếm theo khoảng giá bỏ qua filter giá, giữ filter danh_muc
+- tong / het_hang áp dụng mọi filter
+Kết quả được cache theo (phiên bản sản phẩm, tham số) -> sản phẩm đổi là cache cũ tự hết hiệu lực.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import caching
+
+CACHE_TTL = 300
+
+
+def _khoang_gia():
+    """ [(tu, den), ...] từ FACET_PRICE_BUCKETS, khoảng cuối không có cận trên """
+    moc = list(getattr(settings, 'FACET_PRICE_BUCKETS', (0, 1000000, 2000000, 5000000, 10000000)))
+    return list(zip(moc, moc[1:] + [None]))
+
+
+def _trong_khoang(tu, den):
+    q = Q(gia_tien__gte=tu)
+    if den is not None:
+        q &= Q(gia_tien__lt=den)
+    return q
+
+
+def dem(queryset, danh_muc_id=None, gia_tu=None, gia_den=None):
+    """ queryset: sản phẩm đã áp ?search= (chưa lọc tồn kho / danh mục / giá) """
+    con_hang = Q(so_luong_ton__gt=0)
+    loc_gia = Q()
+    if gia_tu is not None:
+        loc_gia &= Q(gia_tien__gte=gia_tu)
+    if gia_den is not None:
+        loc_gia &= Q(gia_tien__lte=gia_den)
+    khoang = _khoang_gia()
+
+    aggs = {
+        'con_hang': Count('id', filter=con_hang & loc_gia),
+        'het_hang': Count('id', filter=~con_hang & loc_gia),
+    }
+    for i, (tu, den) in enumerate(khoang):
+        aggs[f'gia_{i}'] = Count('id', filter=con_hang & _trong_khoang(tu, den))
+    rows = queryset.order_by().values('danh_muc_id').annotate(**aggs)
+
+    theo_danh_muc = {}
+    tong = het_hang = 0
+    theo_gia = [0] * len(khoang)
+    for row in rows:
+        theo_danh_muc[row['danh_muc_id']] = row['con_hang']
+        if danh_muc_id is not None and row['danh_muc_id'] != danh_muc_id:
+            continue  # Dòng của danh mục khác chỉ dùng cho facet danh mục
+        tong += row['con_hang']
+        het_hang += row['het_hang']
+        for i in range(len(khoang)):
+            theo_gia[i] += row[f'gia_{i}']
+
+    return {
+        'tong': tong,
+        'het_hang': het_hang,
+        'danh_muc': [
+            dict(dm, so_luong=theo_danh_muc.get(dm['id'], 0)) for dm in caching.lay_danh_muc()
+        ],
+        'khoang_gia': [
+            {'tu': tu, 'den': den, 'so_luong': so_luong} for (tu, den), so_luong in zip(khoang, theo_gia)
+        ],
+    }
+
+
+def dem_co_cache(queryset, search='', danh_muc_id=None, gia_tu=None, gia_den=None):
+    tham_so = f"{search}|{danh_muc_id}|{gia_tu}|{gia_den}"
+    key = f"facets:{caching.phien_ban_san_pham()}:{hashlib.md5(tham_so.encode()).hexdigest()}"
+    data = cache.get(key)
+    if data is None:
+        data = dem(queryset, danh_muc_id, gia_tu, gia_den)
+        cache.set(key, data, CACHE_TTL)
+    return data
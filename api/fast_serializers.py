@@ -0,0 +1,243 @@
+"""
+Đường serialize nhanh cho các API danh sách chỉ đọc.
+
+Thay vì dựng model object rồi chạy toàn bộ ModelSerializer cho từng dòng, lấy dữ liệu bằng
+`.values()` và dựng dict theo một "kế hoạch" được biên dịch 1 lần từ chính serializer gốc:
+- Thứ tự field, tên field giống hệt serializer gốc
+- Decimal/datetime format bằng đúng field của serializer gốc (to_representation)
+- Field dạng 'khach_hang.ho_ten' khi khóa ngoại NULL thì bị bỏ khỏi output (giống SkipField của DRF)
+- Danh sách con (chi_tiet) lấy bằng 1 query cho cả trang rồi gom theo hoa_don_id
+
+Kết quả JSON phải giống từng byte với serializer gốc (xem FastSerializerContractTests).
+Tắt bằng FAST_LIST_SERIALIZERS = False.
+"""
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import ChiTietHoaDonTatCa, HoaDon, KhachHang, TuiXach
+from .serializers import (
+    ChiTietHoaDonSerializer, HoaDonSerializer, HoaDonTomTatSerializer, KhachHangSerializer, QuanLyHoaDonSerializer,
+    TuiXachSerializer, duong_dan_anh,
+)
+from .sparse_fields import SparseFieldsMixin
+
+# Các field mà to_representation không đổi giá trị đọc từ DB (str -> str, int -> int)
+PASS_THROUGH = (
+    serializers.CharField, serializers.IntegerField, serializers.ChoiceField,
+    serializers.ReadOnlyField, serializers.PrimaryKeyRelatedField,
+)
+IN_CHUNK = 500
+
+
+def _display(model, field_name):
+    """ Giống get_<field>_display() nhưng tra dict 1 lần """
+    choices = {k: str(v) for k, v in model._meta.get_field(field_name).flatchoices}
+    return lambda row, context: choices.get(row[field_name], row[field_name])
+
+
+class ValuesSerializer:
+    """
+    Lớp cơ sở: khai báo serializer gốc + các field tính toán (computed) không map thẳng vào cột.
+    computed = {'ten_field': (('cột cần lấy', ...), func(row, context))}
+    nested = {'ten_field': (ValuesSerializer con, 'cột khóa ngoại trỏ về cha')}
+    model: đọc dòng con từ model khác với serializer_class.Meta.model (vd. VIEW gộp đơn lưu trữ)
+    """
+    serializer_class = None
+    model = None
+    computed = {}
+    nested = {}
+
+    def __init__(self, fields=None):
+        self.plan = []
+        self.active_nested = []
+        self._subsets = {}
+        columns = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if name in self.computed:
+                deps, func = self.computed[name]
+                columns.extend(deps)
+                self.plan.append((name, 'computed', func, None))
+            elif name in self.nested:
+                self.active_nested.append(name)
+                self.plan.append((name, 'nested', None, None))
+            else:
+                column = '__'.join(field.source_attrs)
+                # 'khach_hang.ho_ten': cần thêm cột khóa ngoại để phân biệt "FK NULL" (bỏ field) với "giá trị NULL"
+                fk = field.source_attrs[0] if len(field.source_attrs) > 1 else None
+                fmt = None if isinstance(field, PASS_THROUGH) else field.to_representation
+                columns.append(column)
+                if fk:
+                    columns.append(fk)
+                self.plan.append((name, column, fmt, fk))
+        self.columns = list(dict.fromkeys(columns + ['id']))
+
+    def chon(self, fields):
+        """ Bản chỉ gồm các field trong `fields` (?fields=/?expand=), None -> đầy đủ """
+        if fields is None:
+            return self
+        key = frozenset(fields)
+        subset = self._subsets.get(key)
+        if subset is None:
+            subset = type(self)(fields=key)
+            if len(self._subsets) < 64:  # Giới hạn số tổ hợp được nhớ
+                self._subsets[key] = subset
+        return subset
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def to_representation(self, row, context):
+        ret = {}
+        for name, column, fmt, fk in self.plan:
+            if column == 'computed':
+                ret[name] = fmt(row, context)
+            elif column == 'nested':
+                ret[name] = row['_nested'][name]
+            elif fk is not None and row[fk] is None:
+                continue
+            else:
+                value = row[column]
+                ret[name] = value if value is None or fmt is None else fmt(value)
+        return ret
+
+    def bo_sung(self, rows):
+        """ Điền thêm dữ liệu vào rows (đọc bằng 1 query cho cả lô) trước khi dựng output. Mặc định không làm gì """
+
+    def many(self, rows, context=None):
+        """ rows: list dict từ .values(self.columns) (đã phân trang nếu có) """
+        context = context or {}
+        rows = list(rows)
+        self.bo_sung(rows)
+        for name in self.active_nested:
+            child, fk_column = self.nested[name]
+            grouped = child.grouped(fk_column, [r['id'] for r in rows], context)
+            for r in rows:
+                r.setdefault('_nested', {})[name] = grouped.get(r['id'], [])
+        return [self.to_representation(r, context) for r in rows]
+
+    def grouped(self, fk_column, parent_ids, context):
+        """ Lấy dòng con cho nhiều cha bằng ít query (chia lô IN) và gom theo khóa ngoại """
+        model = self.model or self.serializer_class.Meta.model
+        result = defaultdict(list)
+        columns = list(dict.fromkeys(self.columns + [fk_column]))
+        for i in range(0, len(parent_ids), IN_CHUNK):
+            chunk = parent_ids[i:i + IN_CHUNK]
+            rows = list(model.objects.filter(**{f'{fk_column}__in': chunk}).order_by('id').values(*columns))
+            self.bo_sung(rows)
+            for row in rows:
+                result[row[fk_column]].append(self.to_representation(row, context))
+        return result
+
+
+# =========================================================
+# CÁC SERIALIZER NHANH
+# =========================================================
+def _anh(column):
+    # Giống get_anh_dai_dien của serializer gốc (hinh_anh là CharField nên không có .url)
+    return lambda row, context: duong_dan_anh(row[column], context.get('request'))
+
+
+class ChiTietHoaDonValues(ValuesSerializer):
+    """ Tên/ảnh đọc từ snapshot trên dòng chi tiết, không join TuiXach """
+    serializer_class = ChiTietHoaDonSerializer
+    computed = {
+        'ten_san_pham': (('ten_san_pham', 'tui_xach'), lambda row, context: row['ten_san_pham']),
+        'anh_dai_dien': (('ten_san_pham', 'anh_san_pham', 'tui_xach'), _anh('anh_san_pham')),
+        'thanh_tien': (('so_luong', 'don_gia_luc_ban'), lambda row, context: row['so_luong'] * row['don_gia_luc_ban']),
+    }
+
+    def bo_sung(self, rows):
+        # Dòng cũ chưa backfill snapshot: lấy tên/ảnh hiện tại của túi (1 query cho cả lô), giống serializer gốc
+        if 'ten_san_pham' not in self.columns:
+            return
+        thieu = [r for r in rows if not r['ten_san_pham']]
+        if not thieu:
+            return
+        tui = {
+            pk: (ten, anh) for pk, ten, anh in
+            TuiXach.objects.filter(id__in={r['tui_xach'] for r in thieu}).values_list('id', 'ten_tui', 'hinh_anh')
+        }
+        for r in thieu:
+            r['ten_san_pham'], r['anh_san_pham'] = tui.get(r['tui_xach'], ('', ''))
+
+
+class QuanLyHoaDonValues(ValuesSerializer):
+    serializer_class = QuanLyHoaDonSerializer
+    computed = {
+        'loai_hoa_don_text': (('loai_hoa_don',), _display(HoaDon, 'loai_hoa_don')),
+        'trang_thai_text': (('trang_thai',), _display(HoaDon, 'trang_thai')),
+    }
+    nested = {'chi_tiet': (ChiTietHoaDonValues(), 'hoa_don_id')}
+
+
+class HoaDonValues(ValuesSerializer):
+    serializer_class = HoaDonSerializer
+    nested = {'chi_tiet': (ChiTietHoaDonValues(), 'hoa_don_id')}
+
+
+class ChiTietHoaDonTatCaValues(ChiTietHoaDonValues):
+    model = ChiTietHoaDonTatCa
+
+
+class HoaDonTatCaValues(ValuesSerializer):
+    """ Lịch sử mua hàng: đơn đang dùng + đơn đã lưu trữ, cùng output với HoaDonSerializer """
+    serializer_class = HoaDonSerializer
+    nested = {'chi_tiet': (ChiTietHoaDonTatCaValues(), 'hoa_don_id')}
+
+
+class HoaDonTomTatValues(ValuesSerializer):
+    """ Đơn của tôi dạng tóm tắt: 1 query trên view hóa đơn, không có danh sách con """
+    serializer_class = HoaDonTomTatSerializer
+    computed = {'anh_dai_dien': (('anh_dai_dien',), _anh('anh_dai_dien'))}
+
+
+def _hang(method):
+    # Dùng lại đúng logic xếp hạng trên model, không cần dựng cả object KhachHang
+    return lambda row, context: method(SimpleNamespace(tong_chi_tieu=row['tong_chi_tieu']))
+
+
+class KhachHangValues(ValuesSerializer):
+    serializer_class = KhachHangSerializer
+    computed = {
+        'hang_thanh_vien': (('tong_chi_tieu',), _hang(KhachHang.get_hang_thanh_vien)),
+        'muc_giam_gia': (('tong_chi_tieu',), _hang(KhachHang.get_muc_giam_gia)),
+    }
+
+
+class TuiXachValues(ValuesSerializer):
+    serializer_class = TuiXachSerializer
+
+
+# Dựng 1 lần khi import (kế hoạch không đổi trong suốt vòng đời process)
+QUAN_LY_HOA_DON = QuanLyHoaDonValues()
+HOA_DON = HoaDonValues()
+HOA_DON_TAT_CA = HoaDonTatCaValues()
+HOA_DON_TOM_TAT = HoaDonTomTatValues()
+KHACH_HANG = KhachHangValues()
+TUI_XACH = TuiXachValues()
+
+
+class FastListMixin(SparseFieldsMixin):
+    """
+    Mixin cho ViewSet: action list dùng ValuesSerializer (fast_serializer) thay cho serializer_class.
+    Hỗ trợ luôn ?fields=/?expand= (SparseFieldsMixin).
+    """
+    fast_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        if self.fast_serializer is None or not getattr(settings, 'FAST_LIST_SERIALIZERS', True):
+            return super().list(request, *args, **kwargs)
+
+        fast = self.fast_serializer.chon(self.get_sparse_fields())
+        rows = fast.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        context = self.get_serializer_context()
+        if page is not None:
+            return self.get_paginated_response(fast.many(page, context))
+        return Response(fast.many(rows, context))
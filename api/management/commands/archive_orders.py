@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from api import archive
+
+
+class Command(BaseCommand):
+    help = "Chuyển đơn đã đóng (hoàn thành/hủy) quá N tháng sang bảng lưu trữ, tạo partition tháng mới (MySQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=getattr(settings, 'ORDER_ARCHIVE_MONTHS', 18))
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.0, help="Nghỉ giữa các lô (giây) để giảm tải DB")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **opts):
+        moc = archive.moc_luu_tru(opts['months'])
+        can = archive.don_can_luu_tru(moc)
+        if opts['dry_run']:
+            self.stdout.write(f"Sẽ lưu trữ {can.count()} đơn tạo trước {moc:%Y-%m-%d}.")
+            return
+
+        cu_nhat = can.aggregate(m=Min('ngay_tao'))['m']
+        if cu_nhat is None:
+            self.stdout.write("Không có đơn nào cần lưu trữ.")
+            return
+        so_partition = archive.dam_bao_partition(cu_nhat, moc)
+
+        tong_don = tong_dong = 0
+        t0 = time.monotonic()
+        while True:
+            so_don, so_dong = archive.luu_tru_lo(moc, opts['batch_size'])
+            if not so_don:
+                break
+            tong_don += so_don
+            tong_dong += so_dong
+            self.stdout.write(f"  đã chuyển {tong_don} đơn / {tong_dong} dòng chi tiết")
+            if opts['sleep']:
+                time.sleep(opts['sleep'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Lưu trữ {tong_don} đơn tạo trước {moc:%Y-%m-%d} trong {time.monotonic() - t0:.1f}s"
+            f" (tạo {so_partition} partition)."
+        ))
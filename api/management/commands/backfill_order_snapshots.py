@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import ChiTietHoaDon, ChiTietHoaDonLuuTru, TuiXach
+
+
+class Command(BaseCommand):
+    help = "Điền tên/ảnh sản phẩm (snapshot) cho dòng chi tiết hóa đơn cũ chưa có, theo lô (chạy lại được)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0, help="Nghỉ giữa các lô (giây) để giảm tải DB")
+
+    def handle(self, *args, **opts):
+        # Tên/ảnh hiện tại của túi: dòng cũ trước khi có snapshot chỉ còn thông tin này
+        tui = {pk: (ten, anh) for pk, ten, anh in TuiXach.objects.values_list('id', 'ten_tui', 'hinh_anh')}
+        t0 = time.monotonic()
+        tong = 0
+        for model in (ChiTietHoaDon, ChiTietHoaDonLuuTru):
+            so_dong = self._backfill(model, tui, opts['batch_size'], opts['sleep'])
+            self.stdout.write(f"  {model.__name__}: {so_dong} dòng")
+            tong += so_dong
+        self.stdout.write(self.style.SUCCESS(f"Đã điền snapshot cho {tong} dòng trong {time.monotonic() - t0:.1f}s."))
+
+    def _backfill(self, model, tui, batch_size, sleep):
+        # Đi theo id tăng dần (keyset) -> dừng giữa chừng chạy lại vẫn tiếp tục, không quét lại dòng đã qua
+        chua_co = model.objects.filter(ten_san_pham='').order_by('id')
+        tong = 0
+        cuoi = None
+        while True:
+            lo = chua_co if cuoi is None else chua_co.filter(id__gt=cuoi)
+            rows = list(lo.values_list('id', 'tui_xach_id')[:batch_size])
+            if not rows:
+                return tong
+            cuoi = rows[-1][0]
+            objs = [
+                model(id=pk, ten_san_pham=tui[tui_id][0], anh_san_pham=tui[tui_id][1])
+                for pk, tui_id in rows if tui_id in tui
+            ]
+            with transaction.atomic():
+                model.objects.bulk_update(objs, ['ten_san_pham', 'anh_san_pham'])
+            tong += len(objs)
+            if sleep:
+                time.sleep(sleep)
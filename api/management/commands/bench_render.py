@@ -0,0 +1,68 @@
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.models import HoaDon
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import QuanLyHoaDonSerializer
+
+
+class Command(BaseCommand):
+    help = "So sánh thời gian render + bộ nhớ đỉnh giữa JSONRenderer của DRF và FastJSONRenderer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **opts):
+        n = opts['orders']
+        orders = list(
+            HoaDon.objects.select_related('khach_hang', 'nhan_vien')
+            .prefetch_related('chi_tiet__tui_xach').order_by('-id')[:n]
+        )
+        if not orders:
+            self.stderr.write("Chưa có dữ liệu, chạy `python manage.py seed_bench` trước.")
+            return
+        # Lặp lại nếu DB ít hơn n đơn để payload đủ kích thước
+        orders = (orders * (n // len(orders) + 1))[:n]
+
+        payloads = {
+            # Danh sách đơn: Decimal đã là chuỗi (DecimalField), chủ yếu là dict/str
+            'order_list': {'count': n, 'results': QuanLyHoaDonSerializer(orders, many=True).data},
+            # Giống du_lieu_xuat_excel: Decimal thô trong dict -> phải convert ở renderer
+            'export': {'success': True, 'data': [{
+                "Mã HĐ": o.ma_hoa_don,
+                "Ngày GD": o.ngay_tao.strftime("%d/%m/%Y %H:%M"),
+                "Khách Hàng": o.ho_ten_nguoi_nhan,
+                "SĐT": o.sdt_nguoi_nhan,
+                "Tổng Tiền": o.tong_tien_hang,
+                "Giảm Giá": o.giam_gia,
+                "Thực Thu": o.thanh_tien,
+                "Ngày tạo": o.ngay_tao,
+            } for o in orders]},
+        }
+        renderers = {'drf': JSONRenderer(), 'fast': FastJSONRenderer()}
+        self.stdout.write(f"orjson: {'có' if orjson else 'KHÔNG (đang dùng fallback)'}")
+        self.stdout.write(f"{'payload':<12}{'renderer':<10}{'median_ms':>11}{'peak_MB':>10}{'size_KB':>10}")
+
+        for name, data in payloads.items():
+            outputs = {}
+            for rname, renderer in renderers.items():
+                times = []
+                for _ in range(opts['repeat']):
+                    t0 = time.perf_counter()
+                    outputs[rname] = renderer.render(data)
+                    times.append((time.perf_counter() - t0) * 1000)
+                tracemalloc.start()
+                renderer.render(data)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f"{name:<12}{rname:<10}{statistics.median(times):>11.1f}"
+                    f"{peak / 2 ** 20:>10.1f}{len(outputs[rname]) / 1024:>10.0f}"
+                )
+            if outputs['drf'] != outputs['fast']:
+                self.stderr.write(f"  {name}: output KHÁC NHAU giữa 2 renderer!")
@@ -0,0 +1,113 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Chạy trong process con sạch: giống 1 gunicorn worker vừa boot (load settings, app, urlconf)
+BOOT_SCRIPT = """
+import json, os, sys, time
+t0 = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+from config.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+boot_ms = (time.perf_counter() - t0) * 1000
+rss_kb = 0
+try:
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+except (OSError, StopIteration):
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss_kb //= 1024
+first_ms = {}
+if os.environ.get('STARTUP_URLS'):
+    # Request đầu tiên sau boot (có/không làm nóng trước), giống request đầu của 1 worker mới
+    from django.test import Client
+    if os.environ.get('STARTUP_WARM') == '1':
+        from api.warmup import lam_nong
+        lam_nong()
+    client = Client(HTTP_ACCEPT_ENCODING='br, gzip')
+    for url in os.environ['STARTUP_URLS'].split(','):
+        t1 = time.perf_counter()
+        status = client.get(url).status_code
+        first_ms[url] = ((time.perf_counter() - t1) * 1000, status)
+print(json.dumps({'boot_ms': boot_ms, 'rss_mb': rss_kb / 1024, 'modules': sorted(sys.modules), 'first_ms': first_ms}))
+"""
+
+
+def doc_importtime(stderr):
+    """ Parse output của `python -X importtime`: list (tên module, self_us, cumulative_us) """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Dòng tiêu đề "self [us] | cumulative | imported package"
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Đo thời gian boot + RSS của 1 worker, liệt kê module import chậm nhất, báo lỗi nếu vượt ngưỡng"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help="Số lần boot để lấy median")
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--max-boot-ms', type=float, default=getattr(settings, 'STARTUP_MAX_BOOT_MS', None))
+        parser.add_argument('--max-rss-mb', type=float, default=getattr(settings, 'STARTUP_MAX_RSS_MB', None))
+        parser.add_argument('--no-check', action='store_true', help="Chỉ báo cáo, không kiểm tra ngưỡng")
+        parser.add_argument(
+            '--first-request', nargs='*', metavar='URL',
+            help="Đo request đầu tiên sau boot, không/có warm-up (mặc định WARMUP_URLS). Cần DB có dữ liệu",
+        )
+
+    def _boot(self, importtime=False, urls=(), warm=False):
+        cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', BOOT_SCRIPT]
+        env = dict(os.environ, STARTUP_URLS=','.join(urls), STARTUP_WARM='1' if warm else '0')
+        proc = subprocess.run(cmd, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise CommandError(f"Boot thất bại:\n{proc.stderr[-2000:]}")
+        return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+    def handle(self, *args, **opts):
+        runs = [self._boot()[0] for _ in range(max(1, opts['runs']))]
+        boot_ms = statistics.median(r['boot_ms'] for r in runs)
+        rss_mb = statistics.median(r['rss_mb'] for r in runs)
+
+        _, stderr = self._boot(importtime=True)
+        rows = doc_importtime(stderr)
+        self.stdout.write(f"{'module':<50}{'self_ms':>10}{'cumul_ms':>10}")
+        for name, self_us, cumul_us in sorted(rows, key=lambda r: -r[2])[:opts['top']]:
+            self.stdout.write(f"{name:<50}{self_us / 1000:>10.1f}{cumul_us / 1000:>10.1f}")
+        self.stdout.write(f"\nboot: {boot_ms:.0f}ms (median {len(runs)} lần), RSS: {rss_mb:.1f}MB, {len(rows)} module")
+
+        if opts['first_request'] is not None:
+            urls = opts['first_request'] or list(getattr(settings, 'WARMUP_URLS', ()))
+            self.stdout.write(f"\n{'request đầu tiên':<40}{'cold_ms':>10}{'warm_ms':>10}")
+            cold = [self._boot(urls=urls)[0]['first_ms'] for _ in range(len(runs))]
+            warm = [self._boot(urls=urls, warm=True)[0]['first_ms'] for _ in range(len(runs))]
+            for url in urls:
+                cold_ms = statistics.median(r[url][0] for r in cold)
+                warm_ms = statistics.median(r[url][0] for r in warm)
+                self.stdout.write(f"{url:<40}{cold_ms:>10.1f}{warm_ms:>10.1f}  (HTTP {cold[0][url][1]})")
+
+        # Module phải được import lười (chỉ khi dùng tới), không được có mặt lúc boot
+        loaded = set(runs[0]['modules'])
+        lazy = [m for m in getattr(settings, 'STARTUP_LAZY_MODULES', ()) if m in loaded]
+        errors = []
+        if lazy:
+            errors.append(f"module lẽ ra import lười đã bị load lúc boot: {', '.join(lazy)}")
+        if opts['max_boot_ms'] and boot_ms > opts['max_boot_ms']:
+            errors.append(f"boot {boot_ms:.0f}ms > {opts['max_boot_ms']:.0f}ms")
+        if opts['max_rss_mb'] and rss_mb > opts['max_rss_mb']:
+            errors.append(f"RSS {rss_mb:.1f}MB > {opts['max_rss_mb']:.0f}MB")
+        if errors and not opts['no_check']:
+            raise CommandError("; ".join(errors))
+        self.stdout.write(self.style.SUCCESS("OK") if not errors else self.style.WARNING("; ".join(errors)))
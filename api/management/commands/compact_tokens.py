@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Xóa dần các token đã hết hạn (OutstandingToken + BlacklistedToken) theo từng lô nhỏ "
+        "để không khóa bảng lâu. Nên chạy định kỳ (cron), ví dụ mỗi giờ."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.05, help="Nghỉ giữa các lô (giây) để nhường I/O")
+        parser.add_argument('--grace-hours', type=int, default=1, help="Chỉ xóa token đã hết hạn quá N giờ")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(hours=opts['grace_hours'])
+        expired = OutstandingToken.objects.filter(expires_at__lt=cutoff)
+        if opts['dry_run']:
+            self.stdout.write(f"Sẽ xóa {expired.count()} token hết hạn trước {cutoff.isoformat()}")
+            return
+
+        deleted = 0
+        last_id = 0
+        while True:
+            # Duyệt theo khóa chính -> mỗi lô chỉ khóa đúng các dòng cần xóa
+            ids = list(expired.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:opts['batch_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            last_id = ids[-1]
+            if opts['sleep']:
+                time.sleep(opts['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Đã xóa {deleted} token hết hạn."))
@@ -0,0 +1,82 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api import analytics_export
+
+MANIFEST = '_manifest.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Xuất orders / line_items / products / customers ra Parquet hoặc Arrow IPC để phân tích offline. "
+        "--incremental: chỉ xuất đơn cập nhật từ lần xuất trước (đọc mốc trong _manifest.json của thư mục)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('thu_muc', help="Thư mục ghi file (tạo nếu chưa có)")
+        parser.add_argument('--format', choices=tuple(analytics_export.DINH_DANG), default='parquet')
+        parser.add_argument('--tables', nargs='+', choices=analytics_export.BANG, default=analytics_export.BANG)
+        parser.add_argument('--since', help="Chỉ xuất đơn có ngay_cap_nhat >= mốc này (ISO 8601)")
+        parser.add_argument('--incremental', action='store_true', help="since = until của lần xuất trước")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Số dòng mỗi row group")
+
+    def handle(self, *args, **opts):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise CommandError("Cần cài pyarrow: pip install pyarrow")
+
+        thu_muc = opts['thu_muc']
+        os.makedirs(thu_muc, exist_ok=True)
+        since = self._since(opts, os.path.join(thu_muc, MANIFEST))
+        until = timezone.now()
+        duoi = analytics_export.DINH_DANG[opts['format']][0]
+
+        tom_tat = {}
+        for bang in opts['tables']:
+            tang_dan = bang in analytics_export.BANG_TANG_DAN
+            # Bảng tăng dần: mỗi lần 1 file mới (đọc gộp bằng glob orders-*.parquet); bảng khác ghi đè
+            ten_file = f"{bang}-{until:%Y%m%dT%H%M%SZ}.{duoi}" if tang_dan else f"{bang}.{duoi}"
+            duong_dan = os.path.join(thu_muc, ten_file)
+            t0 = time.monotonic()
+            so_dong = analytics_export.ghi(
+                bang, duong_dan + '.tmp', opts['format'],
+                since=since if tang_dan else None, until=until if tang_dan else None,
+                batch_size=opts['batch_size'],
+            )
+            os.replace(duong_dan + '.tmp', duong_dan)  # Người đọc không bao giờ thấy file ghi dở
+            tom_tat[bang] = {'file': ten_file, 'rows': so_dong}
+            self.stdout.write(f"  {bang}: {so_dong} dòng -> {ten_file} ({time.monotonic() - t0:.1f}s)")
+
+        if not set(analytics_export.BANG_TANG_DAN) <= set(tom_tat):
+            # Không dời mốc khi thiếu bảng tăng dần, nếu không lần --incremental sau sẽ bỏ sót đơn của bảng đó
+            self.stdout.write(self.style.SUCCESS(f"Đã xuất {len(tom_tat)} bảng (không cập nhật {MANIFEST})."))
+            return
+        with open(os.path.join(thu_muc, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump({
+                'since': since.isoformat() if since else None,
+                'until': until.isoformat(),
+                'format': opts['format'],
+                'tables': tom_tat,
+            }, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã xuất {len(tom_tat)} bảng, đơn cập nhật từ {since or 'đầu'} đến {until:%Y-%m-%d %H:%M:%S} UTC."
+        ))
+
+    def _since(self, opts, manifest):
+        if opts['since']:
+            since = parse_datetime(opts['since'])
+            if since is None:
+                raise CommandError("--since không đúng định dạng ISO 8601.")
+            return since if timezone.is_aware(since) else timezone.make_aware(since)
+        if opts['incremental']:
+            if not os.path.exists(manifest):
+                raise CommandError(f"Chưa có {manifest}: chạy 1 lần xuất đầy đủ trước.")
+            with open(manifest, encoding='utf-8') as f:
+                return parse_datetime(json.load(f)['until'])
+        return None
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import bulk_import
+
+
+class Command(BaseCommand):
+    help = "Nhập sản phẩm hàng loạt từ file CSV/XLSX, ảnh lấy từ file ZIP (upload Drive song song)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="File .csv hoặc .xlsx")
+        parser.add_argument('--anh', help="File .zip chứa ảnh (cột hinh_anh = tên file trong ZIP)")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help="Số thread upload ảnh (mặc định IMPORT_UPLOAD_WORKERS)")
+        parser.add_argument('--dry-run', action='store_true', help="Chỉ kiểm tra dữ liệu")
+
+    def _tien_do(self, loai, khoa, gia_tri):
+        if loai == 'anh':
+            if isinstance(gia_tri, Exception):
+                self.stdout.write(self.style.WARNING(f"  ảnh {khoa}: lỗi {gia_tri}"))
+            else:
+                self.stdout.write(f"  ảnh {khoa}: {gia_tri}")
+        elif gia_tri == 'ok':
+            self.stdout.write(f"  dòng {khoa}: đã tạo")
+        else:
+            self.stdout.write(self.style.WARNING(f"  dòng {khoa}: {gia_tri}"))
+
+    def handle(self, *args, **opts):
+        t0 = time.monotonic()
+        try:
+            with open(opts['file'], 'rb') as f:
+                rows = bulk_import.doc_bang(opts['file'], f)
+            ket_qua = bulk_import.nhap(
+                rows, anh_zip=opts['anh'], batch_size=opts['batch_size'], workers=opts['workers'],
+                tien_do=self._tien_do, dry_run=opts['dry_run'],
+            )
+        except bulk_import.LoiNhap as e:
+            for loi in e.loi:
+                self.stderr.write(f"  dòng {loi['dong']}: {loi['loi']}")
+            raise CommandError(str(e))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        if opts['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{ket_qua['so_dong']} dòng hợp lệ."))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tạo {ket_qua['tao_moi']}/{ket_qua['so_dong']} sản phẩm trong {time.monotonic() - t0:.1f}s."
+        ))
+        if ket_qua['loi']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(ket_qua['loi'])} dòng bị bỏ qua (upload ảnh lỗi): "
+                + ", ".join(str(l['dong']) for l in ket_qua['loi'])
+            ))
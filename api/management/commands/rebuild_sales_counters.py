@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import sales_counters
+
+
+class Command(BaseCommand):
+    help = "Tính lại bộ đếm đã bán (TuiXach.da_ban) và rollup doanh số theo ngày từ lịch sử đơn hàng"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **opts):
+        sales_counters.rebuild(batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS("Đã tính lại bộ đếm doanh số sản phẩm."))
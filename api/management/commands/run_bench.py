@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import bench
+
+
+class Command(BaseCommand):
+    help = "Chạy các kịch bản benchmark và ghi p50/p95/p99, số query, throughput ra file JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(bench.SCENARIOS),
+                            help="Chỉ chạy kịch bản này (lặp lại được). Mặc định: tất cả")
+        parser.add_argument('--requests', type=int, default=200, help="Số request mỗi kịch bản")
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--out', default='bench_results.json', help="File JSON kết quả")
+        parser.add_argument('--compare', metavar='BASELINE', help="So sánh với file baseline cũ")
+        parser.add_argument('--auth-mode', choices=('stateless', 'db'), default='stateless',
+                            help="stateless: quyền đọc từ claim JWT; db: load auth_user mỗi request (cách cũ)")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Ngưỡng chậm hơn cho phép (0.2 = 20%%)")
+
+    def handle(self, *args, **opts):
+        names = opts['scenario'] or list(bench.SCENARIOS)
+        # Đọc baseline trước khi chạy: --out có thể trùng file với --compare
+        baseline = bench.load_baseline(opts['compare']) if opts['compare'] else None
+        results = bench.run_suite(
+            names, opts['requests'], seed=opts['seed'], warmup=opts['warmup'], auth_mode=opts['auth_mode'],
+        )
+
+        self.stdout.write(f"{'scenario':<16}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>7}{'rps':>9}{'err':>5}")
+        for name, r in results['scenarios'].items():
+            self.stdout.write(
+                f"{name:<16}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+                f"{r['queries_p50']:>7}{r['throughput_rps']:>9}{r['errors']:>5}"
+            )
+
+        if opts['out']:
+            bench.save_results(results, opts['out'])
+            self.stdout.write(f"Đã ghi kết quả vào {opts['out']}")
+
+        if baseline is not None:
+            regressions = bench.compare(results, baseline, opts['tolerance'])
+            if regressions:
+                raise CommandError("Phát hiện regression:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("Không có regression so với baseline."))
@@ -0,0 +1,53 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api import reports
+from api.models import BaoCaoJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy các báo cáo nền còn chờ (BaoCaoJob), chạy lại job kẹt ở DANG_CHAY và xóa job cũ. "
+        "--loop: chạy liên tục (service report_jobs trong docker-compose)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help="Job DANG_CHAY lâu hơn số phút này coi như runner đã chết -> chạy lại")
+        parser.add_argument('--purge-days', type=int, default=7, help="Xóa job đã xong/lỗi cũ hơn số ngày này")
+        parser.add_argument('--loop', action='store_true', help="Không thoát, hỏi job mới mỗi --interval giây")
+        parser.add_argument('--interval', type=float, default=2.0)
+
+    def handle(self, *args, **opts):
+        while True:
+            # Process chạy lâu: bỏ connection đã quá CONN_MAX_AGE / bị DB đóng trước mỗi lượt
+            close_old_connections()
+            da_chay = self._mot_luot(opts)
+            if not opts['loop']:
+                return
+            if not da_chay:
+                time.sleep(opts['interval'])
+
+    def _mot_luot(self, opts):
+        now = timezone.now()
+        so_ket = BaoCaoJob.objects.filter(
+            trang_thai='DANG_CHAY', ngay_bat_dau__lt=now - timedelta(minutes=opts['stale_minutes']),
+        ).update(trang_thai='CHO')
+        da_xoa, _ = BaoCaoJob.objects.filter(
+            trang_thai__in=('XONG', 'LOI'), ngay_xong__lt=now - timedelta(days=opts['purge_days']),
+        ).delete()
+
+        da_chay = 0
+        for job_id in BaoCaoJob.objects.filter(trang_thai='CHO').order_by('ngay_tao').values_list('id', flat=True):
+            if reports.chay_job(job_id):
+                da_chay += 1
+                self.stdout.write(f"  xong job {job_id}")
+        if da_chay or so_ket or da_xoa or not opts['loop']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Đã chạy {da_chay} job ({so_ket} job kẹt được chạy lại), xóa {da_xoa} job cũ."
+            ))
+        return da_chay
@@ -0,0 +1,235 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api import sales_counters
+from api.models import DanhMuc, TuiXach, KhachHang, HoaDon, ChiTietHoaDon, HoaDonLuuTru, ChiTietHoaDonLuuTru
+
+# Tỉ lệ trạng thái đơn gần giống dữ liệu thật: phần lớn đơn đã hoàn thành
+TRANG_THAI_WEIGHTS = [
+    ('HOAN_THANH', 80),
+    ('DA_HUY', 8),
+    ('CHO_XAC_NHAN', 5),
+    ('DA_XAC_NHAN', 4),
+    ('DANG_GIAO', 3),
+]
+TEN_DANH_MUC = ['Túi da', 'Balo', 'Clutch', 'Túi đeo chéo', 'Túi tote', 'Ví cầm tay',
+                'Túi xách tay', 'Túi du lịch', 'Túi bucket', 'Túi hobo']
+THUONG_HIEU = ['Chanel', 'Gucci', 'Hermes', 'Dior', 'Prada', 'LV', 'Celine', 'Fendi', 'YSL', 'Loewe']
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Vũ', 'Đặng', 'Bùi', 'Đỗ', 'Ngô']
+TEN = ['An', 'Bình', 'Chi', 'Dung', 'Giang', 'Hà', 'Hạnh', 'Lan', 'Linh', 'Mai', 'Ngọc', 'Trang']
+
+BENCH_PASSWORD = 'bench12345'
+
+
+@contextmanager
+def tat_auto_now_add(*models):
+    """ Tạm tắt auto_now_add để bulk_create giữ được ngày tạo giả lập """
+    fields = [
+        f for m in models for f in m._meta.fields
+        if getattr(f, 'auto_now_add', False) or getattr(f, 'auto_now', False)
+    ]
+    saved = [(f, f.auto_now_add, getattr(f, 'auto_now', False)) for f in fields]
+    for f in fields:
+        f.auto_now_add = False
+        if hasattr(f, 'auto_now'):
+            f.auto_now = False
+    try:
+        yield
+    finally:
+        for f, add, now in saved:
+            f.auto_now_add = add
+            if hasattr(f, 'auto_now'):
+                f.auto_now = now
+
+
+class Command(BaseCommand):
+    help = "Sinh dữ liệu giả lập (danh mục, túi xách, khách hàng, hóa đơn) để chạy benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--products', type=int, default=None, help="Mặc định: orders / 200, tối thiểu 50")
+        parser.add_argument('--customers', type=int, default=None, help="Mặc định: orders / 5, tối thiểu 100")
+        parser.add_argument('--categories', type=int, default=len(TEN_DANH_MUC))
+        parser.add_argument('--days', type=int, default=730, help="Dàn đều đơn hàng trong N ngày gần nhất")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true',
+                            help="Xóa dữ liệu do lệnh này sinh ra lần trước (gắn tag bench) trước khi sinh")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts['seed'])
+        n_orders = opts['orders']
+        n_products = opts['products'] or max(50, n_orders // 200)
+        n_customers = opts['customers'] or max(100, n_orders // 5)
+        batch = opts['batch_size']
+
+        if opts['clear']:
+            self._xoa_du_lieu_bench()
+
+        self._tao_tai_khoan()
+        danh_muc = self._tao_danh_muc(rng, opts['categories'])
+        products = self._tao_san_pham(rng, danh_muc, n_products, batch)
+        customers = self._tao_khach_hang(rng, n_customers, batch)
+        self._tao_hoa_don(rng, products, customers, n_orders, opts['days'], batch)
+        # bulk_create không đi qua luồng hoàn thành đơn -> tính lại bộ đếm bán hàng
+        sales_counters.rebuild(batch_size=batch)
+        self.stdout.write(self.style.SUCCESS(
+            f"Xong: {len(danh_muc)} danh mục, {len(products)} túi, {len(customers)} khách, {n_orders} hóa đơn"
+        ))
+
+    def _xoa_du_lieu_bench(self):
+        # Chỉ xóa dòng có tag của lệnh này (mã BENCH-, danh mục bench-, tài khoản/email bench_):
+        # chạy nhầm trên DB thật cũng không đụng tới dữ liệu của shop
+        self.stdout.write("Xóa dữ liệu bench cũ...")
+        with transaction.atomic():
+            don_luu_tru = HoaDonLuuTru.objects.filter(ma_hoa_don__startswith='BENCH-')
+            ChiTietHoaDonLuuTru.objects.filter(hoa_don_id__in=don_luu_tru.values('id')).delete()
+            don_luu_tru.delete()
+            ChiTietHoaDon.objects.filter(hoa_don__ma_hoa_don__startswith='BENCH-').delete()
+            HoaDon.objects.filter(ma_hoa_don__startswith='BENCH-').delete()
+            KhachHang.objects.filter(email__startswith='bench_kh').delete()
+            TuiXach.objects.filter(danh_muc__slug__startswith='bench-').delete()
+            DanhMuc.objects.filter(slug__startswith='bench-').delete()
+            User.objects.filter(username__startswith='bench_').delete()
+
+    # --- TÀI KHOẢN CHẠY KỊCH BẢN (chủ, nhân viên) ---
+    def _tao_tai_khoan(self):
+        owner, _ = User.objects.get_or_create(
+            username='bench_owner', defaults={'is_staff': True, 'is_superuser': True}
+        )
+        staff, _ = User.objects.get_or_create(username='bench_staff', defaults={'is_staff': True})
+        for u in (owner, staff):
+            u.set_password(BENCH_PASSWORD)
+            u.save()
+
+    def _tao_danh_muc(self, rng, n):
+        existing = {d.slug: d for d in DanhMuc.objects.all()}
+        objs = []
+        for i in range(n):
+            slug = f"bench-{i}"
+            if slug not in existing:
+                ten = TEN_DANH_MUC[i % len(TEN_DANH_MUC)]
+                objs.append(DanhMuc(ten_danh_muc=f"{ten} {i // len(TEN_DANH_MUC) or ''}".strip(), slug=slug))
+        DanhMuc.objects.bulk_create(objs)
+        return list(DanhMuc.objects.filter(slug__startswith='bench-'))
+
+    def _tao_san_pham(self, rng, danh_muc, n, batch):
+        now = timezone.now()
+        objs = []
+        for i in range(n):
+            gia = Decimal(rng.randrange(20, 1500) * 100000)  # 2 triệu -> 150 triệu
+            objs.append(TuiXach(
+                danh_muc=rng.choice(danh_muc),
+                ten_tui=f"{rng.choice(THUONG_HIEU)} {rng.choice(TEN_DANH_MUC)} #{i}",
+                mo_ta="Da thật, may thủ công. " * rng.randint(5, 40),
+                gia_tien=gia,
+                so_luong_ton=rng.randint(0, 10) if rng.random() < 0.1 else 10 ** 6,
+                hinh_anh=f"https://drive.google.com/file/d/bench{i}/view?usp=drivesdk",
+                ngay_tao=now - timedelta(days=rng.randint(0, 900)),
+            ))
+        with tat_auto_now_add(TuiXach):
+            TuiXach.objects.bulk_create(objs, batch_size=batch)
+        # Chỉ túi của danh mục bench: đơn giả lập không trỏ vào sản phẩm thật
+        return list(
+            TuiXach.objects.filter(danh_muc__slug__startswith='bench-').values_list('id', 'gia_tien', 'ten_tui', 'hinh_anh')
+        )
+
+    def _tao_khach_hang(self, rng, n, batch):
+        # Hash mật khẩu 1 lần rồi dùng lại (PBKDF2 cho từng user sẽ rất chậm)
+        password = make_password(BENCH_PASSWORD)
+        now = timezone.now()
+        start = KhachHang.objects.count()
+        # ~20% khách có tài khoản web, còn lại là khách tại quầy
+        users = [
+            User(username=f"bench_kh{start + i}@example.com", email=f"bench_kh{start + i}@example.com", password=password)
+            for i in range(n) if i % 5 == 0
+        ]
+        User.objects.bulk_create(users, batch_size=batch)
+        user_ids = dict(User.objects.filter(username__startswith='bench_kh').values_list('username', 'id'))
+
+        objs = []
+        for i in range(n):
+            username = f"bench_kh{start + i}@example.com"
+            objs.append(KhachHang(
+                user_id=user_ids.get(username),
+                ho_ten=f"{rng.choice(HO)} {rng.choice(TEN)}",
+                so_dien_thoai=f"09{start + i:08d}",
+                sdt_chuan_hoa=f"09{start + i:08d}",  # bulk_create không gọi save()
+                email=username,
+                dia_chi=f"{rng.randint(1, 999)} Lê Lợi, Quận {rng.randint(1, 12)}, TP.HCM",
+                ngay_tham_gia=now - timedelta(days=rng.randint(0, 900)),
+            ))
+        with tat_auto_now_add(KhachHang):
+            KhachHang.objects.bulk_create(objs, batch_size=batch)
+        return list(KhachHang.objects.filter(email__startswith='bench_kh').values_list('id', 'ho_ten', 'so_dien_thoai'))
+
+    def _tao_hoa_don(self, rng, products, customers, n, days, batch):
+        now = timezone.now()
+        staff_id = User.objects.get(username='bench_staff').id
+        statuses = [s for s, _ in TRANG_THAI_WEIGHTS]
+        weights = [w for _, w in TRANG_THAI_WEIGHTS]
+        # Gán id tường minh: MySQL không trả về id sau bulk_create
+        next_id = (HoaDon.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        chi_tieu = {}
+
+        for offset in range(0, n, batch):
+            orders, lines = [], []
+            for _ in range(min(batch, n - offset)):
+                kh_id, ho_ten, sdt = rng.choice(customers) if rng.random() < 0.85 else (None, "Khách vãng lai", "")
+                online = kh_id is not None and rng.random() < 0.6
+                # Đơn gần đây dày hơn đơn cũ (phân bố lệch về hiện tại)
+                ngay = now - timedelta(seconds=int(days * 86400 * rng.random() ** 1.5))
+                trang_thai = rng.choices(statuses, weights)[0]
+
+                tong = Decimal(0)
+                so_san_pham, anh_dai_dien = 0, ''
+                for tx_id, gia, ten, anh in rng.sample(products, k=min(len(products), rng.choice((1, 1, 1, 2, 2, 3)))):
+                    qty = 1 if rng.random() < 0.9 else 2
+                    tong += gia * qty
+                    so_san_pham += qty
+                    anh_dai_dien = anh_dai_dien or anh
+                    lines.append(ChiTietHoaDon(
+                        hoa_don_id=next_id, tui_xach_id=tx_id, so_luong=qty, don_gia_luc_ban=gia,
+                        ten_san_pham=ten, anh_san_pham=anh,
+                    ))
+                giam = (tong * rng.choice((0, 0, 0, 10, 15))) / 100
+
+                orders.append(HoaDon(
+                    id=next_id,
+                    ma_hoa_don=f"BENCH-{next_id:010d}",
+                    khach_hang_id=kh_id,
+                    nhan_vien_id=None if online else staff_id,
+                    loai_hoa_don='ONLINE' if online else 'OFFLINE',
+                    trang_thai=trang_thai,
+                    phuong_thuc_tt=rng.choice(('COD', 'CK')) if online else 'TIEN_MAT',
+                    ho_ten_nguoi_nhan=ho_ten,
+                    sdt_nguoi_nhan=sdt,
+                    dia_chi_giao_hang="123 Lê Lợi, TP.HCM" if online else None,
+                    tong_tien_hang=tong,
+                    giam_gia=giam,
+                    thanh_tien=tong - giam,
+                    ngay_tao=ngay,
+                    ngay_cap_nhat=ngay,
+                    so_san_pham=so_san_pham,
+                    anh_dai_dien=anh_dai_dien,
+                ))
+                if kh_id and trang_thai == 'HOAN_THANH':
+                    chi_tieu[kh_id] = chi_tieu.get(kh_id, 0) + (tong - giam)
+                next_id += 1
+
+            with transaction.atomic(), tat_auto_now_add(HoaDon):
+                HoaDon.objects.bulk_create(orders, batch_size=batch)
+                ChiTietHoaDon.objects.bulk_create(lines, batch_size=batch)
+            self.stdout.write(f"  hóa đơn {offset + len(orders)}/{n}")
+
+        # Cập nhật tổng chi tiêu (quyết định hạng thành viên) theo đơn đã hoàn thành
+        updates = [KhachHang(id=k, tong_chi_tieu=v) for k, v in chi_tieu.items()]
+        KhachHang.objects.bulk_update(updates, ['tong_chi_tieu'], batch_size=batch)
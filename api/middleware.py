@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+
+from . import perf
+
+try:
+    import brotli
+except ImportError:  # Không cài brotli -> chỉ dùng gzip
+    brotli = None
+
+logger = logging.getLogger('api.perf')
+
+
+class PerformanceMiddleware:
+    """
+    Đo từng request: số query + thời gian DB, thời gian gọi Google Drive,
+    thời gian code view, thời gian render JSON và tổng thời gian.
+    - Trả header `Server-Timing` (xem được trong tab Network của trình duyệt)
+    - Ghi log JSON vào logger 'api.perf'
+    - Cộng vào histogram theo view (xem qua GET /api/perf/histograms/)
+
+    Bật bằng PERF_SAMPLE_RATE (0 -> tắt hẳn, 1 -> đo mọi request, 0.1 -> 10%).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 0)
+        self.window = getattr(settings, 'PERF_HISTOGRAM_WINDOW', 1000)
+
+    def __call__(self, request):
+        # Tắt sampling -> gần như không tốn gì thêm
+        if not self.sample_rate or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return self.get_response(request)
+
+        metrics = perf.RequestMetrics()
+        token = perf.bat_dau(metrics)
+        try:
+            with connection.execute_wrapper(metrics.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            perf.ket_thuc(token)
+
+        timings = metrics.summary()
+        view_name = perf.ten_view(request)
+        perf.ghi_nhan(view_name, timings['total'], metrics.db_count, self.window)
+
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={ms:.1f}' + (f';desc="{metrics.db_count} queries"' if name == 'db' else '')
+            for name, ms in timings.items()
+        )
+        logger.info(json.dumps({
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.db_count,
+            **{f'{name}_ms': round(ms, 2) for name, ms in timings.items()},
+        }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = perf.hien_tai()
+        if metrics is not None:
+            metrics.view_started = metrics.view_started or time.perf_counter()
+        return None
+
+    def process_template_response(self, request, response):
+        # DRF Response được render SAU bước này -> mốc chia giữa 'app' và 'render'
+        metrics = perf.hien_tai()
+        if metrics is not None:
+            metrics.view_ended = time.perf_counter()
+        return response
+
+
+# =========================================================
+# NÉN RESPONSE (gzip / brotli)
+# =========================================================
+_RE_ACCEPTS_BR = re.compile(r'\bbr\b')
+_RE_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'text/csv', 'application/javascript')
+
+
+class CompressionMiddleware:
+    """
+    Nén response API bằng brotli (nếu client hỗ trợ và đã cài `brotli`) hoặc gzip.
+    - Bỏ qua body nhỏ hơn COMPRESSION_MIN_SIZE byte (nén không lợi) và các path nhạy cảm
+      trong COMPRESSION_EXCLUDE_PATHS (response có token -> tránh tấn công kiểu BREACH)
+    - StreamingHttpResponse (sync/async) được nén từng chunk, flush sau mỗi chunk để client nhận dần
+    - Path trong COMPRESSION_CACHE_PATHS (catalog): bytes đã nén được cache theo hash nội dung,
+      cùng nội dung thì không nén lại; vì nén 1 lần dùng nhiều lần nên dùng mức nén cao hơn
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.exclude_paths = tuple(getattr(settings, 'COMPRESSION_EXCLUDE_PATHS', ()))
+        self.cache_paths = tuple(getattr(settings, 'COMPRESSION_CACHE_PATHS', ()))
+        self.cache_ttl = getattr(settings, 'COMPRESSION_CACHE_TTL', 300)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        encoding = self._chon_encoding(request, response)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            patch_vary_headers(response, ('Accept-Encoding',))
+            if response.is_async:
+                response.streaming_content = self._nen_stream_async(response.streaming_content, encoding)
+            else:
+                response.streaming_content = self._nen_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            body = response.content
+            if len(body) < self.min_size:
+                return response
+            patch_vary_headers(response, ('Accept-Encoding',))
+            if request.path.startswith(self.cache_paths):
+                compressed = self._nen_co_cache(body, encoding)
+            else:
+                compressed = self._nen(body, encoding, cached=False)
+            if len(compressed) >= len(body):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Body đã đổi -> ETag mạnh không còn đúng từng byte (giống GZipMiddleware của Django)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def _chon_encoding(self, request, response):
+        if response.has_header('Content-Encoding') or request.path.startswith(self.exclude_paths):
+            return None
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return None
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and _RE_ACCEPTS_BR.search(accept):
+            return 'br'
+        if _RE_ACCEPTS_GZIP.search(accept):
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def _nen(body, encoding, cached):
+        if encoding == 'br':
+            return brotli.compress(body, quality=9 if cached else 4)
+        compressor = zlib.compressobj(9 if cached else 6, zlib.DEFLATED, 31)  # wbits=31 -> định dạng gzip
+        return compressor.compress(body) + compressor.flush()
+
+    def _nen_co_cache(self, body, encoding):
+        key = f"compressed:{encoding}:{hashlib.blake2b(body, digest_size=16).hexdigest()}"
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = self._nen(body, encoding, cached=True)
+            cache.set(key, compressed, self.cache_ttl)
+        return compressed
+
+    @staticmethod
+    def _compressor(encoding):
+        """ (nén 1 chunk + flush, kết thúc) """
+        if encoding == 'br':
+            c = brotli.Compressor(quality=4)
+            return (lambda chunk: c.process(chunk) + c.flush()), c.finish
+        c = zlib.compressobj(6, zlib.DEFLATED, 31)
+        return (lambda chunk: c.compress(chunk) + c.flush(zlib.Z_SYNC_FLUSH)), c.flush
+
+    def _nen_stream(self, content, encoding):
+        nen, ket_thuc = self._compressor(encoding)
+        for chunk in content:
+            out = nen(chunk if isinstance(chunk, bytes) else str(chunk).encode())
+            if out:
+                yield out
+        yield ket_thuc()
+
+    async def _nen_stream_async(self, content, encoding):
+        nen, ket_thuc = self._compressor(encoding)
+        async for chunk in content:
+            out = nen(chunk if isinstance(chunk, bytes) else str(chunk).encode())
+            if out:
+                yield out
+        yield ket_thuc()
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoanhSoSanPhamNgay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ngay', models.DateField()),
+                ('so_luong', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tuixach',
+            name='da_ban',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='tuixach',
+            index=models.Index(fields=['da_ban', '-so_luong_ton'], name='tuixach_da_ban_ton_idx'),
+        ),
+        migrations.AddField(
+            model_name='doanhsosanphamngay',
+            name='tui_xach',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='doanh_so_ngay', to='api.tuixach'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='doanhsosanphamngay',
+            unique_together={('ngay', 'tui_xach')},
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:51
+
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    """ Tính da_ban và rollup ngày từ các đơn HOAN_THANH đã có """
+    TuiXach = apps.get_model('api', 'TuiXach')
+    ChiTietHoaDon = apps.get_model('api', 'ChiTietHoaDon')
+    DoanhSoSanPhamNgay = apps.get_model('api', 'DoanhSoSanPhamNgay')
+
+    completed = ChiTietHoaDon.objects.filter(hoa_don__trang_thai='HOAN_THANH')
+    totals = completed.values('tui_xach_id').annotate(sl=Sum('so_luong')).order_by()
+    TuiXach.objects.bulk_update(
+        [TuiXach(pk=row['tui_xach_id'], da_ban=row['sl']) for row in totals],
+        ['da_ban'], batch_size=2000,
+    )
+
+    daily = (
+        completed.annotate(ngay=TruncDate('hoa_don__ngay_tao'))
+        .values('ngay', 'tui_xach_id')
+        .annotate(sl=Sum('so_luong'))
+        .order_by()
+    )
+    buffer = []
+    for row in daily.iterator(chunk_size=2000):
+        buffer.append(DoanhSoSanPhamNgay(ngay=row['ngay'], tui_xach_id=row['tui_xach_id'], so_luong=row['sl']))
+        if len(buffer) >= 2000:
+            DoanhSoSanPhamNgay.objects.bulk_create(buffer)
+            buffer = []
+    DoanhSoSanPhamNgay.objects.bulk_create(buffer)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_sales_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:10
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from api.phone_numbers import chuan_hoa_sdt
+
+
+def chuan_hoa_va_gop_trung(apps, schema_editor):
+    """
+    Tính sdt_chuan_hoa cho khách cũ rồi gộp các khách trùng số:
+    - Giữ lại 1 khách (ưu tiên khách có tài khoản web, sau đó là khách tạo sớm nhất)
+    - Hóa đơn + tổng chi tiêu của khách trùng chuyển sang khách được giữ, email/địa chỉ còn trống thì bổ sung
+    - Hai tài khoản web khác nhau cùng số -> không thể gộp, tài khoản sau để sdt_chuan_hoa = NULL
+    Gộp xong mới ghi sdt_chuan_hoa -> không bao giờ ghi 2 dòng cùng giá trị.
+    """
+    KhachHang = apps.get_model('api', 'KhachHang')
+    HoaDon = apps.get_model('api', 'HoaDon')
+
+    # Lượt 1: tìm các nhóm trùng số
+    dau_tien = {}
+    nhom = defaultdict(list)
+    for kh_id, raw in KhachHang.objects.values_list('id', 'so_dien_thoai').order_by('id').iterator(chunk_size=2000):
+        sdt = chuan_hoa_sdt(raw)
+        if sdt is None:
+            continue
+        if sdt in dau_tien:
+            if sdt not in nhom:
+                nhom[sdt].append(dau_tien[sdt])
+            nhom[sdt].append(kh_id)
+        else:
+            dau_tien[sdt] = kh_id
+    del dau_tien
+
+    # Lượt 2: gộp từng nhóm
+    bo_qua = set()
+    for ids in nhom.values():
+        ds = sorted(KhachHang.objects.filter(id__in=ids), key=lambda kh: (kh.user_id is None, kh.id))
+        giu = ds[0]
+        for kh in ds[1:]:
+            if kh.user_id is not None:
+                bo_qua.add(kh.id)
+                continue
+            HoaDon.objects.filter(khach_hang_id=kh.id).update(khach_hang_id=giu.id)
+            giu.tong_chi_tieu += kh.tong_chi_tieu
+            giu.email = giu.email or kh.email
+            giu.dia_chi = giu.dia_chi or kh.dia_chi
+            kh.delete()
+        giu.save(update_fields=['tong_chi_tieu', 'email', 'dia_chi'])
+
+    # Lượt 3: ghi dạng chuẩn
+    buffer = []
+    for kh in KhachHang.objects.only('id', 'so_dien_thoai').order_by('id').iterator(chunk_size=2000):
+        if kh.id in bo_qua:
+            continue
+        kh.sdt_chuan_hoa = chuan_hoa_sdt(kh.so_dien_thoai)
+        buffer.append(kh)
+        if len(buffer) >= 2000:
+            KhachHang.objects.bulk_update(buffer, ['sdt_chuan_hoa'])
+            buffer = []
+    KhachHang.objects.bulk_update(buffer, ['sdt_chuan_hoa'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_backfill_sales_counters'),
+    ]
+
+    operations = [
+        # Thêm cột chưa unique -> điền dữ liệu + gộp trùng -> mới bật unique index
+        migrations.AddField(
+            model_name='khachhang',
+            name='sdt_chuan_hoa',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True),
+        ),
+        migrations.RunPython(chuan_hoa_va_gop_trung, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='khachhang',
+            name='sdt_chuan_hoa',
+            field=models.CharField(blank=True, editable=False, max_length=15, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+COT_HOA_DON = (
+    "id, ma_hoa_don, khach_hang_id, nhan_vien_id, loai_hoa_don, trang_thai, phuong_thuc_tt, "
+    "ho_ten_nguoi_nhan, sdt_nguoi_nhan, dia_chi_giao_hang, tong_tien_hang, giam_gia, thanh_tien, "
+    "ghi_chu, ngay_tao, ngay_cap_nhat"
+)
+COT_CHI_TIET = "ct.id, ct.hoa_don_id, ct.tui_xach_id, ct.so_luong, ct.don_gia_luc_ban"
+
+# VIEW gộp đơn đang dùng + đơn lưu trữ (model HoaDonTatCa / ChiTietHoaDonTatCa, managed=False)
+TAO_VIEW = [
+    f"""CREATE VIEW api_hoadon_tatca AS
+        SELECT {COT_HOA_DON}, 0 AS luu_tru FROM api_hoadon
+        UNION ALL
+        SELECT {COT_HOA_DON}, 1 AS luu_tru FROM api_hoadonluutru""",
+    f"""CREATE VIEW api_chitiethoadon_tatca AS
+        SELECT {COT_CHI_TIET}, hd.ngay_tao, hd.trang_thai
+        FROM api_chitiethoadon ct INNER JOIN api_hoadon hd ON hd.id = ct.hoa_don_id
+        UNION ALL
+        SELECT {COT_CHI_TIET}, ct.ngay_tao, hd.trang_thai
+        FROM api_chitiethoadonluutru ct INNER JOIN api_hoadonluutru hd ON hd.id = ct.hoa_don_id""",
+]
+XOA_VIEW = ["DROP VIEW IF EXISTS api_chitiethoadon_tatca", "DROP VIEW IF EXISTS api_hoadon_tatca"]
+
+
+def chia_partition(apps, schema_editor):
+    """
+    MySQL: partition RANGE theo ngay_tao cho 2 bảng lưu trữ. Khóa chính/unique phải chứa cột partition
+    -> khóa chính thành (id, ngay_tao). Ban đầu chỉ có p_max, lệnh archive_orders tách dần ra từng tháng.
+    """
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table in ('api_hoadonluutru', 'api_chitiethoadonluutru'):
+        schema_editor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, ngay_tao)")
+        schema_editor.execute(
+            f"ALTER TABLE {table} PARTITION BY RANGE COLUMNS(ngay_tao) "
+            f"(PARTITION p_max VALUES LESS THAN (MAXVALUE))"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_sdt_chuan_hoa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChiTietHoaDonTatCa',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('so_luong', models.IntegerField()),
+                ('don_gia_luc_ban', models.DecimalField(decimal_places=0, max_digits=12)),
+                ('ngay_tao', models.DateTimeField()),
+                ('trang_thai', models.CharField(choices=[('CHO_XAC_NHAN', 'Chờ xác nhận'), ('DA_XAC_NHAN', 'Đã xác nhận/Đóng gói'), ('DANG_GIAO', 'Đang vận chuyển'), ('HOAN_THANH', 'Đã hoàn thành'), ('DA_HUY', 'Đã hủy')], max_length=20)),
+            ],
+            options={
+                'db_table': 'api_chitiethoadon_tatca',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HoaDonTatCa',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ma_hoa_don', models.CharField(max_length=20)),
+                ('loai_hoa_don', models.CharField(choices=[('ONLINE', 'Web Online'), ('OFFLINE', 'Tại quầy')], max_length=10)),
+                ('trang_thai', models.CharField(choices=[('CHO_XAC_NHAN', 'Chờ xác nhận'), ('DA_XAC_NHAN', 'Đã xác nhận/Đóng gói'), ('DANG_GIAO', 'Đang vận chuyển'), ('HOAN_THANH', 'Đã hoàn thành'), ('DA_HUY', 'Đã hủy')], max_length=20)),
+                ('phuong_thuc_tt', models.CharField(choices=[('COD', 'Thanh toán khi nhận hàng'), ('CK', 'Chuyển khoản ngân hàng'), ('TIEN_MAT', 'Tiền mặt (Tại quầy)')], max_length=20)),
+                ('ho_ten_nguoi_nhan', models.CharField(max_length=200, null=True)),
+                ('sdt_nguoi_nhan', models.CharField(max_length=15, null=True)),
+                ('dia_chi_giao_hang', models.TextField(null=True)),
+                ('tong_tien_hang', models.DecimalField(decimal_places=0, max_digits=15)),
+                ('giam_gia', models.DecimalField(decimal_places=0, max_digits=15)),
+                ('thanh_tien', models.DecimalField(decimal_places=0, max_digits=15)),
+                ('ghi_chu', models.TextField(null=True)),
+                ('ngay_tao', models.DateTimeField()),
+                ('ngay_cap_nhat', models.DateTimeField()),
+                ('luu_tru', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'api_hoadon_tatca',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HoaDonLuuTru',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ma_hoa_don', models.CharField(db_index=True, max_length=20)),
+                ('loai_hoa_don', models.CharField(choices=[('ONLINE', 'Web Online'), ('OFFLINE', 'Tại quầy')], max_length=10)),
+                ('trang_thai', models.CharField(choices=[('CHO_XAC_NHAN', 'Chờ xác nhận'), ('DA_XAC_NHAN', 'Đã xác nhận/Đóng gói'), ('DANG_GIAO', 'Đang vận chuyển'), ('HOAN_THANH', 'Đã hoàn thành'), ('DA_HUY', 'Đã hủy')], max_length=20)),
+                ('phuong_thuc_tt', models.CharField(choices=[('COD', 'Thanh toán khi nhận hàng'), ('CK', 'Chuyển khoản ngân hàng'), ('TIEN_MAT', 'Tiền mặt (Tại quầy)')], max_length=20)),
+                ('ho_ten_nguoi_nhan', models.CharField(blank=True, max_length=200, null=True)),
+                ('sdt_nguoi_nhan', models.CharField(blank=True, max_length=15, null=True)),
+                ('dia_chi_giao_hang', models.TextField(blank=True, null=True)),
+                ('tong_tien_hang', models.DecimalField(decimal_places=0, max_digits=15)),
+                ('giam_gia', models.DecimalField(decimal_places=0, default=0, max_digits=15)),
+                ('thanh_tien', models.DecimalField(decimal_places=0, max_digits=15)),
+                ('ghi_chu', models.TextField(blank=True, null=True)),
+                ('ngay_tao', models.DateTimeField(db_index=True)),
+                ('ngay_cap_nhat', models.DateTimeField()),
+                ('khach_hang', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.khachhang')),
+                ('nhan_vien', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChiTietHoaDonLuuTru',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('so_luong', models.IntegerField(default=1)),
+                ('don_gia_luc_ban', models.DecimalField(decimal_places=0, max_digits=12)),
+                ('ngay_tao', models.DateTimeField()),
+                ('tui_xach', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.tuixach')),
+                ('hoa_don', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='chi_tiet', to='api.hoadonluutru')),
+            ],
+        ),
+        migrations.RunPython(chia_partition, migrations.RunPython.noop),
+        migrations.RunSQL(TAO_VIEW, XOA_VIEW),
+    ]
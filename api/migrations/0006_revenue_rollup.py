@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:42
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """ Doanh thu theo ngày (REPORT_TIME_ZONE) từ các đơn HOAN_THANH đã có, gồm cả đơn lưu trữ """
+    HoaDonTatCa = apps.get_model('api', 'HoaDonTatCa')
+    DoanhThuNgay = apps.get_model('api', 'DoanhThuNgay')
+
+    tz = ZoneInfo(settings.REPORT_TIME_ZONE)
+    tong = {}
+    orders = HoaDonTatCa.objects.filter(trang_thai='HOAN_THANH').values_list('ngay_tao', 'thanh_tien')
+    for ngay_tao, thanh_tien in orders.iterator(chunk_size=2000):
+        ngay = ngay_tao.astimezone(tz).date()
+        doanh_thu, so_don = tong.get(ngay, (0, 0))
+        tong[ngay] = (doanh_thu + thanh_tien, so_don + 1)
+    DoanhThuNgay.objects.bulk_create(
+        [DoanhThuNgay(ngay=ngay, doanh_thu=dt, so_don=sd) for ngay, (dt, sd) in tong.items()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoanhThuNgay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ngay', models.DateField(unique=True)),
+                ('doanh_thu', models.DecimalField(decimal_places=0, default=0, max_digits=17)),
+                ('so_don', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
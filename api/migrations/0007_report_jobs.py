@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:57
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_revenue_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BaoCaoJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('loai', models.CharField(choices=[('DANH_MUC', 'Doanh thu theo danh mục'), ('XUAT_EXCEL', 'Dữ liệu xuất Excel')], max_length=20)),
+                ('tham_so', models.JSONField(default=dict)),
+                ('trang_thai', models.CharField(choices=[('CHO', 'Chờ chạy'), ('DANG_CHAY', 'Đang chạy'), ('XONG', 'Hoàn thành'), ('LOI', 'Lỗi')], db_index=True, default='CHO', max_length=20)),
+                ('ket_qua', models.JSONField(blank=True, null=True)),
+                ('loi', models.TextField(blank=True)),
+                ('ngay_tao', models.DateTimeField(auto_now_add=True)),
+                ('ngay_bat_dau', models.DateTimeField(blank=True, null=True)),
+                ('ngay_xong', models.DateTimeField(blank=True, null=True)),
+                ('nguoi_tao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
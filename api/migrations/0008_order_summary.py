@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:05
+
+from django.db import migrations, models
+from django.db.models import Min, Sum
+
+COT_HOA_DON_CU = (
+    "id, ma_hoa_don, khach_hang_id, nhan_vien_id, loai_hoa_don, trang_thai, phuong_thuc_tt, "
+    "ho_ten_nguoi_nhan, sdt_nguoi_nhan, dia_chi_giao_hang, tong_tien_hang, giam_gia, thanh_tien, "
+    "ghi_chu, ngay_tao, ngay_cap_nhat"
+)
+COT_HOA_DON = COT_HOA_DON_CU + ", so_san_pham, anh_dai_dien"
+COT_CHI_TIET = "ct.id, ct.hoa_don_id, ct.tui_xach_id, ct.so_luong, ct.don_gia_luc_ban"
+
+
+def _tao_view(cot_hoa_don):
+    # Giống 0005_order_archive, view hóa đơn thêm 2 cột tóm tắt. SQLite dựng lại bảng khi thêm cột
+    # -> phải bỏ cả 2 view (view chi tiết join api_hoadon) trước rồi tạo lại sau
+    return [
+        f"""CREATE VIEW api_hoadon_tatca AS
+            SELECT {cot_hoa_don}, 0 AS luu_tru FROM api_hoadon
+            UNION ALL
+            SELECT {cot_hoa_don}, 1 AS luu_tru FROM api_hoadonluutru""",
+        f"""CREATE VIEW api_chitiethoadon_tatca AS
+            SELECT {COT_CHI_TIET}, hd.ngay_tao, hd.trang_thai
+            FROM api_chitiethoadon ct INNER JOIN api_hoadon hd ON hd.id = ct.hoa_don_id
+            UNION ALL
+            SELECT {COT_CHI_TIET}, ct.ngay_tao, hd.trang_thai
+            FROM api_chitiethoadonluutru ct INNER JOIN api_hoadonluutru hd ON hd.id = ct.hoa_don_id""",
+    ]
+
+
+XOA_VIEW = ["DROP VIEW IF EXISTS api_chitiethoadon_tatca", "DROP VIEW IF EXISTS api_hoadon_tatca"]
+
+
+def backfill(apps, schema_editor):
+    """ so_san_pham / anh_dai_dien cho đơn đã có (cả đơn lưu trữ), theo lô 500 đơn """
+    TuiXach = apps.get_model('api', 'TuiXach')
+    anh_tui = dict(TuiXach.objects.values_list('id', 'hinh_anh'))
+    for ten_don, ten_chi_tiet in (('HoaDon', 'ChiTietHoaDon'), ('HoaDonLuuTru', 'ChiTietHoaDonLuuTru')):
+        Don = apps.get_model('api', ten_don)
+        ChiTiet = apps.get_model('api', ten_chi_tiet)
+        tong = ChiTiet.objects.values('hoa_don_id').annotate(sl=Sum('so_luong'), dau=Min('id')).order_by('hoa_don_id')
+        lo = []
+        for row in tong.iterator(chunk_size=2000):
+            lo.append(row)
+            if len(lo) == 500:
+                _ghi_lo(Don, ChiTiet, anh_tui, lo)
+                lo = []
+        if lo:
+            _ghi_lo(Don, ChiTiet, anh_tui, lo)
+
+
+def _ghi_lo(Don, ChiTiet, anh_tui, rows):
+    tui_dau = dict(ChiTiet.objects.filter(id__in=[r['dau'] for r in rows]).values_list('id', 'tui_xach_id'))
+    Don.objects.bulk_update([
+        Don(id=r['hoa_don_id'], so_san_pham=r['sl'] or 0, anh_dai_dien=anh_tui.get(tui_dau.get(r['dau']), ''))
+        for r in rows
+    ], ['so_san_pham', 'anh_dai_dien'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_report_jobs'),
+    ]
+
+    operations = [
+        # VIEW liệt kê cột cụ thể -> bỏ trước khi đổi bảng, tạo lại kèm 2 cột mới ở cuối
+        migrations.RunSQL(XOA_VIEW, _tao_view(COT_HOA_DON_CU)),
+        migrations.AddField(
+            model_name='hoadon',
+            name='anh_dai_dien',
+            field=models.CharField(blank=True, default='', max_length=800),
+        ),
+        migrations.AddField(
+            model_name='hoadon',
+            name='so_san_pham',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='hoadonluutru',
+            name='anh_dai_dien',
+            field=models.CharField(blank=True, default='', max_length=800),
+        ),
+        migrations.AddField(
+            model_name='hoadonluutru',
+            name='so_san_pham',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.RunSQL(_tao_view(COT_HOA_DON), XOA_VIEW),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+COT_HOA_DON = (
+    "id, ma_hoa_don, khach_hang_id, nhan_vien_id, loai_hoa_don, trang_thai, phuong_thuc_tt, "
+    "ho_ten_nguoi_nhan, sdt_nguoi_nhan, dia_chi_giao_hang, tong_tien_hang, giam_gia, thanh_tien, "
+    "ghi_chu, ngay_tao, ngay_cap_nhat, so_san_pham, anh_dai_dien"
+)
+COT_CHI_TIET_CU = "ct.id, ct.hoa_don_id, ct.tui_xach_id, ct.so_luong, ct.don_gia_luc_ban"
+COT_CHI_TIET = COT_CHI_TIET_CU + ", ct.ten_san_pham, ct.anh_san_pham"
+
+
+def _tao_view(cot_chi_tiet):
+    # Giống 0008_order_summary, view chi tiết thêm 2 cột snapshot sản phẩm
+    return [
+        f"""CREATE VIEW api_hoadon_tatca AS
+            SELECT {COT_HOA_DON}, 0 AS luu_tru FROM api_hoadon
+            UNION ALL
+            SELECT {COT_HOA_DON}, 1 AS luu_tru FROM api_hoadonluutru""",
+        f"""CREATE VIEW api_chitiethoadon_tatca AS
+            SELECT {cot_chi_tiet}, hd.ngay_tao, hd.trang_thai
+            FROM api_chitiethoadon ct INNER JOIN api_hoadon hd ON hd.id = ct.hoa_don_id
+            UNION ALL
+            SELECT {cot_chi_tiet}, ct.ngay_tao, hd.trang_thai
+            FROM api_chitiethoadonluutru ct INNER JOIN api_hoadonluutru hd ON hd.id = ct.hoa_don_id""",
+    ]
+
+
+XOA_VIEW = ["DROP VIEW IF EXISTS api_chitiethoadon_tatca", "DROP VIEW IF EXISTS api_hoadon_tatca"]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_order_summary'),
+    ]
+
+    # Không backfill ở đây: bảng chi tiết lớn -> chạy `python manage.py backfill_order_snapshots` sau khi migrate
+    # (theo lô, chạy lại được). Dòng chưa backfill vẫn hiển thị đúng nhờ fallback sang TuiXach.
+    operations = [
+        migrations.RunSQL(XOA_VIEW, _tao_view(COT_CHI_TIET_CU)),
+        migrations.AddField(
+            model_name='chitiethoadon',
+            name='anh_san_pham',
+            field=models.CharField(blank=True, default='', max_length=800),
+        ),
+        migrations.AddField(
+            model_name='chitiethoadon',
+            name='ten_san_pham',
+            field=models.CharField(blank=True, default='', max_length=250),
+        ),
+        migrations.AddField(
+            model_name='chitiethoadonluutru',
+            name='anh_san_pham',
+            field=models.CharField(blank=True, default='', max_length=800),
+        ),
+        migrations.AddField(
+            model_name='chitiethoadonluutru',
+            name='ten_san_pham',
+            field=models.CharField(blank=True, default='', max_length=250),
+        ),
+        migrations.RunSQL(_tao_view(COT_CHI_TIET), XOA_VIEW),
+    ]
@@ -1,7 +1,11 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings
 
+from .phone_numbers import chuan_hoa_sdt
+
 # 1. Bảng Danh Mục (Ví dụ: Túi da, Balo...)
 class DanhMuc(models.Model):
     ten_danh_muc = models.CharField(max_length=100)
@@ -20,6 +24,14 @@ class TuiXach(models.Model):
     hinh_anh = models.CharField(max_length=800)
     
     ngay_tao = models.DateTimeField(auto_now_add=True)
+    # Tổng số lượng đã bán (chỉ tính đơn HOAN_THANH), cập nhật khi đơn hoàn thành/hủy
+    # -> Dashboard xếp hạng bán chạy/bán ế bằng index thay vì join toàn bộ lịch sử đơn
+    da_ban = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['da_ban', '-so_luong_ton'], name='tuixach_da_ban_ton_idx'),
+        ]
 
     def __str__(self):
         return self.ten_tui
@@ -28,11 +40,26 @@ class KhachHang(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile',null=True, blank=True)
     ho_ten = models.CharField(max_length=255)
     so_dien_thoai = models.CharField(max_length=15)
+    # Dạng chuẩn của so_dien_thoai (api/phone_numbers.py), tự tính khi save()
+    # -> tra cứu/chống trùng khách qua unique index thay vì so khớp chuỗi thô
+    sdt_chuan_hoa = models.CharField(max_length=15, unique=True, null=True, blank=True, editable=False)
     email = models.EmailField(max_length=255, null=True, blank=True)
     dia_chi = models.TextField(blank=True, null=True)
     tong_chi_tieu = models.DecimalField(max_digits=15, decimal_places=0, default=0)
     ngay_tham_gia = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        sdt = chuan_hoa_sdt(self.so_dien_thoai)
+        # Số đã thuộc hồ sơ khác, giữ NULL thay vì ghi trùng unique index (chờ gộp sau, như migration 0004):
+        # - khách cũ bị migration 0004 để NULL (2 tài khoản web cùng số)
+        # - tài khoản web mới đăng ký bằng số đã có hồ sơ mua tại quầy (RegisterSerializer)
+        if not ((self.pk or self.user_id) and self.sdt_chuan_hoa is None and sdt is not None
+                and KhachHang.objects.filter(sdt_chuan_hoa=sdt).exclude(pk=self.pk).exists()):
+            self.sdt_chuan_hoa = sdt
+        if kwargs.get('update_fields') is not None and 'so_dien_thoai' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'sdt_chuan_hoa'}
+        super().save(*args, **kwargs)
+
     def get_muc_giam_gia(self):
         """ Trả về % giảm giá (0, 10, hoặc 15) """
         if self.tong_chi_tieu >= 100000000: # >= 100 triệu
@@ -93,6 +120,10 @@ class HoaDon(models.Model):
     ghi_chu = models.TextField(null=True, blank=True)
     ngay_tao = models.DateTimeField(auto_now_add=True, db_index=True)
     ngay_cap_nhat = models.DateTimeField(auto_now=True) # Để biết đơn chuyển trạng thái lúc nào
+    # --- TÓM TẮT CHI TIẾT (ghi lúc tạo đơn) ---
+    # Danh sách "đơn của tôi" dạng tóm tắt đọc thẳng từ đây, không join chi tiết / sản phẩm
+    so_san_pham = models.IntegerField(default=0)  # Tổng số lượng các dòng chi tiết
+    anh_dai_dien = models.CharField(max_length=800, blank=True, default='')  # hinh_anh của sản phẩm đầu tiên
 
     def __str__(self):
         return f"{self.ma_hoa_don} - {self.get_trang_thai_display()}"
@@ -102,6 +133,10 @@ class ChiTietHoaDon(models.Model):
     tui_xach = models.ForeignKey(TuiXach, on_delete=models.PROTECT)
     so_luong = models.IntegerField(default=1)
     don_gia_luc_ban = models.DecimalField(max_digits=12, decimal_places=0) 
+    # Chụp lại tên/ảnh túi lúc bán: hiển thị đơn không cần join TuiXach, đổi tên sản phẩm sau này
+    # không làm sai hóa đơn cũ. Rỗng -> dòng cũ chưa backfill (lệnh backfill_order_snapshots)
+    ten_san_pham = models.CharField(max_length=250, blank=True, default='')
+    anh_san_pham = models.CharField(max_length=800, blank=True, default='')
     
     def thanh_tien_item(self):
         return self.so_luong * self.don_gia_luc_ban
@@ -138,4 +173,142 @@ class BanThietKe(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     def __str__(self):
-        return f"Design {self.id} | {self.nguoi_so_huu.username} | {self.get_trang_thai_display()}"
\ No newline at end of file
+        return f"Design {self.id} | {self.nguoi_so_huu.username} | {self.get_trang_thai_display()}"
+
+
+class DoanhSoSanPhamNgay(models.Model):
+    """ Rollup: số lượng bán (đơn HOAN_THANH) của từng túi theo ngày tạo đơn -> xếp hạng 7/30/90 ngày """
+    tui_xach = models.ForeignKey(TuiXach, related_name='doanh_so_ngay', on_delete=models.CASCADE)
+    ngay = models.DateField()
+    so_luong = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('ngay', 'tui_xach')
+
+
+class DoanhThuNgay(models.Model):
+    """ Rollup: doanh thu + số đơn HOAN_THANH theo ngày tạo đơn (ngày theo REPORT_TIME_ZONE) -> biểu đồ doanh thu """
+    ngay = models.DateField(unique=True)
+    doanh_thu = models.DecimalField(max_digits=17, decimal_places=0, default=0)
+    so_don = models.IntegerField(default=0)
+
+
+class BaoCaoJob(models.Model):
+    """ Báo cáo chạy nền (api/reports.py): tạo -> hỏi trạng thái -> tải kết quả, không giữ request worker """
+    LOAI_CHOICES = [
+        ('DANH_MUC', 'Doanh thu theo danh mục'),   # = /api/thong-ke/bieu_do_tron/
+        ('XUAT_EXCEL', 'Dữ liệu xuất Excel'),       # = /api/thong-ke/du_lieu_xuat_excel/
+    ]
+    TRANG_THAI_CHOICES = [
+        ('CHO', 'Chờ chạy'),
+        ('DANG_CHAY', 'Đang chạy'),
+        ('XONG', 'Hoàn thành'),
+        ('LOI', 'Lỗi'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # Không đoán được id của job khác
+    loai = models.CharField(max_length=20, choices=LOAI_CHOICES)
+    tham_so = models.JSONField(default=dict)  # {'from_date': 'YYYY-MM-DD', 'to_date': 'YYYY-MM-DD'}
+    trang_thai = models.CharField(max_length=20, choices=TRANG_THAI_CHOICES, default='CHO', db_index=True)
+    ket_qua = models.JSONField(null=True, blank=True)
+    loi = models.TextField(blank=True)
+    nguoi_tao = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    ngay_tao = models.DateTimeField(auto_now_add=True)
+    ngay_bat_dau = models.DateTimeField(null=True, blank=True)
+    ngay_xong = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_loai_display()} {self.tham_so} - {self.get_trang_thai_display()}"
+
+
+# =========================================================
+# LƯU TRỮ ĐƠN HÀNG CŨ (xem api/archive.py, lệnh archive_orders)
+# =========================================================
+# Đơn đã đóng (HOAN_THANH / DA_HUY) quá ORDER_ARCHIVE_MONTHS tháng được chuyển từ HoaDon/ChiTietHoaDon
+# sang 2 bảng dưới (giữ nguyên id). Trên MySQL 2 bảng này được chia partition theo tháng của ngay_tao.
+# Không có khóa ngoại thật (db_constraint=False): InnoDB không cho khóa ngoại trên bảng có partition.
+class HoaDonLuuTru(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    ma_hoa_don = models.CharField(max_length=20, db_index=True)
+    khach_hang = models.ForeignKey(KhachHang, on_delete=models.DO_NOTHING, null=True, blank=True,
+                                   db_constraint=False, related_name='+')
+    nhan_vien = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True,
+                                  db_constraint=False, related_name='+')
+    loai_hoa_don = models.CharField(max_length=10, choices=HoaDon.LOAI_HOA_DON_CHOICES)
+    trang_thai = models.CharField(max_length=20, choices=HoaDon.TRANG_THAI_CHOICES)
+    phuong_thuc_tt = models.CharField(max_length=20, choices=HoaDon.PHUONG_THUC_TT_CHOICES)
+    ho_ten_nguoi_nhan = models.CharField(max_length=200, null=True, blank=True)
+    sdt_nguoi_nhan = models.CharField(max_length=15, null=True, blank=True)
+    dia_chi_giao_hang = models.TextField(null=True, blank=True)
+    tong_tien_hang = models.DecimalField(max_digits=15, decimal_places=0)
+    giam_gia = models.DecimalField(max_digits=15, decimal_places=0, default=0)
+    thanh_tien = models.DecimalField(max_digits=15, decimal_places=0)
+    ghi_chu = models.TextField(null=True, blank=True)
+    ngay_tao = models.DateTimeField(db_index=True)
+    ngay_cap_nhat = models.DateTimeField()
+    so_san_pham = models.IntegerField(default=0)
+    anh_dai_dien = models.CharField(max_length=800, blank=True, default='')
+
+    def __str__(self):
+        return f"{self.ma_hoa_don} - {self.get_trang_thai_display()} (lưu trữ)"
+
+
+class ChiTietHoaDonLuuTru(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    hoa_don = models.ForeignKey(HoaDonLuuTru, related_name='chi_tiet', on_delete=models.CASCADE, db_constraint=False)
+    tui_xach = models.ForeignKey(TuiXach, on_delete=models.PROTECT, db_constraint=False, related_name='+')
+    so_luong = models.IntegerField(default=1)
+    don_gia_luc_ban = models.DecimalField(max_digits=12, decimal_places=0)
+    ten_san_pham = models.CharField(max_length=250, blank=True, default='')
+    anh_san_pham = models.CharField(max_length=800, blank=True, default='')
+    ngay_tao = models.DateTimeField()  # = ngay_tao của hóa đơn: khóa partition của bảng này
+
+    def thanh_tien_item(self):
+        return self.so_luong * self.don_gia_luc_ban
+
+
+# Đọc gộp đơn đang dùng + đơn lưu trữ (VIEW UNION ALL, tạo trong migration 0005) cho báo cáo / lịch sử mua hàng.
+# Chỉ đọc. Filter theo ngay_tao / khach_hang được đẩy xuống từng bảng (và partition) bên dưới.
+class HoaDonTatCa(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    ma_hoa_don = models.CharField(max_length=20)
+    khach_hang = models.ForeignKey(KhachHang, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    nhan_vien = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, related_name='+')
+    loai_hoa_don = models.CharField(max_length=10, choices=HoaDon.LOAI_HOA_DON_CHOICES)
+    trang_thai = models.CharField(max_length=20, choices=HoaDon.TRANG_THAI_CHOICES)
+    phuong_thuc_tt = models.CharField(max_length=20, choices=HoaDon.PHUONG_THUC_TT_CHOICES)
+    ho_ten_nguoi_nhan = models.CharField(max_length=200, null=True)
+    sdt_nguoi_nhan = models.CharField(max_length=15, null=True)
+    dia_chi_giao_hang = models.TextField(null=True)
+    tong_tien_hang = models.DecimalField(max_digits=15, decimal_places=0)
+    giam_gia = models.DecimalField(max_digits=15, decimal_places=0)
+    thanh_tien = models.DecimalField(max_digits=15, decimal_places=0)
+    ghi_chu = models.TextField(null=True)
+    ngay_tao = models.DateTimeField()
+    ngay_cap_nhat = models.DateTimeField()
+    so_san_pham = models.IntegerField()
+    anh_dai_dien = models.CharField(max_length=800)
+    luu_tru = models.BooleanField()  # True -> dòng nằm ở bảng lưu trữ
+
+    class Meta:
+        managed = False
+        db_table = 'api_hoadon_tatca'
+
+
+class ChiTietHoaDonTatCa(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    hoa_don = models.ForeignKey(HoaDonTatCa, related_name='chi_tiet', on_delete=models.DO_NOTHING)
+    tui_xach = models.ForeignKey(TuiXach, on_delete=models.DO_NOTHING, related_name='+')
+    so_luong = models.IntegerField()
+    don_gia_luc_ban = models.DecimalField(max_digits=12, decimal_places=0)
+    ten_san_pham = models.CharField(max_length=250)
+    anh_san_pham = models.CharField(max_length=800)
+    # Lấy từ hóa đơn: báo cáo lọc/gom trên chính view này, không phải join sang view hóa đơn
+    ngay_tao = models.DateTimeField()
+    trang_thai = models.CharField(max_length=20, choices=HoaDon.TRANG_THAI_CHOICES)
+
+    class Meta:
+        managed = False
+        db_table = 'api_chitiethoadon_tatca'
+
+    def thanh_tien_item(self):
+        return self.so_luong * self.don_gia_luc_ban
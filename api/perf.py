@@ -0,0 +1,156 @@
+"""
+Đo hiệu năng theo từng request (dùng bởi PerformanceMiddleware).
+
+- RequestMetrics: số query + thời gian DB, thời gian gọi Drive, ... của 1 request
+- do_thoi_gian('drive'): context manager/decorator cộng thời gian vào request hiện tại
+- Histogram cuộn (rolling) theo từng view, giữ trong bộ nhớ của process
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('perf_metrics', default=None)
+
+# Mốc bucket (ms) cho histogram, bucket cuối là +Inf
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_ended = None
+        self.db_count = 0
+        self.timings = {'db': 0.0, 'drive': 0.0}
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """ Gắn vào connection.execute_wrapper để đếm & đo thời gian query """
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings['db'] += time.perf_counter() - t0
+            self.db_count += 1
+
+    def add(self, bucket, seconds):
+        self.timings[bucket] = self.timings.get(bucket, 0.0) + seconds
+
+    def summary(self):
+        """ Trả về dict thời gian (ms): total, db, drive, app (code view), render """
+        now = time.perf_counter()
+        total = now - self.started
+        result = {k: v * 1000 for k, v in self.timings.items()}
+        if self.view_started is not None:
+            view_end = self.view_ended or now
+            # Thời gian xử lý trong view, trừ phần đã tính cho DB/Drive
+            result['app'] = max(0.0, (view_end - self.view_started) * 1000 - result['db'] - result['drive'])
+            if self.view_ended is not None:
+                result['render'] = (now - self.view_ended) * 1000
+        result['total'] = total * 1000
+        return result
+
+
+def bat_dau(metrics):
+    return _current.set(metrics)
+
+
+def ket_thuc(token):
+    _current.reset(token)
+
+
+def hien_tai():
+    return _current.get()
+
+
+@contextmanager
+def do_thoi_gian(bucket):
+    """ Cộng thời gian chạy của khối lệnh vào bucket của request đang được đo (nếu có) """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(bucket, time.perf_counter() - t0)
+
+
+# =========================================================
+# HISTOGRAM THEO VIEW
+# =========================================================
+class RollingHistogram:
+    """ Đếm theo bucket cố định + giữ N mẫu gần nhất để tính p50/p95/p99 """
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.db_queries = 0
+
+    def add(self, total_ms, db_count):
+        self.samples.append(total_ms)
+        self.buckets[bisect_left(BUCKETS_MS, total_ms)] += 1
+        self.count += 1
+        self.total_ms += total_ms
+        self.db_queries += db_count
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2) if ordered else 0
+
+        labels = [f"le_{b}" for b in BUCKETS_MS] + ['le_inf']
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else 0,
+            'p50_ms': pct(50),
+            'p95_ms': pct(95),
+            'p99_ms': pct(99),
+            'queries_per_request': round(self.db_queries / self.count, 2) if self.count else 0,
+            'buckets': dict(zip(labels, self.buckets)),
+        }
+
+
+_histograms = {}
+_lock = threading.Lock()
+
+
+def ghi_nhan(view_name, total_ms, db_count, window=1000):
+    with _lock:
+        hist = _histograms.get(view_name)
+        if hist is None:
+            hist = _histograms[view_name] = RollingHistogram(window)
+        hist.add(total_ms, db_count)
+
+
+def snapshot():
+    with _lock:
+        return {name: hist.snapshot() for name, hist in sorted(_histograms.items())}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def ten_view(request):
+    """ Tên view dạng 'QuanLyDonHangViewSet.list' hoặc 'DashboardSummaryView' """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = match.func
+    cls = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    if cls is None:
+        return match.view_name or getattr(func, '__name__', 'unknown')
+    actions = getattr(func, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower())
+        if action:
+            return f"{cls.__name__}.{action}"
+    return cls.__name__
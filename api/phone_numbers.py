@@ -0,0 +1,56 @@
+"""
+Chuẩn hóa số điện thoại Việt Nam về một dạng duy nhất để tra cứu/chống trùng khách hàng.
+
+    "+84 912 345 678", "84912345678", "0912.345.678" -> "0912345678"
+    "0168 123 4567" (đầu số 11 số cũ)                  -> "0381234567"
+"""
+import re
+
+_RE_NON_DIGIT = re.compile(r'\D')
+
+# Đầu số di động 11 số cũ -> đầu số 10 số (chuyển đổi năm 2018)
+DAU_SO_CU = {
+    '0120': '070', '0121': '079', '0122': '077', '0126': '076', '0128': '078',
+    '0123': '083', '0124': '084', '0125': '085', '0127': '081', '0129': '082',
+    '0162': '032', '0163': '033', '0164': '034', '0165': '035', '0166': '036',
+    '0167': '037', '0168': '038', '0169': '039',
+    '0186': '056', '0188': '058', '0199': '059',
+}
+
+
+def _quoc_te_ve_noi_dia(digits):
+    if digits.startswith('0084'):
+        return '0' + digits[4:]
+    if digits.startswith('84') and len(digits) > 9:
+        return '0' + digits[2:]
+    return digits
+
+
+def chuan_hoa_sdt(raw):
+    """ Số đầy đủ -> dạng chuẩn "0xxxxxxxxx"; None nếu không phải số điện thoại hợp lệ """
+    if not raw:
+        return None
+    digits = _quoc_te_ve_noi_dia(_RE_NON_DIGIT.sub('', str(raw)))
+    if not digits.startswith('0'):
+        digits = '0' + digits  # Khách hay bỏ số 0 đầu: "912345678"
+    if len(digits) == 11 and digits[:4] in DAU_SO_CU:
+        digits = DAU_SO_CU[digits[:4]] + digits[4:]
+    if not 10 <= len(digits) <= 11:
+        return None
+    return digits
+
+
+def chuan_hoa_tien_to(raw):
+    """ Chuẩn hóa phần đầu số đang gõ (ô gợi ý ở POS); None nếu chưa có chữ số nào """
+    digits = _RE_NON_DIGIT.sub('', str(raw or ''))
+    if not digits:
+        return None
+    if str(raw).lstrip().startswith('+') and digits.startswith('84'):
+        digits = '0' + digits[2:]
+    elif digits.startswith('0084'):
+        digits = '0' + digits[4:]
+    if not digits.startswith('0'):
+        digits = '0' + digits
+    if len(digits) >= 4 and digits[:4] in DAU_SO_CU:
+        digits = DAU_SO_CU[digits[:4]] + digits[4:]
+    return digits[:11]
@@ -0,0 +1,265 @@
+"""
+Phát hiện N+1 và query chậm (dùng cho môi trường dev/staging và test).
+
+- Mỗi câu SQL được "lấy dấu" (fingerprint): bỏ tham số, gộp IN (...), bỏ danh sách cột SELECT -> cùng hình dạng
+- Cùng 1 fingerprint lặp lại >= QUERY_INSPECTOR_THRESHOLD lần trong 1 request -> nghi N+1
+- Query chạy lâu hơn QUERY_INSPECTOR_SLOW_MS -> query chậm
+- Mỗi phát hiện kèm vị trí trong code (file:hàm:dòng) đã gọi query
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .perf import ten_view
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_PLACEHOLDER = re.compile(r"%s|\?")
+_RE_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_RE_SPACES = re.compile(r"\s+")
+_RE_QUOTES = re.compile(r'[`"]')  # MySQL dùng `, SQLite/Postgres dùng " -> bỏ để baseline dùng chung
+# Danh sách cột sau SELECT -> "...": thêm cột vào model không làm đổi fingerprint (baseline không bị cũ)
+_RE_SELECT_LIST = re.compile(r"\bSELECT\s+(DISTINCT\s+)?.*?\s+FROM\b", re.IGNORECASE | re.DOTALL)
+
+THIS_FILE = os.path.abspath(__file__)
+# Code đo đạc (middleware) không phải nơi phát sinh query -> bỏ qua khi tìm vị trí
+SKIP_MODULES = ('api.middleware', 'api.perf', 'api.query_inspector')
+SKIP_FILES = {os.path.join(os.path.dirname(THIS_FILE), f"{m.split('.')[-1]}.py") for m in SKIP_MODULES}
+SKIP_FILES.add(os.path.join(settings.BASE_DIR, 'manage.py'))
+
+logger = logging.getLogger('api.perf')
+
+
+def fingerprint(sql):
+    """ Chuẩn hóa SQL về "hình dạng": bỏ giá trị cụ thể để các query giống nhau gom chung 1 nhóm """
+    sql = _RE_STRING.sub('?', sql)
+    sql = _RE_NUMBER.sub('?', sql)
+    sql = _RE_PLACEHOLDER.sub('?', sql)
+    sql = _RE_IN_LIST.sub('IN (...)', sql)
+    sql = _RE_QUOTES.sub('', sql)
+    sql = _RE_SELECT_LIST.sub(lambda m: f"SELECT {m.group(1) or ''}... FROM", sql)
+    return _RE_SPACES.sub(' ', sql).strip()
+
+
+def fingerprint_id(fp):
+    return hashlib.sha1(fp.encode('utf-8')).hexdigest()[:12]
+
+
+def vi_tri_goi():
+    """
+    Vị trí code đã gọi query: frame đầu tiên (tính từ trong ra) thuộc project.
+    Với view generic của DRF (list/retrieve không viết lại) thì không có frame nào của project,
+    khi đó lấy frame có `self` là class của project, ví dụ "api/views.py:QuanLyDonHangViewSet.list".
+    """
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (filename.startswith(base) and filename not in SKIP_FILES
+                and 'site-packages' not in filename and os.sep + 'tests' not in filename):
+            rel = os.path.relpath(filename, base)
+            return f"{rel}:{frame.f_code.co_name}:{frame.f_lineno}"
+        owner = frame.f_locals.get('self')
+        module = type(owner).__module__ if owner is not None else ''
+        if module.startswith('api.') and module not in SKIP_MODULES:
+            return f"{module.replace('.', '/')}.py:{type(owner).__name__}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryInspector:
+    """
+    Context manager ghi lại mọi query trên tất cả connection:
+
+        with QueryInspector() as qi:
+            client.get('/api/quan-ly-don-hang/')
+        qi.findings()
+    """
+
+    def __init__(self, threshold=None, slow_ms=None):
+        self.threshold = threshold or getattr(settings, 'QUERY_INSPECTOR_THRESHOLD', 3)
+        self.slow_ms = slow_ms or getattr(settings, 'QUERY_INSPECTOR_SLOW_MS', 100)
+        self.queries = []
+        self._stack = None
+
+    def _wrapper(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - t0) * 1000, vi_tri_goi()))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self._wrapper))
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+        return False
+
+    def findings(self):
+        """ Danh sách phát hiện: {'kind': 'n_plus_one'|'slow', 'fingerprint', 'count', 'total_ms', 'location', ...} """
+        groups = defaultdict(list)
+        for sql, ms, location in self.queries:
+            groups[fingerprint(sql)].append((sql, ms, location))
+
+        results = []
+        for fp, items in groups.items():
+            if len(items) >= self.threshold:
+                locations = defaultdict(int)
+                for _, _, location in items:
+                    locations[location] += 1
+                results.append({
+                    'kind': 'n_plus_one',
+                    'fingerprint': fp,
+                    'id': fingerprint_id(fp),
+                    'count': len(items),
+                    'total_ms': round(sum(ms for _, ms, _ in items), 2),
+                    'location': max(locations, key=locations.get),
+                    'sample': items[0][0],
+                })
+        for sql, ms, location in self.queries:
+            if ms >= self.slow_ms:
+                fp = fingerprint(sql)
+                results.append({
+                    'kind': 'slow',
+                    'fingerprint': fp,
+                    'id': fingerprint_id(fp),
+                    'count': 1,
+                    'total_ms': round(ms, 2),
+                    'location': location,
+                    'sample': sql,
+                })
+        return results
+
+
+# =========================================================
+# BÁO CÁO TỔNG HỢP (gom phát hiện của nhiều request)
+# =========================================================
+class QueryReport:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def add(self, view_name, findings):
+        with self._lock:
+            for f in findings:
+                key = (view_name, f['kind'], f['id'])
+                item = self._items.get(key)
+                if item is None:
+                    item = self._items[key] = {
+                        'view': view_name, 'kind': f['kind'], 'fingerprint': f['fingerprint'],
+                        'location': f['location'], 'requests': 0, 'queries': 0, 'total_ms': 0.0,
+                    }
+                item['requests'] += 1
+                item['queries'] += f['count']
+                item['total_ms'] = round(item['total_ms'] + f['total_ms'], 2)
+
+    def as_list(self):
+        with self._lock:
+            return sorted(self._items.values(), key=lambda i: -i['total_ms'])
+
+    def reset(self):
+        with self._lock:
+            self._items.clear()
+
+
+report = QueryReport()
+
+
+class QueryInspectorMiddleware:
+    """ Bật bằng QUERY_INSPECTOR_ENABLED: ghi log cảnh báo + gom vào báo cáo (GET /api/perf/query-report/) """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_INSPECTOR_ENABLED', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with QueryInspector() as qi:
+            response = self.get_response(request)
+        findings = qi.findings()
+        if findings:
+            view_name = ten_view(request)
+            report.add(view_name, findings)
+            response['X-Query-Warnings'] = str(len(findings))
+            for f in findings:
+                logger.warning(json.dumps({
+                    'query_warning': f['kind'], 'view': view_name, 'count': f['count'],
+                    'total_ms': f['total_ms'], 'location': f['location'], 'sql': f['fingerprint'][:300],
+                }, ensure_ascii=False))
+        return response
+
+
+# =========================================================
+# TIỆN ÍCH CHO TEST: fail khi xuất hiện N+1 MỚI
+# =========================================================
+BASELINE_FILE = os.path.join(os.path.dirname(THIS_FILE), 'query_baseline.json')
+
+
+def _pattern_key(finding):
+    # Bỏ số dòng để baseline không bị lệch mỗi khi sửa code phía trên
+    location = finding['location'].rsplit(':', 1)[0]
+    return f"{location}|{finding['id']}"
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('patterns', {})
+
+
+def save_baseline(patterns, path=BASELINE_FILE):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'patterns': dict(sorted(patterns.items()))}, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+class NPlusOneTestMixin:
+    """
+    Mixin cho TestCase:
+
+        with self.assertNoNewNPlusOne():
+            self.client.get(...)
+
+    Các mẫu N+1 đã biết nằm trong api/query_baseline.json sẽ được bỏ qua.
+    Chạy với QUERY_BASELINE_UPDATE=1 để ghi các mẫu hiện tại vào baseline.
+    """
+
+    def assertNoNewNPlusOne(self, threshold=None):
+        test = self
+
+        class _Ctx(QueryInspector):
+            def __exit__(self, *exc):
+                super().__exit__(*exc)
+                if exc[0] is not None:
+                    return False
+                baseline = load_baseline()
+                new = {
+                    _pattern_key(f): f['fingerprint']
+                    for f in self.findings() if f['kind'] == 'n_plus_one'
+                    and _pattern_key(f) not in baseline
+                }
+                if new and os.environ.get('QUERY_BASELINE_UPDATE') == '1':
+                    baseline.update(new)
+                    save_baseline(baseline)
+                elif new:
+                    test.fail("Phát hiện N+1 mới:\n" + "\n".join(f"  {k}\n    {v[:200]}" for k, v in new.items()))
+                return False
+
+        return _Ctx(threshold=threshold)
@@ -0,0 +1,50 @@
+"""
+JSONRenderer nhanh dựa trên orjson (rơi về JSONRenderer của DRF nếu không cài orjson).
+
+Kết quả giống hệt renderer mặc định:
+- Decimal -> số (float), datetime -> ISO 8601, UTC ghi là 'Z' (dùng lại encoder của DRF cho các kiểu này)
+- Không escape tiếng Việt (UNICODE_JSON), JSON gọn (COMPACT_JSON), escape U+2028/U+2029
+Trường hợp orjson không xử lý được (số nguyên > 64 bit, ?indent=...) cũng đi đường DRF.
+"""
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - môi trường chưa cài orjson
+    orjson = None
+
+_encoder = JSONEncoder()
+OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(obj):
+    # Decimal (tiền) là kiểu gặp nhiều nhất -> kiểm tra trước chuỗi isinstance của encoder DRF
+    if type(obj) is Decimal:
+        return float(obj)
+    return _encoder.default(obj)
+
+
+def dumps(data):
+    """ Encode giống JSONRenderer của DRF; dùng được cả ngoài view (export, cache...) """
+    if orjson is None:
+        return JSONRenderer().render(data)
+    try:
+        ret = orjson.dumps(data, default=_default, option=OPTIONS)
+    except orjson.JSONEncodeError:
+        return JSONRenderer().render(data)
+    # Giống DRF: U+2028/U+2029 hợp lệ trong JSON nhưng làm hỏng JavaScript cũ
+    return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or not api_settings.UNICODE_JSON or not api_settings.COMPACT_JSON
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return dumps(data)
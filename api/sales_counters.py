@@ -0,0 +1,172 @@
+"""
+Bộ đếm doanh số theo sản phẩm (materialized) cho Dashboard.
+
+- TuiXach.da_ban: tổng số lượng đã bán, cộng khi đơn chuyển sang HOAN_THANH,
+  trừ khi một đơn đã HOAN_THANH bị hủy.
+- DoanhSoSanPhamNgay: rollup theo ngày tạo đơn -> xếp hạng 7/30/90 ngày
+  chỉ quét (số sản phẩm x số ngày) dòng, không phụ thuộc độ dài lịch sử đơn.
+- DoanhThuNgay: doanh thu + số đơn theo ngày (theo REPORT_TIME_ZONE) -> biểu đồ doanh thu (api/timeseries.py).
+
+Nếu dữ liệu bị lệch (import tay, sửa DB...) chạy `python manage.py rebuild_sales_counters`.
+"""
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Subquery, OuterRef, IntegerField, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from . import caching
+from .models import TuiXach, ChiTietHoaDon, ChiTietHoaDonTatCa, DoanhSoSanPhamNgay, DoanhThuNgay, HoaDonTatCa
+
+WINDOWS = (7, 30, 90)
+
+
+def ngay_bao_cao(dt):
+    """ Ngày (theo timezone hiện tại) dùng làm khóa rollup """
+    return timezone.localdate(dt)
+
+
+def ngay_doanh_thu(dt):
+    """ Ngày theo múi giờ báo cáo (REPORT_TIME_ZONE, khác TIME_ZONE='UTC' của server) """
+    return dt.astimezone(ZoneInfo(settings.REPORT_TIME_ZONE)).date()
+
+
+def _cong_don(model, khoa, **delta):
+    """ Cộng dồn vào dòng rollup, chưa có thì tạo """
+    cap_nhat = {field: F(field) + value for field, value in delta.items()}
+    if model.objects.filter(**khoa).update(**cap_nhat):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**khoa, **delta)
+    except IntegrityError:
+        # Request khác vừa tạo dòng rollup này -> cộng dồn vào
+        model.objects.filter(**khoa).update(**cap_nhat)
+
+
+def _cap_nhat(hoa_don, dau):
+    rows = (
+        ChiTietHoaDon.objects.filter(hoa_don=hoa_don)
+        .values('tui_xach_id')
+        .annotate(sl=Sum('so_luong'))
+    )
+    ngay = ngay_bao_cao(hoa_don.ngay_tao)
+    for row in rows:
+        delta = dau * row['sl']
+        TuiXach.objects.filter(pk=row['tui_xach_id']).update(da_ban=F('da_ban') + delta)
+        _cong_don(DoanhSoSanPhamNgay, {'ngay': ngay, 'tui_xach_id': row['tui_xach_id']}, so_luong=delta)
+    ngay = ngay_doanh_thu(hoa_don.ngay_tao)
+    _cong_don(DoanhThuNgay, {'ngay': ngay}, doanh_thu=dau * (hoa_don.thanh_tien or 0), so_don=dau)
+    if ngay < timezone.localdate(timezone=ZoneInfo(settings.REPORT_TIME_ZONE)):
+        # Số liệu của ngày đã qua thay đổi -> bỏ cache báo cáo các kỳ đã đóng (xem comparison.py)
+        transaction.on_commit(caching.tang_phien_ban_doanh_thu_cu)
+
+
+def ghi_nhan_hoan_thanh(hoa_don):
+    """ Gọi trong transaction, ngay sau khi đơn chuyển sang HOAN_THANH """
+    _cap_nhat(hoa_don, +1)
+
+
+def ghi_nhan_huy(hoa_don, trang_thai_cu):
+    """ Gọi khi hủy đơn: chỉ trừ bộ đếm nếu đơn đã từng được tính (HOAN_THANH) """
+    if trang_thai_cu == 'HOAN_THANH':
+        _cap_nhat(hoa_don, -1)
+
+
+# =========================================================
+# XẾP HẠNG
+# =========================================================
+def _ban_trong_ky(days):
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return Coalesce(
+        Subquery(
+            DoanhSoSanPhamNgay.objects.filter(tui_xach=OuterRef('pk'), ngay__gte=since)
+            .values('tui_xach')
+            .annotate(total=Sum('so_luong'))
+            .values('total')[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def ban_chay(limit=5, days=None):
+    """ Top bán chạy: toàn thời gian đọc thẳng cột da_ban (có index), theo kỳ thì cộng rollup """
+    if days is None:
+        return TuiXach.objects.filter(da_ban__gt=0).annotate(total_sold=F('da_ban')).order_by('-da_ban')[:limit]
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = list(
+        DoanhSoSanPhamNgay.objects.filter(ngay__gte=since)
+        .values('tui_xach_id')
+        .annotate(total=Sum('so_luong'))
+        .filter(total__gt=0)
+        .order_by('-total')[:limit]
+    )
+    products = TuiXach.objects.in_bulk([t['tui_xach_id'] for t in totals])
+    result = []
+    for t in totals:
+        tui = products[t['tui_xach_id']]
+        tui.total_sold = t['total']
+        result.append(tui)
+    return result
+
+
+def ban_cham(limit=5, days=None):
+    """ Top bán ế: bán ít nhất, cùng mức thì ưu tiên tồn kho nhiều """
+    if days is None:
+        return TuiXach.objects.annotate(total_sold=F('da_ban')).order_by('da_ban', '-so_luong_ton')[:limit]
+    return TuiXach.objects.annotate(total_sold=_ban_trong_ky(days)).order_by('total_sold', '-so_luong_ton')[:limit]
+
+
+# =========================================================
+# TÍNH LẠI TỪ ĐẦU
+# =========================================================
+def rebuild(batch_size=2000):
+    """ Tính lại da_ban và rollup ngày từ toàn bộ lịch sử đơn HOAN_THANH (gồm cả đơn đã lưu trữ) """
+    completed = ChiTietHoaDonTatCa.objects.filter(trang_thai='HOAN_THANH')
+    with transaction.atomic():
+        TuiXach.objects.exclude(da_ban=0).update(da_ban=0)
+        totals = completed.values('tui_xach_id').annotate(sl=Sum('so_luong')).order_by()
+        TuiXach.objects.bulk_update(
+            [TuiXach(pk=row['tui_xach_id'], da_ban=row['sl']) for row in totals],
+            ['da_ban'], batch_size=batch_size,
+        )
+
+        DoanhSoSanPhamNgay.objects.all().delete()
+        daily = (
+            completed.annotate(ngay=TruncDate('ngay_tao'))
+            .values('ngay', 'tui_xach_id')
+            .annotate(sl=Sum('so_luong'))
+            .order_by()
+        )
+        buffer = []
+        for row in daily.iterator(chunk_size=batch_size):
+            buffer.append(DoanhSoSanPhamNgay(ngay=row['ngay'], tui_xach_id=row['tui_xach_id'], so_luong=row['sl']))
+            if len(buffer) >= batch_size:
+                DoanhSoSanPhamNgay.objects.bulk_create(buffer)
+                buffer = []
+        DoanhSoSanPhamNgay.objects.bulk_create(buffer)
+        rebuild_doanh_thu(batch_size)
+
+
+def rebuild_doanh_thu(batch_size=2000):
+    """
+    Tính lại DoanhThuNgay từ toàn bộ đơn HOAN_THANH (gồm cả đơn đã lưu trữ).
+    Gom ngày bằng Python thay vì TruncDate(tzinfo=...): MySQL cần nạp bảng múi giờ mới CONVERT_TZ được.
+    """
+    tong = {}
+    orders = HoaDonTatCa.objects.filter(trang_thai='HOAN_THANH').values_list('ngay_tao', 'thanh_tien')
+    for ngay_tao, thanh_tien in orders.iterator(chunk_size=batch_size):
+        ngay = ngay_doanh_thu(ngay_tao)
+        doanh_thu, so_don = tong.get(ngay, (0, 0))
+        tong[ngay] = (doanh_thu + thanh_tien, so_don + 1)
+    with transaction.atomic():
+        DoanhThuNgay.objects.all().delete()
+        DoanhThuNgay.objects.bulk_create(
+            [DoanhThuNgay(ngay=ngay, doanh_thu=dt, so_don=sd) for ngay, (dt, sd) in tong.items()],
+            batch_size=batch_size,
+        )
+        transaction.on_commit(caching.tang_phien_ban_doanh_thu_cu)
@@ -1,14 +1,35 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import *
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from django.db.models import Sum
 from django.db import transaction
+from . import caching
+from .phone_numbers import chuan_hoa_sdt
+from .tokens import CachedRefreshToken
 
 # ========================================================
 # 1. CORE SERIALIZERS (Dùng chung cho cả hệ thống)
 # ========================================================
 class MyTokenSerializer(TokenObtainPairSerializer):
+    token_class = CachedRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        """
+        Nhúng quyền + ID hồ sơ khách + hạng thành viên vào JWT:
+        - is_staff/is_superuser: StatelessJWTAuthentication kiểm tra quyền không cần query auth_user
+        - khach_hang_id: API phía khách không cần tra bảng KhachHang
+        """
+        token = super().get_token(user)
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        khach = caching.lay_khach_hang(user.id)
+        if khach:
+            token['khach_hang_id'] = khach['id']
+            token['muc_giam_gia'] = khach['muc_giam_gia']
+        return token
+
     def validate(self, attrs):
         # 1. Gọi hàm gốc để lấy access/refresh token chuẩn
         data = super().validate(attrs)
@@ -32,12 +53,11 @@ class MyTokenSerializer(TokenObtainPairSerializer):
         # 5. Lấy họ tên hiển thị (Tuỳ chọn: Nếu là khách thì lấy tên trong bảng KhachHang)
         full_name = user.username # Mặc định lấy username
         if role == 'CUSTOMER':
-            try:
-                khach = KhachHang.objects.get(user=user)
-                full_name = khach.ho_ten
+            # Đã được get_token() nạp vào cache -> không query thêm
+            khach = caching.lay_khach_hang(user.id)
+            if khach:
+                full_name = khach['ho_ten']
                 data['avatar'] = "" # Nếu có avatar thì thêm vào đây
-            except KhachHang.DoesNotExist:
-                pass
         elif role in ['ADMIN', 'STAFF']:
             # Nếu admin/staff có đặt first_name/last_name
             if user.first_name or user.last_name:
@@ -45,6 +65,12 @@ class MyTokenSerializer(TokenObtainPairSerializer):
 
         data['full_name'] = full_name
         return data
+
+
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    """ /api/token/refresh/: kiểm tra blacklist qua cache + bloom filter (xem api/tokens.py) """
+    token_class = CachedRefreshToken
+
     
 class DanhMucSerializer(serializers.ModelSerializer):
     class Meta:
@@ -56,9 +82,56 @@ class TuiXachSerializer(serializers.ModelSerializer):
     hinh_anh = serializers.CharField(required=False, allow_blank=True) # Xử lý ảnh base64/url
     class Meta:
         model = TuiXach
-        fields = '__all__'
+        # da_ban (số lượng đã bán) là số liệu nội bộ của Dashboard, không lộ ra /api/products/ công khai
+        exclude = ['da_ban']
         read_only_fields = ['ngay_tao']
 
+    def update(self, instance, validated_data):
+        # Chỉ ghi các cột được sửa: save() cả object sẽ ghi đè da_ban đang được cộng bằng F() (sales_counters)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
+        return instance
+
+class TuiXachImportSerializer(serializers.Serializer):
+    """
+    1 dòng của file nhập hàng loạt (api/bulk_import.py).
+    context: 'danh_muc' = {id/slug/tên viết thường: id danh mục}, 'anh' = tên các file ảnh trong ZIP
+    """
+    ten_tui = serializers.CharField(max_length=250)
+    danh_muc = serializers.CharField()
+    gia_tien = serializers.DecimalField(max_digits=12, decimal_places=0, min_value=0)
+    so_luong_ton = serializers.IntegerField(min_value=0, default=0)
+    mo_ta = serializers.CharField(allow_blank=True, required=False, default='')
+    hinh_anh = serializers.CharField(max_length=800)
+
+    def validate_danh_muc(self, value):
+        danh_muc_id = self.context['danh_muc'].get(value.strip().lower())
+        if danh_muc_id is None:
+            raise serializers.ValidationError(f"Không có danh mục '{value}'.")
+        return danh_muc_id
+
+    def validate_hinh_anh(self, value):
+        value = value.strip()
+        if not value.startswith('http') and value not in self.context['anh']:
+            raise serializers.ValidationError(f"Không có ảnh '{value}' trong file ZIP.")
+        return value
+
+class DieuChinhTuiXachSerializer(serializers.Serializer):
+    """ 1 dòng điều chỉnh hàng loạt (api/bulk_adjust.py): giá mới và/hoặc tồn kho (tuyệt đối hoặc cộng/trừ) """
+    id = serializers.IntegerField()
+    gia_tien = serializers.DecimalField(max_digits=12, decimal_places=0, min_value=0, required=False)
+    so_luong_ton = serializers.IntegerField(min_value=0, required=False)
+    so_luong_ton_delta = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if 'so_luong_ton' in attrs and 'so_luong_ton_delta' in attrs:
+            raise serializers.ValidationError("Chỉ gửi 1 trong 2: so_luong_ton hoặc so_luong_ton_delta.")
+        if len(attrs) == 1:
+            raise serializers.ValidationError("Không có gì để điều chỉnh.")
+        return attrs
+
 class TuiXachPublicSerializer(serializers.ModelSerializer):
     """ Dùng để hiển thị ra Web (Có nested Danh mục) """
     danh_muc = DanhMucSerializer(read_only=True)
@@ -107,6 +180,16 @@ class RegisterSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
     dia_chi = serializers.CharField(required=False, allow_blank=True)
 
+    def validate_so_dien_thoai(self, value):
+        sdt = chuan_hoa_sdt(value)
+        if sdt is None:
+            raise serializers.ValidationError("Số điện thoại không hợp lệ.")
+        if KhachHang.objects.filter(sdt_chuan_hoa=sdt, user__isnull=False).exists():
+            raise serializers.ValidationError("Số điện thoại đã được đăng ký.")
+        # Số đã có hồ sơ mua tại quầy: vẫn cho đăng ký nhưng không gắn vào hồ sơ đó (SĐT chưa xác minh, gắn vào
+        # sẽ lộ lịch sử mua, địa chỉ, hạng giảm giá của khách thật) -> hồ sơ mới để sdt_chuan_hoa = NULL (KhachHang.save)
+        return value
+
     def create(self, validated_data):
         with transaction.atomic():
             # Tạo User Django
@@ -137,11 +220,23 @@ class KhachHangSerializer(serializers.ModelSerializer):
                   'hang_thanh_vien', 'muc_giam_gia'] # Thêm 2 trường này
         read_only_fields = ['id', 'username', 'tong_chi_tieu', 'ngay_tham_gia']
 
+    def validate_so_dien_thoai(self, value):
+        sdt = chuan_hoa_sdt(value)
+        if sdt is None:
+            raise serializers.ValidationError("Số điện thoại không hợp lệ.")
+        trung = KhachHang.objects.filter(sdt_chuan_hoa=sdt)
+        if self.instance is not None:
+            trung = trung.exclude(pk=self.instance.pk)
+        if trung.exists():
+            raise serializers.ValidationError("Số điện thoại đã thuộc về khách hàng khác.")
+        return value
+
 
 # 3. ORDER MANAGEMENT (Dành cho Admin/Staff)
 class ChiTietHoaDonSerializer(serializers.ModelSerializer):
-    # Lấy tên và ảnh túi xách từ quan hệ tui_xach
-    ten_san_pham = serializers.ReadOnlyField(source='tui_xach.ten_tui')
+    # Tên và ảnh chụp lại lúc bán (ten_san_pham / anh_san_pham trên dòng chi tiết) -> không join tui_xach.
+    # Dòng cũ chưa backfill (ten_san_pham rỗng) mới đọc từ tui_xach
+    ten_san_pham = serializers.SerializerMethodField()
     anh_dai_dien = serializers.SerializerMethodField()
     thanh_tien = serializers.ReadOnlyField(source='thanh_tien_item')
 
@@ -150,27 +245,37 @@ class ChiTietHoaDonSerializer(serializers.ModelSerializer):
         fields = ['id', 'tui_xach', 'ten_san_pham', 'anh_dai_dien', 
                   'so_luong', 'don_gia_luc_ban', 'thanh_tien']
 
+    def get_ten_san_pham(self, obj):
+        return obj.ten_san_pham or obj.tui_xach.ten_tui
+
     def get_anh_dai_dien(self, obj):
         request = self.context.get('request')
-        # Lấy dữ liệu từ trường hinh_anh
-        img_field = obj.tui_xach.hinh_anh
+        # Lấy dữ liệu từ snapshot, dòng chưa backfill thì từ trường hinh_anh của túi
+        img_field = obj.anh_san_pham if obj.ten_san_pham else obj.tui_xach.hinh_anh
 
         if not img_field:
             return None
         if hasattr(img_field, 'url'):
             url_path = img_field.url
             return request.build_absolute_uri(url_path) if request else url_path
-        url_str = str(img_field)
-        
-        # Nếu là link online (http://...) hoặc link drive -> Trả về luôn
-        if url_str.startswith('http'):
-            return url_str
-        if request:
-            if not url_str.startswith('/'):
-                url_str = f"/media/{url_str}" 
-            return request.build_absolute_uri(url_str)
-            
+        return duong_dan_anh(img_field, request)
+
+
+def duong_dan_anh(img_field, request=None):
+    """ hinh_anh (chuỗi) -> URL hiển thị: link online giữ nguyên, đường dẫn tương đối -> URL tuyệt đối /media/... """
+    if not img_field:
+        return None
+    url_str = str(img_field)
+
+    # Nếu là link online (http://...) hoặc link drive -> Trả về luôn
+    if url_str.startswith('http'):
         return url_str
+    if request:
+        if not url_str.startswith('/'):
+            url_str = f"/media/{url_str}"
+        return request.build_absolute_uri(url_str)
+
+    return url_str
 
 class QuanLyHoaDonSerializer(serializers.ModelSerializer):
     trang_thai_text = serializers.CharField(source='get_trang_thai_display', read_only=True)
@@ -196,7 +301,8 @@ class QuanLyHoaDonSerializer(serializers.ModelSerializer):
             'ghi_chu', 'ngay_tao', 
             'chi_tiet'
         ]
-        read_only_fields = ['ma_hoa_don', 'ngay_tao', 'thanh_tien', 'giam_gia']
+        # trang_thai chỉ đổi qua các action (duyet_don, huy_don, xac_nhan_...) -> luôn đi qua sales_counters
+        read_only_fields = ['ma_hoa_don', 'ngay_tao', 'thanh_tien', 'giam_gia', 'trang_thai']
 
 class OrderItemInputSerializer(serializers.Serializer):
     id = serializers.IntegerField() 
@@ -227,6 +333,22 @@ class HoaDonSerializer(serializers.ModelSerializer):
         ]
 
 
+class HoaDonTomTatSerializer(serializers.ModelSerializer):
+    """ Đơn của tôi dạng tóm tắt: chỉ header + số sản phẩm + ảnh đại diện (cột trên hóa đơn, không join chi tiết) """
+    anh_dai_dien = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HoaDonTatCa
+        fields = [
+            'id', 'ma_hoa_don', 'ngay_tao', 'trang_thai',
+            'tong_tien_hang', 'giam_gia', 'thanh_tien', 'phuong_thuc_tt',
+            'so_san_pham', 'anh_dai_dien',
+        ]
+
+    def get_anh_dai_dien(self, obj):
+        return duong_dan_anh(obj.anh_dai_dien, self.context.get('request'))
+
+
 # Lưu dữ liệu lên drive
 class BanThietKeSerializer(serializers.ModelSerializer):
     nguoi_tao = serializers.CharField(source='nguoi_so_huu.username', read_only=True)
@@ -234,4 +356,10 @@ class BanThietKeSerializer(serializers.ModelSerializer):
     class Meta:
         model = BanThietKe
         fields = ['id', 'drive_url', 'ghi_chu', 'trang_thai', 'created_at', 'nguoi_tao']
-        read_only_fields = ['id', 'drive_url', 'trang_thai', 'created_at', 'nguoi_tao']
\ No newline at end of file
+        read_only_fields = ['id', 'drive_url', 'trang_thai', 'created_at', 'nguoi_tao']
+
+class BaoCaoJobSerializer(serializers.ModelSerializer):
+    """ Trạng thái job báo cáo nền (không kèm kết quả: tải riêng qua .../tai-ve/) """
+    class Meta:
+        model = BaoCaoJob
+        fields = ['id', 'loai', 'tham_so', 'trang_thai', 'loi', 'ngay_tao', 'ngay_bat_dau', 'ngay_xong']
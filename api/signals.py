@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import caching
+from .authentication import xoa_cache_trang_thai
+from .models import DanhMuc, KhachHang, TuiXach
+
+
+@receiver(post_save, sender=KhachHang)
+@receiver(post_delete, sender=KhachHang)
+def xoa_cache_profile(sender, instance, **kwargs):
+    caching.xoa_khach_hang(instance.user_id)
+
+
+@receiver(post_save, sender=DanhMuc)
+@receiver(post_delete, sender=DanhMuc)
+def xoa_cache_danh_muc(sender, instance, **kwargs):
+    caching.xoa_danh_muc()
+
+
+@receiver(post_save, sender=TuiXach)
+@receiver(post_delete, sender=TuiXach)
+def tang_phien_ban_san_pham(sender, instance, **kwargs):
+    caching.tang_phien_ban_san_pham()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def xoa_cache_trang_thai_user(sender, instance, **kwargs):
+    # Khóa tài khoản / đổi quyền -> token cũ bị từ chối ngay ở request kế tiếp
+    xoa_cache_trang_thai(instance.pk)
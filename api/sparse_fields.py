@@ -0,0 +1,111 @@
+"""
+Sparse fieldsets cho API danh sách/chi tiết: ?fields=... và ?expand=...
+
+    GET /api/products/?fields=id,ten_tui,gia_tien,hinh_anh
+    GET /api/quan-ly-don-hang/?fields=id,ma_hoa_don,thanh_tien&expand=chi_tiet
+
+- Không truyền fields/expand -> output đầy đủ như cũ (tương thích client hiện tại)
+- Có fields và/hoặc expand -> chỉ trả các field được chọn; field lồng nhau nặng
+  (expandable_fields, ví dụ chi_tiet) chỉ có khi nằm trong fields hoặc expand
+- Queryset chỉ SELECT các cột cần thiết (.only()), mo_ta/hinh_anh không được đọc nếu không chọn
+"""
+import re
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+_RE_DISPLAY = re.compile(r'get_(\w+)_display')
+_FIELD_NAMES = {}  # serializer class -> danh sách field (dựng 1 lần)
+
+
+def _fields_of(serializer_class):
+    fields = _FIELD_NAMES.get(serializer_class)
+    if fields is None:
+        fields = _FIELD_NAMES[serializer_class] = serializer_class().fields
+    return fields
+
+
+def _parse(value):
+    return [f.strip() for f in value.split(',') if f.strip()] if value else []
+
+
+class SparseFieldsMixin:
+    """
+    expandable_fields: field lồng nhau chỉ trả về khi được yêu cầu (ở chế độ sparse)
+    field_dependencies: field tính từ method -> các cột model cần đọc, ví dụ {'hang_thanh_vien': ['tong_chi_tieu']}
+    """
+    expandable_fields = ()
+    field_dependencies = {}
+
+    def get_sparse_fields(self):
+        """ None -> trả đầy đủ; ngược lại là tập tên field cần trả """
+        if hasattr(self, '_sparse_fields'):
+            return self._sparse_fields
+        self._sparse_fields = None
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET':
+            return None
+        fields = _parse(request.query_params.get('fields'))
+        expand = _parse(request.query_params.get('expand'))
+        if not fields and not expand:
+            return None
+
+        available = _fields_of(self.get_serializer_class())
+        errors = {}
+        unknown = [f for f in fields if f not in available]
+        if unknown:
+            errors['fields'] = [f"Không có field: {', '.join(unknown)}"]
+        bad_expand = [f for f in expand if f not in self.expandable_fields]
+        if bad_expand:
+            errors['expand'] = [f"Chỉ mở rộng được: {', '.join(self.expandable_fields) or '(không có)'}"]
+        if errors:
+            raise ValidationError(errors)
+
+        chon = set(fields) if fields else {f for f in available if f not in self.expandable_fields}
+        self._sparse_fields = chon | set(expand)
+        return self._sparse_fields
+
+    def _model_columns(self, model, names):
+        """ Cột model cần SELECT cho các field đã chọn; None nếu không suy ra được (-> không dùng only()) """
+        fields = _fields_of(self.get_serializer_class())
+        columns = {model._meta.pk.name}
+        for name in names:
+            if name in self.field_dependencies:
+                columns.update(self.field_dependencies[name])
+                continue
+            source = fields[name].source_attrs
+            if not source:
+                return None
+            try:
+                model_field = model._meta.get_field(source[0])
+            except FieldDoesNotExist:
+                match = _RE_DISPLAY.fullmatch(source[0])
+                if not match:
+                    return None
+                columns.add(match.group(1))
+                continue
+            if model_field.one_to_many or model_field.many_to_many:
+                continue  # Quan hệ ngược (chi_tiet) không phải cột
+            columns.add(source[0])  # FK: 'khach_hang' -> cột khach_hang_id
+        return columns
+
+    def filter_queryset(self, queryset):
+        # Dùng filter_queryset thay vì get_queryset: nhiều ViewSet tự viết get_queryset không gọi super()
+        queryset = super().filter_queryset(queryset)
+        chon = self.get_sparse_fields()
+        if chon is not None:
+            columns = self._model_columns(queryset.model, chon)
+            if columns is not None:
+                queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        chon = self.get_sparse_fields()
+        if chon is not None:
+            target = serializer.child if isinstance(serializer, ListSerializer) else serializer
+            for name in list(target.fields):
+                if name not in chon:
+                    target.fields.pop(name)
+        return serializer
@@ -1,3 +1,1419 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from asgiref.sync import sync_to_async
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import caching, comparison, events, perf, reports, sales_counters
+from .models import (
+    DanhMuc, TuiXach, KhachHang, HoaDon, ChiTietHoaDon, HoaDonLuuTru, ChiTietHoaDonLuuTru, HoaDonTatCa, DoanhThuNgay,
+    DoanhSoSanPhamNgay, BaoCaoJob,
+)
+from .query_inspector import NPlusOneTestMixin, QueryInspector, fingerprint
+from .middleware import CompressionMiddleware, brotli
+from .parsers import FastJSONParser
+from .phone_numbers import chuan_hoa_sdt, chuan_hoa_tien_to
+from .renderers import FastJSONRenderer
+from .serializers import DanhMucSerializer, MyTokenSerializer
+from .tokens import BloomFilter, blacklist_filter
+from .warmup import lam_nong
+
+
+def tao_du_lieu_mau(so_don=3, so_dong=3):
+    """ Dữ liệu nhỏ dùng chung cho các test: 1 chủ, 1 nhân viên, 1 khách có tài khoản, vài đơn hàng """
+    cache.clear()
+    owner = User.objects.create_user('owner', password='x', is_staff=True, is_superuser=True)
+    staff = User.objects.create_user('staff', password='x', is_staff=True)
+    user = User.objects.create_user('khach@example.com', password='x')
+    khach = KhachHang.objects.create(user=user, ho_ten='Nguyễn An', so_dien_thoai='0912345678')
+    dm = DanhMuc.objects.create(ten_danh_muc='Túi da', slug='tui-da')
+    tuis = [
+        TuiXach.objects.create(danh_muc=dm, ten_tui=f'Túi {i}', gia_tien=Decimal(1000000 * (i + 1)),
+                               so_luong_ton=10, hinh_anh=f'https://drive.google.com/file/d/{i}/view')
+        for i in range(so_dong)
+    ]
+    for n in range(so_don):
+        hd = HoaDon.objects.create(
+            ma_hoa_don=f'T-{n}', khach_hang=khach, loai_hoa_don='ONLINE', trang_thai='CHO_XAC_NHAN',
+            tong_tien_hang=0, thanh_tien=0,
+        )
+        for tui in tuis:
+            ChiTietHoaDon.objects.create(hoa_don=hd, tui_xach=tui, so_luong=1, don_gia_luc_ban=tui.gia_tien,
+                                         ten_san_pham=tui.ten_tui, anh_san_pham=tui.hinh_anh)
+    return {'owner': owner, 'staff': staff, 'user': user, 'khach': khach, 'tuis': tuis}
+
+
+class SeedBenchTests(TestCase):
+    def test_clear_chi_xoa_du_lieu_bench(self):
+        data = tao_du_lieu_mau(so_don=2, so_dong=2)
+        for _ in range(2):
+            call_command('seed_bench', orders=50, customers=20, products=5, categories=2, clear=True, stdout=StringIO())
+        self.assertEqual(HoaDon.objects.filter(ma_hoa_don__startswith='BENCH-').count(), 50)
+        self.assertEqual(HoaDon.objects.filter(ma_hoa_don__startswith='T-').count(), 2)
+        self.assertTrue(KhachHang.objects.filter(pk=data['khach'].pk).exists())
+        self.assertEqual(TuiXach.objects.filter(danh_muc__slug='tui-da').count(), 2)
+        # Đơn giả lập không trỏ vào sản phẩm thật
+        self.assertFalse(ChiTietHoaDon.objects.filter(hoa_don__ma_hoa_don__startswith='BENCH-',
+                                                      tui_xach__danh_muc__slug='tui-da').exists())
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=1, so_dong=1)
+        perf.reset()
+        self.addCleanup(perf.reset)
+        patcher = mock.patch('api.middleware.logger')
+        self.logger = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_server_timing_va_histogram_theo_view(self):
+        r = self.client.get('/api/categories/')
+        log = json.loads(self.logger.info.call_args.args[0])
+        self.assertEqual((log['view'], log['status']), ('PublicCategoryViewSet.list', 200))
+        timing = r['Server-Timing']
+        for name in ('db;dur=', 'app;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(name, timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+
+        self.client.force_authenticate(self.data['owner'])
+        views = self.client.get('/api/perf/histograms/').json()['views']
+        hist = views['PublicCategoryViewSet.list']
+        self.assertEqual(hist['count'], 1)
+        self.assertEqual(sum(hist['buckets'].values()), 1)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_tat_sampling_khong_do(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/categories/'))
+        self.assertEqual(perf.snapshot(), {})
+
+    @override_settings(PERF_SAMPLE_RATE=0.5)
+    def test_sampling_theo_ti_le(self):
+        with mock.patch('api.middleware.random.random', return_value=0.7):
+            self.assertNotIn('Server-Timing', self.client.get('/api/categories/'))
+        with mock.patch('api.middleware.random.random', return_value=0.2):
+            self.assertIn('Server-Timing', self.client.get('/api/categories/'))
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_histogram_chi_chu_shop(self):
+        self.client.force_authenticate(self.data['staff'])
+        self.assertEqual(self.client.get('/api/perf/histograms/').status_code, 403)
+        self.assertEqual(self.client.delete('/api/perf/histograms/').status_code, 403)
+        self.client.force_authenticate(self.data['owner'])
+        self.assertEqual(self.client.delete('/api/perf/histograms/').status_code, 204)
+        # Request DELETE cũng được đo sau khi reset -> chỉ còn đúng mẫu đó
+        self.assertEqual(list(perf.snapshot()), ['PerfHistogramView'])
+
+    def test_phan_vi(self):
+        hist = perf.RollingHistogram(window=100)
+        for ms in range(1, 101):
+            hist.add(ms, 2)
+        snap = hist.snapshot()
+        self.assertEqual((snap['p50_ms'], snap['p95_ms'], snap['p99_ms']), (51, 96, 100))
+        self.assertEqual(snap['queries_per_request'], 2)
+        self.assertEqual(snap['buckets']['le_5'], 5)
+
+
+class FingerprintTests(TestCase):
+    def test_cung_hinh_dang_cung_fingerprint(self):
+        a = fingerprint("SELECT * FROM api_tuixach WHERE id = 5 AND ten_tui = 'A'")
+        b = fingerprint("SELECT *  FROM api_tuixach WHERE id = 17 AND ten_tui = 'Bb'")
+        self.assertEqual(a, b)
+
+    def test_gop_danh_sach_in(self):
+        a = fingerprint("SELECT * FROM t WHERE id IN (%s, %s)")
+        b = fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s, %s)")
+        self.assertEqual(a, b)
+
+    def test_them_cot_khong_doi_fingerprint(self):
+        a = fingerprint('SELECT "t"."id", "t"."ten" FROM "t" WHERE "t"."id" = %s')
+        b = fingerprint('SELECT "t"."id", "t"."ten", "t"."da_ban" FROM "t" WHERE "t"."id" = %s')
+        self.assertEqual(a, b)
+        self.assertEqual(a, 'SELECT ... FROM t WHERE t.id = ?')
+
+
+class QueryInspectorTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=1, so_dong=4)
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['staff'])
+
+    def test_phat_hien_n_plus_one_khi_huy_don(self):
+        hd = HoaDon.objects.get()
+        with QueryInspector() as qi:
+            self.client.post(f'/api/quan-ly-don-hang/{hd.id}/huy_don/')
+        n_plus_one = [f for f in qi.findings() if f['kind'] == 'n_plus_one']
+        self.assertTrue(any(':huy_don:' in f['location'] for f in n_plus_one))
+
+
+class NPlusOneRegressionTests(NPlusOneTestMixin, TestCase):
+    """ Fail khi một endpoint phát sinh mẫu N+1 chưa có trong api/query_baseline.json """
+
+    def setUp(self):
+        self.data = tao_du_lieu_mau()
+        self.client = APIClient()
+
+    def test_danh_sach_don_hang_quan_ly(self):
+        self.client.force_authenticate(self.data['owner'])
+        with self.assertNoNewNPlusOne():
+            self.client.get('/api/quan-ly-don-hang/')
+
+    def test_lich_su_don_cua_khach(self):
+        self.client.force_authenticate(self.data['user'])
+        with self.assertNoNewNPlusOne():
+            self.client.get('/api/my-orders/')
+
+    def test_danh_sach_san_pham_va_khach_hang(self):
+        self.client.force_authenticate(self.data['owner'])
+        with self.assertNoNewNPlusOne():
+            self.client.get('/api/products/')
+            self.client.get('/api/tui-xach/')
+            self.client.get('/api/khach-hang/')
+
+    def test_dashboard(self):
+        self.client.force_authenticate(self.data['owner'])
+        with self.assertNoNewNPlusOne():
+            self.client.get('/api/dashboard/summary/')
+
+
+class SalesCounterTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=2)
+        self.tui0, self.tui1 = self.data['tuis']
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['staff'])
+
+    def _tao_don_quay(self, tui, qty):
+        r = self.client.post('/api/quan-ly-don-hang/', {'cart_items': [{'id': tui.id, 'quantity': qty}]}, format='json')
+        self.assertEqual(r.status_code, 201, r.content)
+        return HoaDon.objects.get(pk=r.json()['id'])
+
+    def test_hoan_thanh_va_huy_cap_nhat_bo_dem(self):
+        hd = self._tao_don_quay(self.tui0, 2)
+        self.client.post(f'/api/quan-ly-don-hang/{hd.id}/xac_nhan_thanh_toan/')
+        hd.refresh_from_db()
+        self.assertEqual(TuiXach.objects.get(pk=self.tui0.pk).da_ban, 2)
+        self.assertEqual(DoanhSoSanPhamNgay.objects.get(tui_xach=self.tui0).so_luong, 2)
+        self.assertEqual(DoanhThuNgay.objects.get().doanh_thu, hd.thanh_tien)
+
+        with transaction.atomic():
+            sales_counters.ghi_nhan_huy(hd, 'HOAN_THANH')
+            sales_counters.ghi_nhan_huy(hd, 'CHO_XAC_NHAN')  # Chưa từng được tính -> không trừ
+        self.assertEqual(TuiXach.objects.get(pk=self.tui0.pk).da_ban, 0)
+        self.assertEqual(DoanhSoSanPhamNgay.objects.get(tui_xach=self.tui0).so_luong, 0)
+        self.assertEqual((DoanhThuNgay.objects.get().doanh_thu, DoanhThuNgay.objects.get().so_don), (0, 0))
+
+    def test_patch_khong_doi_trang_thai_bo_qua_bo_dem(self):
+        hd = self._tao_don_quay(self.tui0, 1)
+        self.client.patch(f'/api/quan-ly-don-hang/{hd.id}/', {'trang_thai': 'HOAN_THANH'}, format='json')
+        hd.refresh_from_db()
+        self.assertEqual(hd.trang_thai, 'CHO_THANH_TOAN')
+        self.assertEqual(TuiXach.objects.get(pk=self.tui0.pk).da_ban, 0)
+
+    def test_huy_don_hoan_kho_khong_ghi_de_da_ban(self):
+        hd = self._tao_don_quay(self.tui0, 3)
+        TuiXach.objects.filter(pk=self.tui0.pk).update(da_ban=7)  # Đơn khác vừa hoàn thành
+        self.client.post(f'/api/quan-ly-don-hang/{hd.id}/huy_don/')
+        tui = TuiXach.objects.get(pk=self.tui0.pk)
+        self.assertEqual((tui.so_luong_ton, tui.da_ban), (10, 7))
+
+    def _ban_cu(self, hd, so_ban=2):
+        # get_object() trả bản đọc trước khi request kia đổi trạng thái (2 request đồng thời / bấm 2 lần)
+        return mock.patch('api.views.QuanLyDonHangViewSet.get_object',
+                          side_effect=[HoaDon.objects.get(pk=hd.pk) for _ in range(so_ban)])
+
+    def test_xac_nhan_hai_lan_chi_tinh_mot_lan(self):
+        hd = self._tao_don_quay(self.tui0, 2)
+        with self._ban_cu(hd):
+            ket_qua = [self.client.post(f'/api/quan-ly-don-hang/{hd.id}/xac_nhan_thanh_toan/').status_code
+                       for _ in range(2)]
+        self.assertEqual(ket_qua, [200, 400])
+        self.assertEqual(TuiXach.objects.get(pk=self.tui0.pk).da_ban, 2)
+        self.assertEqual(DoanhSoSanPhamNgay.objects.get(tui_xach=self.tui0).so_luong, 2)
+        self.assertEqual(DoanhThuNgay.objects.get().so_don, 1)
+
+    def test_huy_don_sau_khi_da_xac_nhan_khong_huy(self):
+        hd = self._tao_don_quay(self.tui0, 2)
+        with self._ban_cu(hd):
+            self.assertEqual(self.client.post(f'/api/quan-ly-don-hang/{hd.id}/xac_nhan_thanh_toan/').status_code, 200)
+            self.assertEqual(self.client.post(f'/api/quan-ly-don-hang/{hd.id}/huy_don/').status_code, 400)
+        hd.refresh_from_db()
+        tui = TuiXach.objects.get(pk=self.tui0.pk)
+        self.assertEqual((hd.trang_thai, tui.so_luong_ton, tui.da_ban), ('HOAN_THANH', 8, 2))
+        self.assertEqual(DoanhThuNgay.objects.get().doanh_thu, hd.thanh_tien)
+
+    def test_xep_hang_theo_ky(self):
+        hom_nay = timezone.localdate()
+        DoanhSoSanPhamNgay.objects.create(tui_xach=self.tui0, ngay=hom_nay - timedelta(days=40), so_luong=5)
+        DoanhSoSanPhamNgay.objects.create(tui_xach=self.tui1, ngay=hom_nay, so_luong=2)
+        TuiXach.objects.filter(pk=self.tui0.pk).update(da_ban=5)
+        TuiXach.objects.filter(pk=self.tui1.pk).update(da_ban=2)
+        ten = lambda ds: [t.ten_tui for t in ds]
+        self.assertEqual(ten(sales_counters.ban_chay(5, 7)), ['Túi 1'])
+        self.assertEqual(ten(sales_counters.ban_chay(5, 90)), ['Túi 0', 'Túi 1'])
+        self.assertEqual(ten(sales_counters.ban_chay(5)), ['Túi 0', 'Túi 1'])
+        self.assertEqual(ten(sales_counters.ban_cham(5, 7)), ['Túi 0', 'Túi 1'])
+        self.assertEqual(ten(sales_counters.ban_cham(5)), ['Túi 1', 'Túi 0'])
+
+    def test_rebuild_tu_lich_su_don(self):
+        hd = self._tao_don_quay(self.tui1, 2)
+        self.client.post(f'/api/quan-ly-don-hang/{hd.id}/xac_nhan_thanh_toan/')
+        TuiXach.objects.update(da_ban=99)
+        DoanhSoSanPhamNgay.objects.all().delete()
+        call_command('rebuild_sales_counters', stdout=StringIO())
+        self.assertEqual(dict(TuiXach.objects.values_list('id', 'da_ban')), {self.tui0.id: 0, self.tui1.id: 2})
+        self.assertEqual(list(DoanhSoSanPhamNgay.objects.values_list('tui_xach_id', 'so_luong')), [(self.tui1.id, 2)])
+
+    def test_san_pham_cong_khai_khong_lo_da_ban(self):
+        self.client.force_authenticate(None)
+        for fast in (True, False):
+            with override_settings(FAST_LIST_SERIALIZERS=fast):
+                self.assertNotIn('da_ban', self.client.get('/api/products/').json()[0])
+
+
+class ProfileClaimTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=2, so_dong=1)
+        self.client = APIClient()
+
+    def test_dang_nhap_nhung_khach_hang_id_vao_token(self):
+        r = self.client.post('/api/login/', {'username': 'khach@example.com', 'password': 'x'}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()['full_name'], 'Nguyễn An')
+        claims = AccessToken(r.json()['access'])
+        self.assertEqual(claims['khach_hang_id'], self.data['khach'].id)
+
+    def test_api_phia_khach_khong_query_bang_khach_hang(self):
+        token = MyTokenSerializer.get_token(self.data['user']).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        hd = HoaDon.objects.first()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/api/my-orders/').status_code, 200)
+            self.assertEqual(self.client.get(f'/api/my-orders/{hd.id}/').status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'api_khachhang' in q['sql']])
+
+    def test_tai_khoan_khong_co_ho_so_khong_xem_duoc_don_tai_quay(self):
+        pos = HoaDon.objects.create(ma_hoa_don='POS-1', nhan_vien=self.data['staff'], loai_hoa_don='OFFLINE',
+                                    trang_thai='CHO_XAC_NHAN', tong_tien_hang=0, thanh_tien=0)
+        self.client.force_authenticate(self.data['staff'])
+        self.assertEqual(self.client.get(f'/api/my-orders/{pos.id}/').status_code, 404)
+        self.assertEqual(self.client.post(f'/api/my-orders/{pos.id}/cancel/').status_code, 404)
+        pos.refresh_from_db()
+        self.assertEqual(pos.trang_thai, 'CHO_XAC_NHAN')
+
+    def test_sua_profile_va_dat_hang_doc_tong_chi_tieu_moi(self):
+        self.client.force_authenticate(self.data['user'])
+        self.client.get('/api/my-orders/')  # Nạp cache hồ sơ
+        # Cộng chi tiêu bằng update() (không phát signal, như process khác đang giữ cache cũ)
+        KhachHang.objects.filter(pk=self.data['khach'].pk).update(tong_chi_tieu=150000000)
+        self.client.patch('/api/profile/', {'ho_ten': 'Trần Bình'}, format='json')
+        self.assertEqual(KhachHang.objects.get(pk=self.data['khach'].pk).tong_chi_tieu, 150000000)
+        r = self.client.post('/api/my-orders/', {'cart_items': [{'id': self.data['tuis'][0].id, 'quantity': 1}]},
+                             format='json')
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertEqual(HoaDon.objects.order_by('-id').first().giam_gia, self.data['tuis'][0].gia_tien * 15 / 100)
+
+    def test_cap_nhat_profile_xoa_cache(self):
+        self.client.force_authenticate(self.data['user'])
+        self.client.get('/api/profile/')
+        self.client.patch('/api/profile/', {'ho_ten': 'Trần Bình'}, format='json')
+        self.assertEqual(self.client.get('/api/profile/').json()['ho_ten'], 'Trần Bình')
+
+
+class StatelessAuthTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=1, so_dong=1)
+        self.client = APIClient()
+
+    def _dang_nhap(self, user):
+        token = MyTokenSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return token
+
+    def test_kiem_tra_quyen_khong_query_auth_user(self):
+        self._dang_nhap(self.data['owner'])
+        self.client.get('/api/perf/histograms/')  # lần đầu: nạp trạng thái user vào cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/api/perf/histograms/').status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'auth_user' in q['sql']])
+
+    def test_khoa_tai_khoan_tu_choi_token_cu(self):
+        self._dang_nhap(self.data['owner'])
+        self.assertEqual(self.client.get('/api/perf/histograms/').status_code, 200)
+        self.data['owner'].is_active = False
+        self.data['owner'].save()
+        self.assertEqual(self.client.get('/api/perf/histograms/').status_code, 401)
+
+    def test_ha_quyen_tu_choi_token_cu(self):
+        self._dang_nhap(self.data['staff'])
+        self.assertEqual(self.client.get('/api/quan-ly-don-hang/').status_code, 200)
+        self.data['staff'].is_staff = False
+        self.data['staff'].save()
+        self.assertEqual(self.client.get('/api/quan-ly-don-hang/').status_code, 401)
+
+    def test_logout_thu_hoi_access_token(self):
+        refresh = MyTokenSerializer.get_token(self.data['user'])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        r = self.client.post('/api/logout/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(r.status_code, 205)
+        self.assertEqual(self.client.get('/api/my-orders/').status_code, 401)
+
+    def test_logout_o_process_khac_cache_rieng_van_thu_hoi(self):
+        refresh = MyTokenSerializer.get_token(self.data['owner'])
+        access = refresh.access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with mock.patch('api.caching.cache_dung_chung', return_value=False):
+            self.assertEqual(self.client.get('/api/perf/histograms/').status_code, 200)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get('/api/perf/histograms/').status_code, 200)
+            self.assertFalse([q for q in ctx.captured_queries if 'token_blacklist' in q['sql']])  # Đã nhớ kết quả
+
+            self.client.post('/api/logout/', {'refresh': str(refresh)}, format='json')
+            cache.clear()  # Process khác: cache riêng không có key thu hồi
+            self.assertEqual(self.client.get('/api/perf/histograms/').status_code, 401)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=0)
+        blacklist_filter.xoa()
+        self.client = APIClient()
+        # Các test dưới giả lập cache dùng chung (Redis); LocMemCache luôn hỏi DB, xem test riêng
+        patcher = mock.patch('api.caching.cache_dung_chung', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache_rieng_tung_process_luon_hoi_db(self):
+        refresh = MyTokenSerializer.get_token(self.data['user'])
+        with mock.patch('api.caching.cache_dung_chung', return_value=False):
+            self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+            # Process khác thu hồi: chỉ DB biết
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=refresh['jti']))
+            r = self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(r.status_code, 401)
+
+    def test_filter_day_hon_capacity_khong_de_quy(self):
+        for i in range(5):
+            MyTokenSerializer.get_token(self.data['user']).blacklist()
+        with override_settings(JWT_BLACKLIST_FILTER_CAPACITY=2):
+            blacklist_filter.xoa()
+            refresh = MyTokenSerializer.get_token(self.data['user'])
+            r = self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertGreaterEqual(blacklist_filter.bloom.capacity, 10)
+
+    def test_bloom_filter_khong_bao_gio_bo_sot(self):
+        bloom = BloomFilter(capacity=1000)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        false_positive = sum(f'khac-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positive, 50)
+
+    def test_refresh_token_sach_khong_query_blacklist(self):
+        refresh = MyTokenSerializer.get_token(self.data['user'])
+        self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'blacklistedtoken' in q['sql']])
+
+    def test_logout_roi_refresh_bi_tu_choi(self):
+        refresh = MyTokenSerializer.get_token(self.data['user'])
+        self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.assertEqual(self.client.post('/api/logout/', {'refresh': str(refresh)}, format='json').status_code, 205)
+        self.client.credentials()
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json').status_code, 401)
+        # Worker khác (filter chưa có jti, cache trống) vẫn phải từ chối nhờ DB
+        cache.clear()
+        blacklist_filter.xoa()
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json').status_code, 401)
+
+    def test_compact_tokens_xoa_token_het_han(self):
+        con_han = MyTokenSerializer.get_token(self.data['user'])
+        het_han = MyTokenSerializer.get_token(self.data['owner'])
+        het_han.blacklist()
+        OutstandingToken.objects.filter(jti=het_han['jti']).update(expires_at=timezone.now() - timedelta(days=2))
+        call_command('compact_tokens', batch_size=1, sleep=0, stdout=StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [con_han['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class FastJSONTests(TestCase):
+    def test_render_giong_het_drf(self):
+        data = {
+            'thanh_tien': Decimal('1234567.50'),
+            'ngay_tao': timezone.now(),
+            'ngay': timezone.localdate(),
+            'ten': 'Túi da cá sấu \u2028',
+            1: [None, True, 1.5],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parse_json(self):
+        body = '{"ho_ten": "Nguyễn An", "cart_items": [{"id": 1, "quantity": 2}]}'.encode()
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(body)),
+            {'ho_ten': 'Nguyễn An', 'cart_items': [{'id': 1, 'quantity': 2}]},
+        )
+
+
+class FastSerializerContractTests(TestCase):
+    """ Đường .values() phải ra JSON giống từng byte với ModelSerializer gốc """
+
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=3, so_dong=2)
+        # Các trường hợp biên: đơn tại quầy không có khách, khách không có tài khoản,
+        # ảnh lưu đường dẫn tương đối, ghi chú/địa chỉ NULL, giảm giá lẻ
+        vang_lai = KhachHang.objects.create(ho_ten='Khách quầy', so_dien_thoai='0900000000', tong_chi_tieu=150000000)
+        tui = TuiXach.objects.create(danh_muc=self.data['tuis'][0].danh_muc, ten_tui='Túi ảnh local',
+                                     gia_tien=Decimal('2500000'), so_luong_ton=3, hinh_anh='tui/local.jpg')
+        hd = HoaDon.objects.create(ma_hoa_don='POS-1', nhan_vien=self.data['staff'], loai_hoa_don='OFFLINE',
+                                   trang_thai='HOAN_THANH', tong_tien_hang=Decimal('2500000'),
+                                   giam_gia=Decimal('250000'), thanh_tien=Decimal('2250000'))
+        ChiTietHoaDon.objects.create(hoa_don=hd, tui_xach=tui, so_luong=2, don_gia_luc_ban=Decimal('1250000'),
+                                     ten_san_pham=tui.ten_tui, anh_san_pham=tui.hinh_anh)
+        HoaDon.objects.create(ma_hoa_don='POS-2', khach_hang=vang_lai, nhan_vien=self.data['staff'],
+                              loai_hoa_don='OFFLINE', trang_thai='DA_HUY', tong_tien_hang=0, thanh_tien=0)
+        self.client = APIClient()
+
+    def _so_sanh(self, user, url):
+        self.client.force_authenticate(user)
+        with override_settings(FAST_LIST_SERIALIZERS=False):
+            goc = self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            nhanh = self.client.get(url)
+        self.assertEqual(goc.status_code, 200)
+        self.assertEqual(nhanh.content, goc.content)
+        return len(ctx.captured_queries)
+
+    def test_danh_sach_don_quan_ly(self):
+        self._so_sanh(self.data['owner'], '/api/quan-ly-don-hang/')
+        self._so_sanh(self.data['staff'], '/api/quan-ly-don-hang/?search=Nguyễn')
+
+    def test_don_cua_toi(self):
+        self._so_sanh(self.data['user'], '/api/my-orders/')
+        HoaDon.objects.update(so_san_pham=2, anh_dai_dien='tui/local.jpg')
+        self._so_sanh(self.data['user'], '/api/my-orders/?tom_tat=1&page_size=2')
+
+    def test_khach_hang_va_san_pham(self):
+        self._so_sanh(self.data['owner'], '/api/khach-hang/')
+        self._so_sanh(None, '/api/products/?ordering=-gia_tien')
+
+    def test_so_query_khong_phu_thuoc_so_don(self):
+        self.assertLessEqual(self._so_sanh(self.data['owner'], '/api/quan-ly-don-hang/'), 2)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=2, so_dong=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['owner'])
+
+    def test_chi_tra_va_chi_doc_field_duoc_chon(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/api/products/?fields=id,ten_tui,gia_tien')
+        self.assertEqual(set(r.json()[0]), {'id', 'ten_tui', 'gia_tien'})
+        self.assertFalse([q for q in ctx.captured_queries if 'mo_ta' in q['sql']])
+
+        tui = self.data['tuis'][0]
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(f'/api/tui-xach/{tui.id}/?fields=id,ten_tui')
+        self.assertEqual(r.json(), {'id': tui.id, 'ten_tui': tui.ten_tui})
+        self.assertFalse([q for q in ctx.captured_queries if 'mo_ta' in q['sql']])
+
+    def test_chi_tiet_chi_co_khi_expand(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/api/quan-ly-don-hang/?fields=id,ma_hoa_don,trang_thai_text')
+        self.assertEqual(set(r.json()[0]), {'id', 'ma_hoa_don', 'trang_thai_text'})
+        self.assertFalse([q for q in ctx.captured_queries if 'api_chitiethoadon' in q['sql']])
+
+        r = self.client.get('/api/quan-ly-don-hang/?fields=id&expand=chi_tiet')
+        self.assertEqual(len(r.json()[0]['chi_tiet']), 2)
+        # Không truyền gì -> đầy đủ như cũ
+        self.assertIn('chi_tiet', self.client.get('/api/quan-ly-don-hang/').json()[0])
+
+    def test_duong_nhanh_va_serializer_goc_giong_nhau(self):
+        for url in ('/api/quan-ly-don-hang/?expand=chi_tiet', '/api/khach-hang/?fields=id,hang_thanh_vien,username'):
+            with override_settings(FAST_LIST_SERIALIZERS=False):
+                goc = self.client.get(url).content
+            self.assertEqual(self.client.get(url).content, goc)
+
+    def test_field_khong_hop_le(self):
+        r = self.client.get('/api/products/?fields=id,khong_co&expand=chi_tiet')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(set(r.json()), {'fields', 'expand'})
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=30)
+        self.client = APIClient()
+
+    def test_gzip_va_brotli(self):
+        goc = self.client.get('/api/products/').content
+        self.assertGreater(len(goc), 1024)
+        r = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(r['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', r['Vary'])
+        self.assertEqual(gzip.decompress(r.content), goc)
+        if brotli is not None:
+            r = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(r['Content-Encoding'], 'br')
+            self.assertEqual(brotli.decompress(r.content), goc)
+
+    def test_bo_qua_body_nho_va_path_nhay_cam(self):
+        r = self.client.get('/api/categories/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(r.has_header('Content-Encoding'))
+        r = self.client.post('/api/login/', {'username': 'khach@example.com', 'password': 'x'},
+                             format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(r.has_header('Content-Encoding'))
+
+    def test_catalog_khong_nen_lai(self):
+        self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        with mock.patch.object(CompressionMiddleware, '_nen', side_effect=AssertionError('nén lại')):
+            r = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(r['Content-Encoding'], 'gzip')
+
+    def test_streaming(self):
+        request = RequestFactory().get('/api/x/', HTTP_ACCEPT_ENCODING='gzip')
+        rows = [f'{i},Túi {i}\n'.encode() for i in range(500)]
+        middleware = CompressionMiddleware(lambda r: StreamingHttpResponse(iter(rows), content_type='text/csv'))
+        response = middleware(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(rows))
+
+
+class SoDienThoaiTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=1)
+        self.client = APIClient()
+
+    def test_chuan_hoa(self):
+        for raw in ('+84 912 345 678', '84912345678', '0912.345.678', '912345678'):
+            self.assertEqual(chuan_hoa_sdt(raw), '0912345678')
+        self.assertEqual(chuan_hoa_sdt('0168 123 4567'), '0381234567')
+        self.assertIsNone(chuan_hoa_sdt('abc'))
+        self.assertEqual(chuan_hoa_tien_to('+84 91'), '091')
+
+    def test_pos_dung_lai_khach_theo_sdt_chuan_hoa(self):
+        self.client.force_authenticate(self.data['staff'])
+        r = self.client.post('/api/quan-ly-don-hang/', {
+            'cart_items': [{'id': self.data['tuis'][0].id, 'quantity': 1}],
+            'ho_ten_moi': 'Nguyễn An', 'sdt_moi': '+84 912 345 678',
+        }, format='json')
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertEqual(KhachHang.objects.count(), 1)
+        self.assertEqual(HoaDon.objects.get().khach_hang_id, self.data['khach'].id)
+
+    def test_tra_cuu_va_goi_y(self):
+        KhachHang.objects.create(ho_ten='Trần Bình', so_dien_thoai='0912999888')
+        self.client.force_authenticate(self.data['staff'])
+        r = self.client.get('/api/khach-hang/tra-cuu-sdt/', {'sdt': '84912345678'})
+        self.assertEqual(r.json()['id'], self.data['khach'].id)
+        self.assertEqual(self.client.get('/api/khach-hang/tra-cuu-sdt/', {'sdt': '0900000000'}).status_code, 404)
+        r = self.client.get('/api/khach-hang/goi-y-sdt/', {'q': '+84 912'})
+        self.assertEqual([k['so_dien_thoai'] for k in r.json()], ['0912345678', '0912999888'])
+        self.assertEqual(self.client.get('/api/khach-hang/goi-y-sdt/', {'q': '0912 9'}).json()[0]['ho_ten'], 'Trần Bình')
+
+    def test_dang_ky_khong_chiem_ho_so_khach_tai_quay(self):
+        quay = KhachHang.objects.create(ho_ten='Khách quầy', so_dien_thoai='0987 654 321', tong_chi_tieu=150000000)
+        HoaDon.objects.create(ma_hoa_don='Q-1', khach_hang=quay, loai_hoa_don='OFFLINE', trang_thai='HOAN_THANH',
+                              tong_tien_hang=0, thanh_tien=0)
+        r = self.client.post('/api/register/', {
+            'ho_ten': 'Lê Chi', 'email': 'chi@example.com', 'so_dien_thoai': '+84987654321', 'password': 'x12345',
+        }, format='json')
+        self.assertEqual(r.status_code, 201, r.content)
+        # Hồ sơ mới tách riêng, để sdt_chuan_hoa = NULL; hồ sơ tại quầy giữ nguyên
+        moi = KhachHang.objects.get(user__username='chi@example.com')
+        self.assertIsNone(moi.sdt_chuan_hoa)
+        quay.refresh_from_db()
+        self.assertEqual((quay.user_id, quay.sdt_chuan_hoa), (None, '0987654321'))
+        self.client.force_authenticate(moi.user)
+        self.assertEqual(self.client.get('/api/my-orders/').json()['data'], [])
+        self.assertEqual(self.client.get('/api/profile/').json()['tong_chi_tieu'], '0')
+
+        # Số đã thuộc tài khoản web khác -> vẫn từ chối
+        r = self.client.post('/api/register/', {
+            'ho_ten': 'Lê Dũng', 'email': 'dung@example.com', 'so_dien_thoai': '0912345678', 'password': 'x12345',
+        }, format='json')
+        self.assertEqual(r.status_code, 400)
+        self.assertIn('so_dien_thoai', r.json()['errors'])
+
+    def test_tai_khoan_sdt_null_van_sua_duoc_profile(self):
+        # Như sau migration 0004: tài khoản web thứ 2 cùng số để sdt_chuan_hoa = NULL
+        user = User.objects.create_user('b@example.com', password='x')
+        b = KhachHang.objects.create(user=user, ho_ten='B', so_dien_thoai='0900111222')
+        KhachHang.objects.filter(pk=b.pk).update(so_dien_thoai='0912 345 678', sdt_chuan_hoa=None)
+        self.client.force_authenticate(user)
+        r = self.client.patch('/api/profile/', {'ho_ten': 'B mới'}, format='json')
+        self.assertEqual(r.status_code, 200, r.content)
+        b.refresh_from_db()
+        self.assertEqual((b.ho_ten, b.sdt_chuan_hoa), ('B mới', None))
+        r = self.client.patch('/api/profile/', {'so_dien_thoai': '0912345678'}, format='json')
+        self.assertEqual(r.status_code, 400)
+        r = self.client.patch('/api/profile/', {'so_dien_thoai': '0933444555'}, format='json')
+        self.assertEqual(r.status_code, 200)
+        b.refresh_from_db()
+        self.assertEqual(b.sdt_chuan_hoa, '0933444555')
+
+    def test_migration_gop_khach_trung(self):
+        a = KhachHang.objects.create(ho_ten='A', so_dien_thoai='0977111222', tong_chi_tieu=100)
+        b = KhachHang.objects.create(ho_ten='B', so_dien_thoai='+84 977 111 223', tong_chi_tieu=50, email='b@x.vn')
+        KhachHang.objects.filter(pk=b.pk).update(so_dien_thoai='+84 977 111 222')  # dữ liệu cũ trùng số
+        hd = HoaDon.objects.create(ma_hoa_don='M-1', khach_hang=b, tong_tien_hang=0, thanh_tien=0)
+        KhachHang.objects.update(sdt_chuan_hoa=None)
+
+        migration = importlib.import_module('api.migrations.0004_sdt_chuan_hoa')
+        state = MigrationExecutor(connection).loader.project_state(('api', '0004_sdt_chuan_hoa'))
+        migration.chuan_hoa_va_gop_trung(state.apps, None)
+
+        self.assertFalse(KhachHang.objects.filter(pk=b.pk).exists())
+        a.refresh_from_db()
+        hd.refresh_from_db()
+        self.assertEqual((a.sdt_chuan_hoa, a.tong_chi_tieu, a.email, hd.khach_hang_id), ('0977111222', 150, 'b@x.vn', a.id))
+        self.assertEqual(KhachHang.objects.get(pk=self.data['khach'].pk).sdt_chuan_hoa, '0912345678')
+
+
+class StartupTests(SimpleTestCase):
+
+    def test_boot_khong_load_google_client(self):
+        # Chạy boot trong process con: Drive/googleapiclient chỉ được import khi upload lần đầu
+        out = StringIO()
+        call_command('check_startup', runs=1, top=5, max_boot_ms=0, max_rss_mb=0, stdout=out)
+        self.assertIn('OK', out.getvalue())
+        self.assertIn('boot:', out.getvalue())
+
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0)
+
+    def test_lam_nong_nap_cache_danh_muc(self):
+        ket_qua = lam_nong()
+        self.assertEqual(set(ket_qua), {'urls', 'serializers', 'requests', 'db'})
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/api/categories/')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(r.json(), DanhMucSerializer(DanhMuc.objects.all(), many=True).data)
+
+        DanhMuc.objects.create(ten_danh_muc='Balo', slug='balo')  # signal xóa cache
+        self.assertEqual(len(self.client.get('/api/categories/').json()), 2)
+
+
+class DashboardEventsTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0)
+        self.client = APIClient()
+
+    def _su_kien_cuoi(self):
+        return events.broker._history[-1]['data']
+
+    def test_delta_theo_vong_doi_don(self):
+        self.client.force_authenticate(self.data['user'])
+        tui = self.data['tuis'][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post('/api/my-orders/', {'cart_items': [{'id': tui.id, 'quantity': 1}]}, format='json')
+        self.assertEqual(r.status_code, 201)
+        su_kien = self._su_kien_cuoi()
+        self.assertEqual(su_kien['delta'], {'so_don': 1, 'so_don_hom_nay': 1, 'don_cho_duyet': 1})
+
+        pk = su_kien['hoa_don_id']
+        self.client.force_authenticate(self.data['staff'])
+        buoc = [
+            ('duyet_don', {'don_cho_duyet': -1}),
+            ('bat_dau_giao_hang', {}),
+            ('xac_nhan_giao_thanh_cong', {
+                'doanh_thu': 1000000, 'doanh_thu_thang_nay': 1000000,
+                'don_hoan_thanh_thang_nay': 1, 'doanh_thu_hom_nay': 1000000,
+            }),
+        ]
+        for action, delta in buoc:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.post(f'/api/quan-ly-don-hang/{pk}/{action}/').status_code, 200)
+            self.assertEqual(self._su_kien_cuoi()['delta'], delta, action)
+
+    def test_chi_phuc_vu_qua_asgi(self):
+        self.assertEqual(self.client.get('/api/events/dashboard/').status_code, 501)
+
+    async def test_stream(self):
+        r = await self.async_client.get('/api/events/dashboard/')
+        self.assertEqual(r.status_code, 401)
+        token = await sync_to_async(lambda u: str(MyTokenSerializer.get_token(u).access_token))(self.data['staff'])
+        r = await self.async_client.get(f'/api/events/dashboard/?token={token}')
+        self.assertEqual(r.status_code, 403)
+
+        token = await sync_to_async(lambda u: str(MyTokenSerializer.get_token(u).access_token))(self.data['owner'])
+        r = await self.async_client.get(f'/api/events/dashboard/?token={token}')
+        self.assertEqual(r['Content-Type'], 'text/event-stream')
+        chunks = aiter(r.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertIn(b'event: ready', await anext(chunks))
+        item = events.broker.publish('don_hang', {'delta': {'so_don': 1}})
+        self.assertEqual(await anext(chunks), events.dinh_dang(item).encode())
+        await chunks.aclose()
+
+    async def _doc_het(self, luong):
+        return [chunk async for chunk in luong]
+
+    async def test_dong_luong_khi_token_het_han(self):
+        sub, missed = events.broker.subscribe(None)
+        chunks = await self._doc_het(events.stream(sub, missed, het_han=time.time() - 1))
+        self.assertIn('event: ready', chunks[1])
+        self.assertEqual(chunks[-1], 'event: het_han\ndata: {}\n\n')
+        self.assertNotIn(sub, events.broker._subs)
+
+    @override_settings(SSE_HEARTBEAT=0.01)
+    async def test_dong_luong_khi_token_bi_thu_hoi(self):
+        con_hieu_luc = mock.AsyncMock(side_effect=[True, False])
+        sub, missed = events.broker.subscribe(None)
+        chunks = await self._doc_het(events.stream(sub, missed, het_han=time.time() + 3600, con_hieu_luc=con_hieu_luc))
+        self.assertEqual(chunks[2:], [': ping\n\n', 'event: het_han\ndata: {}\n\n'])
+        self.assertEqual(con_hieu_luc.await_count, 2)
+
+    async def test_asgi_xoa_token_khoi_query_string(self):
+        from config.asgi import an_token_query_string
+        nhan = {}
+
+        async def app(scope, receive, send):
+            nhan.update(scope)
+
+        scope = {'type': 'http', 'query_string': b'token=abc.def&last_event_id=5', 'headers': [(b'host', b'x')]}
+        await an_token_query_string(app)(scope, None, None)
+        self.assertEqual(scope['query_string'], b'last_event_id=5')  # Chính dict uvicorn dùng ghi access log
+        self.assertIn((b'authorization', b'Bearer abc.def'), nhan['headers'])
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=3)
+        cu = timezone.now() - timedelta(days=730)
+        self.don_cu, self.don_dang_xu_ly, self.don_moi = HoaDon.objects.order_by('id')
+        HoaDon.objects.filter(pk=self.don_cu.pk).update(trang_thai='HOAN_THANH', thanh_tien=6000000, ngay_tao=cu)
+        HoaDon.objects.filter(pk=self.don_dang_xu_ly.pk).update(ngay_tao=cu)
+        HoaDon.objects.filter(pk=self.don_moi.pk).update(trang_thai='HOAN_THANH', thanh_tien=6000000)
+        self.cu = cu
+
+    def _luu_tru(self, *args):
+        out = StringIO()
+        call_command('archive_orders', '--months=18', *args, stdout=out)
+        return out.getvalue()
+
+    def test_chi_chuyen_don_da_dong_qua_han(self):
+        self.assertIn('Sẽ lưu trữ 1 đơn', self._luu_tru('--dry-run'))
+        self.assertEqual(HoaDonLuuTru.objects.count(), 0)
+
+        self.assertIn('Lưu trữ 1 đơn', self._luu_tru())
+        self.assertEqual(set(HoaDon.objects.values_list('id', flat=True)), {self.don_dang_xu_ly.id, self.don_moi.id})
+        self.assertEqual(ChiTietHoaDonLuuTru.objects.filter(hoa_don_id=self.don_cu.id).count(), 3)
+        self.assertFalse(ChiTietHoaDon.objects.filter(hoa_don_id=self.don_cu.id).exists())
+        self.assertEqual(
+            dict(HoaDonTatCa.objects.values_list('id', 'luu_tru')),
+            {self.don_cu.id: True, self.don_dang_xu_ly.id: False, self.don_moi.id: False},
+        )
+        self.assertIn('Không có đơn nào', self._luu_tru())
+
+    def test_khong_xoa_san_pham_khach_hang_chi_con_trong_don_luu_tru(self):
+        HoaDon.objects.update(trang_thai='HOAN_THANH', ngay_tao=self.cu)
+        self._luu_tru()
+        self.assertFalse(HoaDon.objects.exists())
+        client = APIClient()
+        client.force_authenticate(self.data['owner'])
+        tui = self.data['tuis'][0]
+        self.assertEqual(client.delete(f'/api/tui-xach/{tui.id}/').status_code, 400)
+        self.assertEqual(client.delete(f"/api/khach-hang/{self.data['khach'].id}/").status_code, 400)
+        self.assertTrue(TuiXach.objects.filter(pk=tui.pk).exists())
+        self.assertTrue(KhachHang.objects.filter(pk=self.data['khach'].pk).exists())
+
+    def test_bao_cao_va_lich_su_gom_don_luu_tru(self):
+        client = APIClient()
+        client.force_authenticate(self.data['owner'])
+        tu = f'?from_date={self.cu:%Y-%m-%d}&to_date={timezone.now() + timedelta(days=1):%Y-%m-%d}'
+        truoc = client.get(f'/api/thong-ke/tong_quan/{tu}').json()
+        tron = client.get(f'/api/thong-ke/bieu_do_tron/{tu}').json()
+        client.force_authenticate(self.data['user'])
+        lich_su = client.get('/api/my-orders/').json()
+
+        self._luu_tru()
+        sales_counters.rebuild()
+        self.assertEqual(TuiXach.objects.get(pk=self.data['tuis'][0].pk).da_ban, 2)
+
+        client.force_authenticate(self.data['owner'])
+        self.assertEqual(client.get(f'/api/thong-ke/tong_quan/{tu}').json(), truoc)
+        self.assertEqual(truoc['ky_nay']['doanh_thu'], 12000000)
+        self.assertEqual(client.get(f'/api/thong-ke/bieu_do_tron/{tu}').json(), tron)
+
+        client.force_authenticate(self.data['user'])
+        self.assertEqual(client.get('/api/my-orders/').json(), lich_su)
+        with override_settings(FAST_LIST_SERIALIZERS=False):
+            self.assertEqual(client.get('/api/my-orders/').json(), lich_su)
+        r = client.get(f'/api/my-orders/{self.don_cu.id}/').json()
+        self.assertEqual(len(r['data']['chi_tiet']), 3)
+        self.assertEqual(r['data']['chi_tiet'][0]['ten_san_pham'], 'Túi 0')
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['staff'])
+
+    def _zip(self, *names):
+        buf = BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zf:
+            for name in names:
+                zf.writestr(name, b'\x89PNG' + name.encode())
+        buf.seek(0)
+        buf.name = 'anh.zip'
+        return buf
+
+    def _csv(self, *rows):
+        text = "ten_tui,danh_muc,gia_tien,so_luong_ton,hinh_anh\n" + "\n".join(rows) + "\n"
+        f = BytesIO(text.encode('utf-8-sig'))
+        f.name = 'sp.csv'
+        return f
+
+    @mock.patch('api.bulk_import.upload_file_to_drive', side_effect=lambda f: f'https://drive/{f.name}')
+    def test_nhap_csv_kem_zip(self, upload):
+        r = self.client.post('/api/tuixach/import/', {
+            'file': self._csv('Túi A,tui-da,1500000,3,a.png', 'Túi B,Túi da,2000000,,anh/b.png',
+                              'Túi C,tui-da,900000,1,a.png', ',,,,', 'Túi D,tui-da,500000,2,https://x/d.png'),
+            'anh': self._zip('a.png', 'anh/b.png'),
+        }, format='multipart')
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertEqual((r.json()['so_dong'], r.json()['tao_moi']), (4, 4))
+        self.assertEqual([d['dong'] for d in r.json()['dong']], [2, 3, 4, 6])
+        self.assertEqual(upload.call_count, 2)  # a.png chỉ upload 1 lần
+        self.assertEqual(
+            dict(TuiXach.objects.values_list('ten_tui', 'hinh_anh')),
+            {'Túi A': 'https://drive/a.png', 'Túi B': 'https://drive/b.png',
+             'Túi C': 'https://drive/a.png', 'Túi D': 'https://x/d.png'},
+        )
+        self.assertEqual(TuiXach.objects.get(ten_tui='Túi B').so_luong_ton, 0)
+
+    @mock.patch('api.bulk_import.upload_file_to_drive')
+    def test_kiem_tra_toan_bo_truoc_khi_upload(self, upload):
+        r = self.client.post('/api/tuixach/import/', {
+            'file': self._csv('Túi A,tui-da,1500000,3,a.png', 'Túi B,khong-co,abc,1,b.png', 'Túi C,tui-da,-1,1,x.png'),
+            'anh': self._zip('a.png', 'b.png'),
+        }, format='multipart')
+        self.assertEqual(r.status_code, 400)
+        loi = {l['dong']: set(l['loi']) for l in r.json()['loi']}
+        self.assertEqual(loi, {3: {'danh_muc', 'gia_tien'}, 4: {'gia_tien', 'hinh_anh'}})
+        upload.assert_not_called()
+        self.assertFalse(TuiXach.objects.exists())
+
+    def test_lenh_nhap_xlsx(self):
+        import openpyxl
+        import tempfile
+
+        wb = openpyxl.Workbook()
+        wb.active.append(['ten_tui', 'danh_muc', 'gia_tien', 'so_luong_ton', 'mo_ta', 'hinh_anh'])
+        for i in range(3):
+            wb.active.append([f'Túi {i}', 'Túi da', 1200000.0, 5, 'Da bò', f'https://x/{i}.png'])
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as tmp:
+            wb.save(tmp.name)
+            out = StringIO()
+            call_command('import_products', tmp.name, '--batch-size=2', stdout=out)
+        self.assertIn('Đã tạo 3/3', out.getvalue())
+        self.assertEqual(TuiXach.objects.filter(gia_tien=1200000, mo_ta='Da bò').count(), 3)
+
+    @mock.patch('api.views.upload_file_to_drive', return_value='https://drive/new.png')
+    def test_them_moi_khong_con_co_dinh_danh_muc(self, upload):
+        dm = DanhMuc.objects.create(ten_danh_muc='Balo', slug='balo')
+        anh = SimpleUploadedFile('a.png', b'png', content_type='image/png')
+        r = self.client.post('/api/tuixach/them-moi/', {
+            'ten_tui': 'Balo 1', 'gia_tien': 100000, 'danh_muc': dm.id, 'hinh_anh': anh,
+        }, format='multipart')
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertEqual(TuiXach.objects.get(ten_tui='Balo 1').danh_muc_id, dm.id)
+
+        r = self.client.post('/api/tuixach/them-moi/', {'gia_tien': 1, 'hinh_anh': anh}, format='multipart')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(upload.call_count, 1)  # Dữ liệu sai -> không upload
+
+
+class BulkAdjustTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=3)
+        self.tuis = self.data['tuis']
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['staff'])
+
+    def _post(self, items, **extra):
+        return self.client.post('/api/tui-xach/dieu-chinh/', {'items': items, **extra}, format='json')
+
+    def test_dieu_chinh_va_diff(self):
+        a, b, c = self.tuis
+        version = caching.phien_ban_san_pham()
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            r = self._post([
+                {'id': a.id, 'gia_tien': 1500000},
+                {'id': b.id, 'so_luong_ton_delta': -4},
+                {'id': c.id, 'so_luong_ton': 10, 'gia_tien': 3000000},  # Không đổi gì
+            ])
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(r.json()['thay_doi'], 2)
+        self.assertEqual(r.json()['diff'], [
+            {'id': a.id, 'ten_tui': 'Túi 0', 'gia_tien': {'cu': 1000000, 'moi': 1500000}},
+            {'id': b.id, 'ten_tui': 'Túi 1', 'so_luong_ton': {'cu': 10, 'moi': 6}},
+        ])
+        # SELECT ... FOR UPDATE + 1 UPDATE (CASE) cho cả lô, không query theo từng dòng
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(
+            list(TuiXach.objects.order_by('id').values_list('gia_tien', 'so_luong_ton')),
+            [(1500000, 10), (2000000, 6), (3000000, 10)],
+        )
+        self.assertEqual(caching.phien_ban_san_pham(), version + 1)
+
+    def test_loi_mot_dong_thi_khong_ghi_gi(self):
+        a, b, _ = self.tuis
+        r = self._post([{'id': a.id, 'gia_tien': 1}, {'id': b.id, 'so_luong_ton_delta': -11}])
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(self._post([{'id': a.id, 'gia_tien': 1}, {'id': 999, 'gia_tien': 1}]).status_code, 400)
+        self.assertEqual(self._post([{'id': a.id, 'gia_tien': 1}, {'id': a.id, 'gia_tien': 2}]).status_code, 400)
+        self.assertEqual(self._post([{'id': a.id}]).status_code, 400)
+        self.assertEqual(TuiXach.objects.get(pk=a.pk).gia_tien, 1000000)
+
+        r = self._post([{'id': a.id, 'gia_tien': 1}], dry_run=True)
+        self.assertEqual(r.json()['thay_doi'], 1)
+        self.assertEqual(TuiXach.objects.get(pk=a.pk).gia_tien, 1000000)
+
+        self.client.force_authenticate(self.data['user'])
+        self.assertEqual(self._post([{'id': a.id, 'gia_tien': 1}]).status_code, 403)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=3)  # Túi da: 1tr, 2tr, 3tr, tồn 10
+        balo = DanhMuc.objects.create(ten_danh_muc='Balo', slug='balo')
+        TuiXach.objects.create(danh_muc=balo, ten_tui='Balo da', gia_tien=500000, so_luong_ton=2, hinh_anh='x')
+        TuiXach.objects.create(danh_muc=balo, ten_tui='Balo vải', gia_tien=12000000, so_luong_ton=0, hinh_anh='x')
+        self.balo = balo
+
+    def _facets(self, query=''):
+        r = self.client.get(f'/api/products/facets/{query}')
+        self.assertEqual(r.status_code, 200, r.content)
+        data = r.json()
+        return data, {d['slug']: d['so_luong'] for d in data['danh_muc']}, [k['so_luong'] for k in data['khoang_gia']]
+
+    def test_mot_query_va_khop_voi_list(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data, danh_muc, gia = self._facets()
+        self.assertEqual(len(ctx.captured_queries), 2)  # Danh mục (cache rỗng) + 1 query đếm
+        self.assertEqual((data['tong'], data['het_hang']), (4, 1))
+        self.assertEqual(danh_muc, {'tui-da': 3, 'balo': 1})
+        self.assertEqual(gia, [1, 1, 2, 0, 0])
+
+        data, danh_muc, gia = self._facets(f'?danh_muc={self.balo.id}&gia_tien__lte=2500000')
+        list_count = len(self.client.get(f'/api/products/?danh_muc={self.balo.id}&gia_tien__lte=2500000').json())
+        self.assertEqual(data['tong'], list_count)
+        self.assertEqual(danh_muc, {'tui-da': 2, 'balo': 1})  # Facet danh mục bỏ qua filter danh_muc
+        self.assertEqual(gia, [1, 0, 0, 0, 0])  # Facet giá bỏ qua filter giá
+
+        data, danh_muc, _ = self._facets('?search=balo')
+        self.assertEqual((data['tong'], data['het_hang'], danh_muc['tui-da']), (1, 1, 0))
+        self.assertEqual(self.client.get('/api/products/facets/?gia_tien__gte=abc').status_code, 400)
+
+    def test_cache_theo_phien_ban_san_pham(self):
+        self._facets()
+        with CaptureQueriesContext(connection) as ctx:
+            self._facets()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        TuiXach.objects.create(danh_muc=self.balo, ten_tui='Balo 3', gia_tien=700000, so_luong_ton=1, hinh_anh='x')
+        self.assertEqual(self._facets()[0]['tong'], 5)
+
+
+class RevenueSeriesTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=3, so_dong=1)
+        # 2026-03-01 20:00 UTC = 2026-03-02 03:00 giờ Việt Nam
+        moc = [datetime(2026, 3, 1, 20, tzinfo=dt_timezone.utc), datetime(2026, 3, 2, 1, tzinfo=dt_timezone.utc),
+               datetime(2026, 5, 20, 8, tzinfo=dt_timezone.utc)]
+        for hd, ngay_tao, tien in zip(HoaDon.objects.order_by('id'), moc, (100, 200, 400)):
+            HoaDon.objects.filter(pk=hd.pk).update(trang_thai='HOAN_THANH', ngay_tao=ngay_tao, thanh_tien=tien)
+        sales_counters.rebuild_doanh_thu()
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['owner'])
+
+    def _chuoi(self, query):
+        r = self.client.get(f'/api/thong-ke/bieu_do_cot/?{query}')
+        self.assertEqual(r.status_code, 200, r.content)
+        return [(d['date'], d['doanh_thu'], d['so_don']) for d in r.json()['data']]
+
+    def test_ngay_theo_mui_gio_bao_cao_va_dien_0(self):
+        self.assertEqual(
+            list(DoanhThuNgay.objects.order_by('ngay').values_list('ngay', 'doanh_thu')),
+            [(date(2026, 3, 2), 300), (date(2026, 5, 20), 400)],
+        )
+        self.assertEqual(self._chuoi('from_date=2026-03-01&to_date=2026-03-03'), [
+            ('2026-03-01', 0, 0), ('2026-03-02', 300, 2), ('2026-03-03', 0, 0),
+        ])
+        thang = self._chuoi('from_date=2026-02-15&to_date=2026-06-10&granularity=month')
+        self.assertEqual(thang, [
+            ('2026-02-01', 0, 0), ('2026-03-01', 300, 2), ('2026-04-01', 0, 0), ('2026-05-01', 400, 1),
+            ('2026-06-01', 0, 0),
+        ])
+        tuan = self._chuoi('from_date=2026-03-01&to_date=2026-05-31&granularity=week')
+        self.assertEqual(len(tuan), 14)
+        self.assertEqual(tuan[1], ('2026-03-02', 300, 2))  # Thứ Hai
+        self.assertEqual(sum(t[1] for t in tuan), 700)
+
+        with mock.patch('api.timeseries.np', None):
+            self.assertEqual(self._chuoi('from_date=2026-02-15&to_date=2026-06-10&granularity=month'), thang)
+            self.assertEqual(self._chuoi('from_date=2026-03-01&to_date=2026-05-31&granularity=week'), tuan)
+        self.assertEqual(self.client.get('/api/thong-ke/bieu_do_cot/?granularity=year').status_code, 400)
+
+    def test_rollup_cap_nhat_theo_trang_thai_don(self):
+        dau, _, cuoi = HoaDon.objects.order_by('id')
+        sales_counters.ghi_nhan_huy(cuoi, 'HOAN_THANH')
+        sales_counters.ghi_nhan_huy(dau, 'DA_XAC_NHAN')  # Chưa từng được tính -> không trừ
+        self.assertEqual(
+            dict(DoanhThuNgay.objects.values_list('ngay', 'so_don')),
+            {date(2026, 3, 2): 2, date(2026, 5, 20): 0},
+        )
+        sales_counters.ghi_nhan_hoan_thanh(cuoi)
+        self.assertEqual(DoanhThuNgay.objects.get(ngay=date(2026, 5, 20)).doanh_thu, 400)
+
+
+class PeriodComparisonTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=5, so_dong=1)
+        utc = dt_timezone.utc
+        moc = [
+            (datetime(2026, 3, 9, 17, 30, tzinfo=utc), 100, 0),     # 10/03 00:30 giờ VN -> kỳ này
+            (datetime(2026, 3, 15, 5, tzinfo=utc), 300, 50),        # kỳ này
+            (datetime(2026, 3, 19, 17, 30, tzinfo=utc), 1000, 0),   # 20/03 giờ VN -> ngoài kỳ
+            (datetime(2026, 3, 1, 5, tzinfo=utc), 200, 20),         # kỳ trước (28/02 - 09/03)
+            (datetime(2025, 3, 12, 5, tzinfo=utc), 50, 0),          # cùng kỳ năm trước
+        ]
+        self.orders = list(HoaDon.objects.order_by('id'))
+        for hd, (ngay_tao, tien, giam) in zip(self.orders, moc):
+            HoaDon.objects.filter(pk=hd.pk).update(
+                trang_thai='HOAN_THANH', ngay_tao=ngay_tao, thanh_tien=tien, giam_gia=giam, tong_tien_hang=tien + giam,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['owner'])
+
+    def _get(self, query='from_date=2026-03-10&to_date=2026-03-19&nam_truoc=1'):
+        return self.client.get(f'/api/thong-ke/tong_quan/?{query}')
+
+    def test_mot_query_cho_moi_ky(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self._get().json()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(data['ky_nay'], {
+            'range': '2026-03-10 -> 2026-03-19', 'doanh_thu': 400, 'so_don': 2,
+            'tien_hang': 450, 'giam_gia': 50, 'gia_tri_don_tb': 200,
+        })
+        self.assertEqual(data['ky_truoc']['range'], '2026-02-28 -> 2026-03-09')
+        self.assertEqual((data['ky_truoc']['doanh_thu'], data['ky_truoc']['giam_gia']), (200, 20))
+        self.assertEqual(data['cung_ky_nam_truoc']['doanh_thu'], 50)
+        self.assertEqual((data['tang_truong'], data['tang_truong_nam']), (100.0, 700.0))
+        self.assertNotIn('cung_ky_nam_truoc', self._get('from_date=2026-03-10&to_date=2026-03-19').json())
+        self.assertEqual(self._get('from_date=2026-03-19&to_date=2026-03-10').status_code, 400)
+
+    def test_ky_da_dong_cache_den_khi_so_lieu_cu_doi(self):
+        truoc = self._get().json()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._get().json(), truoc)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hd = HoaDon.objects.get(pk=self.orders[1].pk)
+            sales_counters.ghi_nhan_huy(hd, 'HOAN_THANH')
+            HoaDon.objects.filter(pk=hd.pk).update(trang_thai='DA_HUY')
+        self.assertEqual(self._get().json()['ky_nay']['doanh_thu'], 100)
+
+    def test_ky_da_dong_cache_co_han(self):
+        for dung_chung, ttl in ((True, 86400), (False, 60)):
+            cache.clear()
+            with mock.patch('api.caching.cache_dung_chung', return_value=dung_chung), \
+                    mock.patch.object(comparison.cache, 'set', wraps=comparison.cache.set) as dat:
+                self._get()
+            self.assertEqual([c.args[2] for c in dat.call_args_list if c.args[0].startswith('so_sanh:')], [ttl])
+
+
+class AnalyticsExportTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=3)
+        HoaDon.objects.update(trang_thai='HOAN_THANH', tong_tien_hang=6000000, thanh_tien=6000000)
+
+    def _xuat(self, thu_muc, *args):
+        call_command('export_analytics', thu_muc, '--batch-size=2', *args, stdout=StringIO())
+        with open(os.path.join(thu_muc, '_manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_lenh_xuat_parquet_va_tang_dan(self):
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as thu_muc:
+            manifest = self._xuat(thu_muc)
+            self.assertEqual({k: v['rows'] for k, v in manifest['tables'].items()},
+                             {'orders': 3, 'line_items': 9, 'products': 3, 'customers': 1})
+            f = pq.ParquetFile(os.path.join(thu_muc, manifest['tables']['line_items']['file']))
+            self.assertEqual(f.metadata.num_row_groups, 5)  # batch 2 dòng -> 9 dòng = 5 row group
+            orders = pq.read_table(os.path.join(thu_muc, manifest['tables']['orders']['file'])).to_pylist()
+            self.assertEqual(orders[0]['thanh_tien'], 6000000)
+            self.assertIs(orders[0]['luu_tru'], False)
+            products = pq.read_table(os.path.join(thu_muc, 'products.parquet')).to_pylist()
+            self.assertEqual(products[0]['danh_muc'], 'Túi da')
+
+            hd = HoaDon.objects.order_by('id').first()
+            hd.trang_thai = 'DA_HUY'
+            hd.save()
+            moi = self._xuat(thu_muc, '--incremental')
+            self.assertEqual(moi['since'], manifest['until'])
+            self.assertEqual(moi['tables']['orders']['rows'], 1)
+            self.assertEqual(moi['tables']['line_items']['rows'], 3)
+            self.assertEqual(moi['tables']['products']['rows'], 3)  # Không có ngay_cap_nhat -> luôn đủ
+            self.assertEqual(self._xuat(thu_muc, '--incremental')['tables']['orders']['rows'], 0)
+
+    def test_endpoint_stream_arrow_chi_cho_chu_shop(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        client = APIClient()
+        client.force_authenticate(self.data['staff'])
+        self.assertEqual(client.get('/api/thong-ke/export/').status_code, 403)
+
+        client.force_authenticate(self.data['owner'])
+        self.assertEqual(client.get('/api/thong-ke/export/?table=abc').status_code, 400)
+        r = client.get('/api/thong-ke/export/?table=line_items&dinh_dang=arrow')
+        self.assertEqual(r.status_code, 200)
+        self.assertIsInstance(r, StreamingHttpResponse)
+        bang = pa.ipc.open_file(BytesIO(b''.join(r.streaming_content))).read_all()
+        self.assertEqual(bang.num_rows, 9)
+        self.assertEqual(bang.schema.field('don_gia_luc_ban').type, pa.int64())
+
+        since = r['X-Export-Until']
+        r = client.get('/api/thong-ke/export/', {'table': 'orders', 'since': since})
+        self.assertEqual(pq.read_table(BytesIO(b''.join(r.streaming_content))).num_rows, 0)
+
+
+class ShardedReportTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=3)
+        utc = dt_timezone.utc
+        self.orders = list(HoaDon.objects.order_by('id'))
+        for hd, ngay_tao in zip(self.orders, (datetime(2025, 1, 5, 5, tzinfo=utc), datetime(2025, 6, 5, 5, tzinfo=utc),
+                                              datetime(2025, 12, 30, 5, tzinfo=utc))):
+            HoaDon.objects.filter(pk=hd.pk).update(
+                trang_thai='HOAN_THANH', ngay_tao=ngay_tao, tong_tien_hang=6000000, thanh_tien=6000000,
+            )
+        DanhMuc.objects.create(ten_danh_muc='Balo', slug='balo')
+        TuiXach.objects.filter(pk=self.data['tuis'][2].pk).update(danh_muc=DanhMuc.objects.get(slug='balo'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['owner'])
+        self.nam = '?from_date=2025-01-01&to_date=2025-12-31'
+
+    def test_chia_shard_lien_tuc(self):
+        shards = reports.chia_shard(date(2025, 1, 1), date(2025, 3, 15), so_ngay=31)
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(shards[0][0], comparison.dau_ngay(date(2025, 1, 1)))
+        self.assertEqual(shards[-1][1], comparison.dau_ngay(date(2025, 3, 16)))
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(shards, shards[1:])))
+
+    def test_gop_ket_qua_cac_shard(self):
+        with override_settings(REPORT_SHARD_DAYS=400):
+            tron = self.client.get(f'/api/thong-ke/bieu_do_tron/{self.nam}').json()
+            excel = self.client.get(f'/api/thong-ke/du_lieu_xuat_excel/{self.nam}').json()
+        self.assertEqual(tron['data'], [{'name': 'Balo', 'value': 9000000}, {'name': 'Túi da', 'value': 9000000}])
+        with override_settings(REPORT_SHARD_DAYS=7):
+            self.assertEqual(self.client.get(f'/api/thong-ke/bieu_do_tron/{self.nam}').json(), tron)
+            self.assertEqual(self.client.get(f'/api/thong-ke/du_lieu_xuat_excel/{self.nam}').json(), excel)
+        self.assertEqual([r['Mã HĐ'] for r in excel['data']], ['T-2', 'T-1', 'T-0'])
+
+    def test_job_nen_tao_hoi_tai_ve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post('/api/thong-ke/bao-cao/', {'loai': 'XUAT_EXCEL', 'from_date': '2025-01-01',
+                                                            'to_date': '2025-12-31'}, format='json')
+        self.assertEqual(r.status_code, 202)
+        job_id = r.json()['id']
+        self.assertEqual(r.json()['trang_thai'], 'CHO')
+        # Request không chạy báo cáo, chờ runner run_report_jobs
+        self.assertEqual(BaoCaoJob.objects.get(pk=job_id).trang_thai, 'CHO')
+        self.assertEqual(self.client.get(f'/api/thong-ke/bao-cao/{job_id}/tai-ve/').status_code, 409)
+        self.assertEqual(self.client.post('/api/thong-ke/bao-cao/', {'loai': 'X'}, format='json').status_code, 400)
+
+        call_command('run_report_jobs', stdout=StringIO())
+        self.assertEqual(self.client.get(f'/api/thong-ke/bao-cao/{job_id}/').json()['trang_thai'], 'XONG')
+        self.assertEqual(
+            self.client.get(f'/api/thong-ke/bao-cao/{job_id}/tai-ve/').json(),
+            self.client.get(f'/api/thong-ke/du_lieu_xuat_excel/{self.nam}').json(),
+        )
+        self.assertFalse(reports.chay_job(job_id))  # Đã xong -> không chạy lại
+
+        chu_khac = User.objects.create_user('owner2', password='x', is_staff=True, is_superuser=True)
+        self.client.force_authenticate(chu_khac)
+        self.assertEqual(self.client.get(f'/api/thong-ke/bao-cao/{job_id}/').status_code, 404)
+
+    def test_runner_loop_chay_lai_job_ket(self):
+        moc = date(2025, 1, 1)
+        ket = reports.tao_job('DANH_MUC', moc, moc, self.data['owner'])
+        BaoCaoJob.objects.filter(pk=ket.pk).update(trang_thai='DANG_CHAY',
+                                                    ngay_bat_dau=timezone.now() - timedelta(hours=1))
+        dang_chay = reports.tao_job('DANH_MUC', moc, moc, self.data['owner'])
+        BaoCaoJob.objects.filter(pk=dang_chay.pk).update(trang_thai='DANG_CHAY', ngay_bat_dau=timezone.now())
+        # --loop không thoát: hết job thì ngủ -> dừng vòng lặp ở lần ngủ đầu tiên
+        with mock.patch('api.management.commands.run_report_jobs.time.sleep', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('run_report_jobs', '--loop', stdout=StringIO())
+        self.assertEqual(BaoCaoJob.objects.get(pk=ket.pk).trang_thai, 'XONG')
+        self.assertEqual(BaoCaoJob.objects.get(pk=dang_chay.pk).trang_thai, 'DANG_CHAY')
+
+
+class ChaySongSongTests(SimpleTestCase):
+    def test_giu_thu_tu_shard(self):
+        shards = [(i, i + 1) for i in range(10)]
+        with mock.patch.object(reports, 'connection', mock.Mock(in_atomic_block=False, vendor='mysql')):
+            ket_qua = reports.chay_song_song(lambda tu, den: (tu, threading.current_thread().name), shards, workers=4)
+        self.assertEqual([tu for tu, _ in ket_qua], list(range(10)))
+        self.assertTrue(all(ten.startswith('bao-cao-shard') for _, ten in ket_qua))
+
+
+class OrderSummaryTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['user'])
+        tui0, tui1 = self.data['tuis']
+        for _ in range(3):
+            r = self.client.post('/api/my-orders/', {'cart_items': [
+                {'id': tui0.id, 'quantity': 2}, {'id': tui1.id, 'quantity': 1},
+            ]}, format='json')
+            self.assertEqual(r.status_code, 201, r.content)
+
+    def test_tom_tat_ghi_luc_tao_don(self):
+        hd = HoaDon.objects.first()
+        self.assertEqual((hd.so_san_pham, hd.anh_dai_dien), (3, self.data['tuis'][0].hinh_anh))
+
+        self.client.force_authenticate(self.data['staff'])
+        r = self.client.post('/api/quan-ly-don-hang/', {
+            'cart_items': [{'id': self.data['tuis'][1].id, 'quantity': 4}],
+        }, format='json')
+        self.assertEqual(r.status_code, 201, r.content)
+        hd = HoaDon.objects.get(loai_hoa_don='OFFLINE')
+        self.assertEqual((hd.so_san_pham, hd.anh_dai_dien), (4, self.data['tuis'][1].hinh_anh))
+
+    def test_danh_sach_tom_tat_phan_trang_khong_join(self):
+        self.client.get('/api/my-orders/?tom_tat=1')  # Nạp cache hồ sơ khách
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get('/api/my-orders/?tom_tat=1&page_size=2').json()
+        self.assertEqual(len(ctx.captured_queries), 2)  # COUNT + 1 trang
+        self.assertTrue(all('JOIN' not in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(r['count'], 3)
+        self.assertEqual(len(r['data']), 2)
+        self.assertIn('page=2', r['next'])
+        self.assertNotIn('chi_tiet', r['data'][0])
+        self.assertEqual(r['data'][0]['so_san_pham'], 3)
+        self.assertEqual(r['data'][0]['anh_dai_dien'], self.data['tuis'][0].hinh_anh)
+
+        chi_tiet = self.client.get(f"/api/my-orders/{r['data'][0]['id']}/").json()['data']['chi_tiet']
+        self.assertEqual(sum(c['so_luong'] for c in chi_tiet), 3)
+
+    def test_tom_tat_giu_nguyen_sau_luu_tru(self):
+        truoc = self.client.get('/api/my-orders/?tom_tat=1').json()
+        HoaDon.objects.update(trang_thai='HOAN_THANH', ngay_tao=timezone.now() - timedelta(days=730))
+        call_command('archive_orders', '--months=18', stdout=StringIO())
+        self.assertFalse(HoaDon.objects.exists())
+        sau = self.client.get('/api/my-orders/?tom_tat=1').json()
+        self.assertEqual([(d['so_san_pham'], d['anh_dai_dien']) for d in sau['data']],
+                         [(d['so_san_pham'], d['anh_dai_dien']) for d in truoc['data']])
+
+
+class OrderSnapshotTests(TestCase):
+    def setUp(self):
+        self.data = tao_du_lieu_mau(so_don=0, so_dong=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.data['user'])
+        self.tui0, self.tui1 = self.data['tuis']
+        for _ in range(2):
+            r = self.client.post('/api/my-orders/', {'cart_items': [
+                {'id': self.tui0.id, 'quantity': 1}, {'id': self.tui1.id, 'quantity': 1},
+            ]}, format='json')
+            self.assertEqual(r.status_code, 201, r.content)
+
+    def _ten_trong_don(self):
+        data = self.client.get('/api/my-orders/').json()['data']
+        return sorted({c['ten_san_pham'] for d in data for c in d['chi_tiet']})
+
+    def test_doi_ten_san_pham_khong_doi_hoa_don_cu(self):
+        ten_cu = sorted([self.tui0.ten_tui, self.tui1.ten_tui])
+        TuiXach.objects.filter(pk=self.tui0.pk).update(ten_tui='Tên mới', hinh_anh='tui/moi.jpg')
+        self.client.get('/api/my-orders/')  # Nạp cache hồ sơ khách
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._ten_trong_don(), ten_cu)
+            hd = HoaDon.objects.first()
+            chi_tiet = self.client.get(f'/api/my-orders/{hd.id}/').json()['data']['chi_tiet']
+        self.assertFalse([q for q in ctx.captured_queries if 'api_tuixach' in q['sql']])
+        self.assertEqual(sorted(c['ten_san_pham'] for c in chi_tiet), ten_cu)
+        self.assertNotIn('tui/moi.jpg', str(chi_tiet))
+
+        # Đơn đã lưu trữ giữ nguyên snapshot
+        HoaDon.objects.update(trang_thai='HOAN_THANH', ngay_tao=timezone.now() - timedelta(days=730))
+        call_command('archive_orders', '--months=18', stdout=StringIO())
+        self.assertFalse(HoaDon.objects.exists())
+        self.assertEqual(self._ten_trong_don(), ten_cu)
+
+    def test_dong_cu_chua_backfill_va_lenh_backfill(self):
+        HoaDon.objects.filter(pk=HoaDon.objects.first().pk).update(
+            trang_thai='HOAN_THANH', ngay_tao=timezone.now() - timedelta(days=730),
+        )
+        call_command('archive_orders', '--months=18', stdout=StringIO())
+        ChiTietHoaDon.objects.update(ten_san_pham='', anh_san_pham='')
+        ChiTietHoaDonLuuTru.objects.update(ten_san_pham='', anh_san_pham='')
+
+        # Chưa backfill: cả 2 đường serialize lấy tên hiện tại của túi, ra giống nhau
+        ten = sorted([self.tui0.ten_tui, self.tui1.ten_tui])
+        with override_settings(FAST_LIST_SERIALIZERS=False):
+            goc = self.client.get('/api/my-orders/').content
+        self.assertEqual(self.client.get('/api/my-orders/').content, goc)
+        self.assertEqual(self._ten_trong_don(), ten)
+
+        call_command('backfill_order_snapshots', batch_size=1, stdout=StringIO())
+        for model in (ChiTietHoaDon, ChiTietHoaDonLuuTru):
+            self.assertFalse(model.objects.filter(ten_san_pham='').exists())
+        self.assertEqual(
+            set(ChiTietHoaDon.objects.values_list('tui_xach_id', 'anh_san_pham')),
+            {(self.tui0.id, self.tui0.hinh_anh), (self.tui1.id, self.tui1.hinh_anh)},
+        )
+        TuiXach.objects.filter(pk=self.tui1.pk).update(ten_tui='Tên mới')
+        self.assertEqual(self._ten_trong_don(), ten)
+
+    @override_settings(FAST_LIST_SERIALIZERS=False)
+    def test_dong_chua_backfill_khong_n_cong_1(self):
+        ChiTietHoaDon.objects.update(ten_san_pham='', anh_san_pham='')
+        hd = HoaDon.objects.first()
+        self.client.get('/api/my-orders/')  # Nạp cache hồ sơ khách
+        for url in ('/api/my-orders/', f'/api/my-orders/{hd.id}/'):
+            with CaptureQueriesContext(connection) as ctx:
+                r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            # 4 dòng (list) / 2 dòng (chi tiết) chưa có snapshot -> chỉ 1 query túi
+            self.assertEqual(len([q for q in ctx.captured_queries if 'api_tuixach' in q['sql']]), 1, url)
@@ -0,0 +1,154 @@
+"""
+Kiểm tra blacklist refresh token mà không query MySQL ở trường hợp phổ biến (token chưa bị thu hồi).
+
+- Token đã bị thu hồi: ghi key `jwt:bl:<jti>` vào cache tới khi token hết hạn -> trả lời ngay
+- Token chưa bị thu hồi: hỏi bloom filter trong process. Bloom filter không bao giờ trả lời
+  "không có" sai, nên nếu nó nói "không có" thì chắc chắn token sạch -> 0 query
+- Bloom filter nói "có thể có" (đúng hoặc dương tính giả ~0.1%) -> mới hỏi DB, rồi cache kết quả
+
+Đồng bộ giữa các worker: mỗi lần blacklist thì tăng `jwt:bl:gen` trong cache; worker thấy
+generation đổi (hoặc filter quá JWT_BLACKLIST_FILTER_TTL giây) thì nạp thêm các dòng mới từ DB.
+Chỉ đúng khi cache dùng chung (Redis/Memcached): với LocMemCache generation và `jwt:ok:` nằm riêng từng
+process -> token vừa thu hồi ở process này vẫn lọt ở process khác, nên khi đó luôn hỏi DB như cũ.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import caching
+
+GEN_KEY = 'jwt:bl:gen'
+NEGATIVE_TTL = 60  # Kết quả "không bị thu hồi" lấy từ DB (sau dương tính giả) được nhớ 60 giây
+
+
+def _revoked_key(jti):
+    return f"jwt:bl:{jti}"
+
+
+def _checked_key(jti):
+    return f"jwt:ok:{jti}"
+
+
+class BloomFilter:
+    """ Bloom filter đơn giản trên bytearray, double hashing từ 1 lần blake2b """
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class _BlacklistFilter:
+    """ Bloom filter các jti đã blacklist của process này, nạp dần theo id tăng của BlacklistedToken """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self, capacity=None):
+        capacity = capacity or getattr(settings, 'JWT_BLACKLIST_FILTER_CAPACITY', 100000)
+        self.bloom = BloomFilter(capacity)
+        self.last_id = 0
+        self.generation = None
+        self.loaded_at = 0.0
+
+    def _dong_con_han(self, tu_id):
+        return list(
+            BlacklistedToken.objects.filter(id__gt=tu_id, token__expires_at__gt=timezone.now())
+            .order_by('id').values_list('id', 'token__jti')
+        )
+
+    def _nap_them(self, generation):
+        rows = self._dong_con_han(self.last_id)
+        if self.bloom.count + len(rows) > self.bloom.capacity:
+            # Filter đầy -> tỉ lệ dương tính giả tăng, dựng lại từ đầu (compact_tokens đã dọn token hết hạn).
+            # Token còn hạn nhiều hơn capacity: nới filter cho gấp đôi số đó thay vì dựng lại mãi
+            rows = self._dong_con_han(0)
+            capacity = getattr(settings, 'JWT_BLACKLIST_FILTER_CAPACITY', 100000)
+            self._reset(max(capacity, len(rows) * 2))
+        for row_id, jti in rows:
+            self.bloom.add(jti)
+            self.last_id = row_id
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+
+    def co_the_co(self, jti, generation):
+        ttl = getattr(settings, 'JWT_BLACKLIST_FILTER_TTL', 30)
+        with self._lock:
+            if generation != self.generation or time.monotonic() - self.loaded_at > ttl:
+                self._nap_them(generation)
+            return jti in self.bloom
+
+    def them(self, jti):
+        with self._lock:
+            self.bloom.add(jti)
+
+    def xoa(self):
+        with self._lock:
+            self._reset()
+
+
+blacklist_filter = _BlacklistFilter()
+
+
+class CachedRefreshToken(RefreshToken):
+    """ RefreshToken có check_blacklist đi qua cache + bloom filter (dùng cho login/refresh/logout) """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        found = cache.get_many([_revoked_key(jti), _checked_key(jti), GEN_KEY])
+        if found.get(_revoked_key(jti)):
+            raise TokenError("Token đã bị thu hồi.")
+        if not caching.cache_dung_chung():
+            # Cache riêng từng process: không biết process khác vừa thu hồi gì -> hỏi DB mỗi lần
+            if BlacklistedToken.objects.filter(token__jti=jti).exists():
+                raise TokenError("Token đã bị thu hồi.")
+            return
+        if found.get(_checked_key(jti)) or not blacklist_filter.co_the_co(jti, found.get(GEN_KEY, 0)):
+            return
+
+        # Bloom filter nói "có thể có" -> hỏi DB để chắc chắn
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            cache.set(_revoked_key(jti), True, self._ttl())
+            raise TokenError("Token đã bị thu hồi.")
+        cache.set(_checked_key(jti), True, min(NEGATIVE_TTL, self._ttl()))
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        cache.set(_revoked_key(jti), True, self._ttl())
+        cache.delete(_checked_key(jti))
+        blacklist_filter.them(jti)
+        try:
+            cache.incr(GEN_KEY)
+        except ValueError:
+            cache.set(GEN_KEY, 1, None)
+        return result
+
+    def _ttl(self):
+        return max(1, int(self.payload['exp'] - timezone.now().timestamp()))
@@ -24,6 +24,7 @@ urlpatterns = [
     # --- B. AUTHENTICATION (Đăng nhập/ký/Profile) ---
     path('login/', MyTokenObtainPairView.as_view(), name='dang-nhap'),
     path('logout/', LogoutView.as_view(), name='dang-xuat'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('register/', RegisterView.as_view(), name='auth-register'), # Gom về 1 đường dẫn này
     
     # Profile: Dùng KhachHangProfileView mới (Update & Get info chuẩn)
@@ -31,8 +32,16 @@ urlpatterns = [
 
     # --- D. CHỨC NĂNG QUẢN LÝ RIÊNG (ADMIN) ---
     path('tuixach/them-moi/', CreateTuiXachView.as_view(), name='add-tuixach'),
+    path('tuixach/import/', ImportTuiXachView.as_view(), name='import-tuixach'),
     
     # --- E. THỐNG KÊ & DASHBOARD ---
     path('dashboard/summary/', DashboardSummaryView.as_view(), name='dashboard-summary'), # API Tổng quan trang chủ
     path('thong-ke-don-hang/', ThongKeDonHangView.as_view(), name='thong-ke-don'),
+
+    # --- F. GIÁM SÁT HIỆU NĂNG (CHỦ CỬA HÀNG) ---
+    path('perf/histograms/', PerfHistogramView.as_view(), name='perf-histograms'),
+    path('perf/query-report/', QueryReportView.as_view(), name='perf-query-report'),
+
+    # --- G. DASHBOARD REALTIME (SSE, chạy qua ASGI) ---
+    path('events/dashboard/', dashboard_events, name='dashboard-events'),
 ]
\ No newline at end of file
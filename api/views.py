@@ -1,31 +1,53 @@
 # --- Standard Library Imports ---
+import random
 from datetime import datetime, timedelta
 from decimal import Decimal
+from zoneinfo import ZoneInfo
 # --- Django Core Imports ---
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import transaction
-from django.db.models import Sum, Count, Max, F, Q
-from django.db.models.functions import TruncDate, TruncMonth, Coalesce
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Count, Max, F, Q, Value, prefetch_related_objects
+from django.db.models.functions import TruncDate, TruncMonth, Coalesce, Greatest
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 # --- Third Party Imports (DRF, JWT, Filters) ---
+from asgiref.sync import sync_to_async
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, filters, generics, status
 from rest_framework.permissions import IsAdminUser
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 # --- Local Application Imports ---
+from . import (
+    analytics_export, bulk_adjust, bulk_import, caching, comparison, events, facets, fast_serializers, perf,
+    query_inspector, reports, sales_counters, timeseries,
+)
+from .authentication import StatelessJWTAuthentication, thu_hoi_access_token
 from .drive_service import upload_file_to_drive, delete_file_from_drive
+from .fast_serializers import FastListMixin
+from .parsers import FastJSONParser
+from .phone_numbers import chuan_hoa_sdt, chuan_hoa_tien_to
+from .sparse_fields import SparseFieldsMixin
 from .models import *
 from .permissions import *
 from .serializers import *
+from .tokens import CachedRefreshToken
 
 
+def tao_ma_hoa_don():
+    """ Mã hóa đơn dạng LXB-<timestamp><4 số>: thêm hậu tố ngẫu nhiên để 2 đơn trong cùng 1 giây không bị trùng """
+    return f"LXB-{int(timezone.now().timestamp())}{random.randint(0, 9999):04d}"
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
@@ -44,8 +66,11 @@ class LogoutView(APIView):
             refresh_token = request.data["refresh"]
             
             # Tạo đối tượng token và đưa vào blacklist
-            token = RefreshToken(refresh_token)
+            token = CachedRefreshToken(refresh_token)
             token.blacklist()
+            # Access token đang dùng cũng hết hiệu lực ngay (không chờ hết 60 phút)
+            if request.auth is not None:
+                thu_hoi_access_token(request.auth)
 
             return Response({"message": "Đăng xuất thành công!"}, status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
@@ -55,15 +80,21 @@ class DashboardSummaryView(APIView):
     permission_classes = [IsOwnerUser]
 
     def get(self, request):
-        today = timezone.now().date()
-        current_month = timezone.now().month
-        current_year = timezone.now().year
-
+        today = timezone.localdate()
+        # Lọc theo khoảng [00:00, 00:00 ngày hôm sau) thay vì ngay_tao__date/__month
+        # -> dùng được index ngay_tao, không phải cast ngày trên từng dòng
+        start_today = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+        start_tomorrow = start_today + timedelta(days=1)
+        start_month = start_today.replace(day=1)
+        start_next_month = (start_month + timedelta(days=32)).replace(day=1)
+
+        # Mọi khoảng thời gian ở đây (hôm nay / 7 ngày / tháng này) đều mới hơn mốc lưu trữ
+        # (ORDER_ARCHIVE_MONTHS) -> chỉ đọc bảng HoaDon đang dùng, không qua VIEW gộp
         # ============================================================
         # PHẦN 1: OVERVIEW HÔM NAY (REALTIME)
         # ============================================================
         doanh_thu_hom_nay = HoaDon.objects.filter(
-            ngay_tao__date=today, 
+            ngay_tao__gte=start_today, ngay_tao__lt=start_tomorrow,
             trang_thai='HOAN_THANH'
         ).aggregate(total=Sum('thanh_tien'))['total'] or 0
 
@@ -73,26 +104,29 @@ class DashboardSummaryView(APIView):
         ).count()
         
         don_hom_nay = HoaDon.objects.filter(
-            ngay_tao__date=today
+            ngay_tao__gte=start_today, ngay_tao__lt=start_tomorrow
         ).count()
         # ============================================================
         # PHẦN 2: BIỂU ĐỒ TĂNG TRƯỞNG (7 NGÀY GẦN NHẤT) 
         # ============================================================
-        last_7_days_data = []
         labels = []
         data_values = []
+
+        # 1 query gom nhóm theo ngày cho cả 7 ngày (thay vì 7 query)
+        daily = dict(
+            HoaDon.objects.filter(
+                ngay_tao__gte=start_today - timedelta(days=6), ngay_tao__lt=start_tomorrow,
+                trang_thai='HOAN_THANH'
+            ).annotate(date=TruncDate('ngay_tao'))
+            .values('date')
+            .annotate(total=Sum('thanh_tien'))
+            .values_list('date', 'total')
+        )
         
         for i in range(6, -1, -1): # Từ 6 ngày trước đến hôm nay
             target_date = today - timedelta(days=i)
             labels.append(target_date.strftime("%d/%m")) # Format ngày: 25/12
-
-            # Query doanh thu ngày đó
-            daily_revenue = HoaDon.objects.filter(
-                ngay_tao__date=target_date,
-                trang_thai='HOAN_THANH'
-            ).aggregate(total=Sum('thanh_tien'))['total'] or 0
-            
-            data_values.append(daily_revenue)
+            data_values.append(daily.get(target_date) or 0)
         # Tính toán độ tăng trưởng (Growth Rate) so với hôm qua
         # Ví dụ: Hôm nay 1tr, hôm qua 500k -> Tăng trưởng 100%
         today_rev = data_values[-1]
@@ -113,8 +147,7 @@ class DashboardSummaryView(APIView):
         # PHẦN 3: PHÂN TÍCH NGUỒN THU (THÁNG NÀY)
         # ============================================================
         source_revenue = HoaDon.objects.filter(
-            ngay_tao__month=current_month,
-            ngay_tao__year=current_year,
+            ngay_tao__gte=start_month, ngay_tao__lt=start_next_month,
             trang_thai='HOAN_THANH'
         ).values('loai_hoa_don').annotate(
             total_revenue=Sum('thanh_tien'),
@@ -132,12 +165,13 @@ class DashboardSummaryView(APIView):
         # ============================================================
         # PHẦN 4: TOP SẢN PHẨM (BÁN CHẠY & BÁN Ế)
         # ============================================================
+        # Đọc từ bộ đếm đã materialize (TuiXach.da_ban / rollup theo ngày),
+        # không join toàn bộ lịch sử ChiTietHoaDon. ?window=7|30|90 để xem theo kỳ.
+        window = request.query_params.get('window')
+        days = int(window) if window and window.isdigit() and int(window) in sales_counters.WINDOWS else None
+
         # Top 5 Bán chạy
-        top_selling = TuiXach.objects.filter(
-            chitiethoadon__hoa_don__trang_thai='HOAN_THANH'
-        ).annotate(
-            total_sold=Sum('chitiethoadon__so_luong')
-        ).order_by('-total_sold')[:5]
+        top_selling = sales_counters.ban_chay(5, days)
 
         best_sellers_data = [
             {
@@ -152,12 +186,7 @@ class DashboardSummaryView(APIView):
         ]
 
         # Top 5 Bán ế (Bán ít + Tồn nhiều)
-        slow_selling = TuiXach.objects.annotate(
-            total_sold=Coalesce(
-                Sum('chitiethoadon__so_luong', filter=Q(chitiethoadon__hoa_don__trang_thai='HOAN_THANH')), 
-                0
-            )
-        ).order_by('total_sold', '-so_luong_ton')[:5]
+        slow_selling = sales_counters.ban_cham(5, days)
 
         slow_sellers_data = [
             {
@@ -198,7 +227,7 @@ class TuiXachReadSerializer(TuiXachSerializer):
         depth = 1 
 
 
-class TuiXachViewSet(viewsets.ModelViewSet):
+class TuiXachViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = TuiXach.objects.all().order_by('-id')
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
@@ -236,9 +265,22 @@ class TuiXachViewSet(viewsets.ModelViewSet):
         self.perform_update(serializer)
 
         return Response(serializer.data)
+    @action(detail=False, methods=['post'], url_path='dieu-chinh',
+            parser_classes=[FastJSONParser], permission_classes=[IsStaffOrOwner])
+    def dieu_chinh(self, request):
+        """
+        POST /api/tui-xach/dieu-chinh/  {"items": [{"id": 1, "gia_tien": 1500000, "so_luong_ton_delta": -2}, ...],
+                                          "dry_run": false}
+        Đổi giá / tồn kho hàng loạt trong 1 transaction, trả về danh sách thay đổi (xem api/bulk_adjust.py)
+        """
+        rows = bulk_adjust.kiem_tra(request.data)
+        ket_qua = bulk_adjust.dieu_chinh(rows, dry_run=bool(request.data.get('dry_run')))
+        return Response({"success": True, **ket_qua})
+
     def destroy(self, request, *args, **kwargs):
         tui_xach = self.get_object()
-        is_used = tui_xach.chitiethoadon_set.exists()
+        # Gồm cả dòng đơn đã lưu trữ (bảng lưu trữ cũng PROTECT túi xách)
+        is_used = ChiTietHoaDonTatCa.objects.filter(tui_xach_id=tui_xach.pk).exists()
         
         if is_used:
             return Response(
@@ -258,8 +300,17 @@ class CreateTuiXachView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         data = request.data.copy()
-        data['danh_muc'] = 1 
-        # 2. Bắt đầu xử lý upload
+        data.pop('hinh_anh', None)
+        if not data.get('danh_muc'):
+            # Form cũ không gửi danh mục -> dùng danh mục đầu tiên
+            data['danh_muc'] = DanhMuc.objects.order_by('id').values_list('id', flat=True).first()
+
+        # 2. Kiểm tra dữ liệu TRƯỚC khi upload: dữ liệu sai thì không để lại ảnh rác trên Drive
+        serializer = TuiXachSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # 3. Bắt đầu xử lý upload
         image_file = request.FILES['hinh_anh']
         
         try:
@@ -273,8 +324,6 @@ class CreateTuiXachView(APIView):
                     {"error": "Lỗi hệ thống: Upload ảnh không thành công (Không nhận được link)."}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
-            # Nếu có link, gán vào data
-            data['hinh_anh'] = drive_link
 
         except Exception as e:
             # Bắt lỗi crash trong quá trình upload (ví dụ sai token, mất mạng...)
@@ -282,29 +331,86 @@ class CreateTuiXachView(APIView):
                 {"error": f"Lỗi ngoại lệ khi upload ảnh: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        # 3. Nếu upload thành công mới chạy xuống đây để lưu DB
-        serializer = TuiXachSerializer(data=data)
-        
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-            
-        # Nếu dữ liệu khác bị sai (ví dụ thiếu tên, giá tiền...)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # 4. Upload thành công mới lưu DB
+        serializer.save(hinh_anh=drive_link)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ImportTuiXachView(APIView):
+    """
+    POST /api/tuixach/import/ (multipart): file = .csv/.xlsx, anh = .zip (tùy chọn), dry_run = 1 (tùy chọn)
+    Xem api/bulk_import.py. File rất lớn nên chạy `python manage.py import_products` (không bị timeout HTTP).
+    """
+    permission_classes = [IsStaffOrOwner]
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request):
+        file = request.FILES.get('file')
+        if file is None:
+            return Response({"error": "Thiếu file dữ liệu (.csv / .xlsx)."}, status=status.HTTP_400_BAD_REQUEST)
+        ket_qua_dong = []
+
+        def tien_do(loai, khoa, gia_tri):
+            # Kết quả từng dòng: 'ok' hoặc lỗi upload ảnh
+            if loai == 'dong':
+                ket_qua_dong.append({"dong": khoa, "ok": gia_tri == 'ok', "loi": None if gia_tri == 'ok' else gia_tri})
+
+        try:
+            rows = bulk_import.doc_bang(file.name, file)
+            ket_qua = bulk_import.nhap(
+                rows, anh_zip=request.FILES.get('anh'),
+                dry_run=request.data.get('dry_run') in ('1', 'true', 'True'), tien_do=tien_do,
+            )
+        except bulk_import.LoiNhap as e:
+            return Response({"error": str(e), "loi": e.loi}, status=status.HTTP_400_BAD_REQUEST)
 
+        ket_qua_dong.sort(key=lambda r: r['dong'])
+        return Response({"success": True, **ket_qua, "dong": ket_qua_dong},
+                        status=status.HTTP_201_CREATED if ket_qua['tao_moi'] else status.HTTP_200_OK)
 
-class KhachHangViewSet(viewsets.ModelViewSet):
+
+class KhachHangViewSet(FastListMixin, viewsets.ModelViewSet):
     # Lấy tất cả khách hàng, sắp xếp người mới nhất lên đầu
     queryset = KhachHang.objects.all().order_by('-ngay_tham_gia')
     serializer_class = KhachHangSerializer
+    fast_serializer = fast_serializers.KHACH_HANG
+    field_dependencies = {'hang_thanh_vien': ['tong_chi_tieu'], 'muc_giam_gia': ['tong_chi_tieu']}
     permission_classes = [IsAuthenticated] # Bắt buộc đăng nhập
     # --- CẤU HÌNH TÌM KIẾM ---
     filter_backends = [filters.SearchFilter]
     # Cho phép tìm theo Tên hoặc Số điện thoại
     search_fields = ['ho_ten', 'so_dien_thoai']
+    @action(detail=False, methods=['get'], url_path='tra-cuu-sdt', permission_classes=[IsStaffOrOwner])
+    def tra_cuu_sdt(self, request):
+        """ GET /api/khach-hang/tra-cuu-sdt/?sdt=+84912345678 -> đúng 1 khách (tra unique index) """
+        sdt = chuan_hoa_sdt(request.query_params.get('sdt'))
+        if sdt is None:
+            return Response({"error": "Số điện thoại không hợp lệ"}, status=400)
+        khach = KhachHang.objects.select_related('user').filter(sdt_chuan_hoa=sdt).first()
+        if khach is None:
+            return Response({"error": "Không tìm thấy khách hàng"}, status=404)
+        return Response(KhachHangSerializer(khach).data)
+
+    @action(detail=False, methods=['get'], url_path='goi-y-sdt', permission_classes=[IsStaffOrOwner])
+    def goi_y_sdt(self, request):
+        """ GET /api/khach-hang/goi-y-sdt/?q=0912 -> gợi ý khách cho ô nhập SĐT ở POS (range scan trên index) """
+        tien_to = chuan_hoa_tien_to(request.query_params.get('q'))
+        if tien_to is None or len(tien_to) < 4:
+            return Response([])
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        # Khoảng [tien_to, tien_to + 1) thay cho LIKE 'tien_to%' -> DB nào cũng dùng được index
+        het = tien_to[:-1] + chr(ord(tien_to[-1]) + 1)
+        queryset = KhachHang.objects.filter(sdt_chuan_hoa__gte=tien_to, sdt_chuan_hoa__lt=het).order_by('sdt_chuan_hoa')
+        rows = fast_serializers.KHACH_HANG.values(queryset)[:limit]
+        return Response(fast_serializers.KHACH_HANG.many(rows))
+
     def destroy(self, request, *args, **kwargs):
         khach_hang = self.get_object()
-        if khach_hang.hoadon_set.exists():
+        # Gồm cả đơn đã lưu trữ (bảng lưu trữ không có khóa ngoại -> xóa sẽ để lại đơn mồ côi)
+        if HoaDonTatCa.objects.filter(khach_hang_id=khach_hang.pk).exists():
             return Response(
                 {"error": f"Không thể xóa khách hàng '{khach_hang.ho_ten}' vì họ đã từng mua hàng."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -317,10 +423,11 @@ class ThongKeDonHangView(APIView):
 
     def get(self, request):
         # 1. Tổng doanh thu (Lũy kế từ trước tới nay)
-        tong_doanh_thu = HoaDon.objects.filter(trang_thai='HOAN_THANH').aggregate(Sum('thanh_tien'))['thanh_tien__sum'] or 0
+        # (tính cả đơn đã lưu trữ - HoaDonTatCa; các chỉ số theo ngày/tháng chỉ cần bảng đơn đang dùng)
+        tong_doanh_thu = HoaDonTatCa.objects.filter(trang_thai='HOAN_THANH').aggregate(Sum('thanh_tien'))['thanh_tien__sum'] or 0
         
         # 2. Tổng số đơn hàng
-        tong_don_hang = HoaDon.objects.count()
+        tong_don_hang = HoaDonTatCa.objects.count()
         
         # --- CÁC CHỈ SỐ THEO THỜI GIAN ---
         now = timezone.now()
@@ -356,11 +463,16 @@ class PublicCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
     pagination_class = None
 
-class PublicProductViewSet(viewsets.ReadOnlyModelViewSet):
+    def list(self, request, *args, **kwargs):
+        # Danh mục ít khi đổi -> đọc từ cache (xóa khi DanhMuc lưu/xóa, xem signals.py)
+        return Response(caching.lay_danh_muc())
+
+class PublicProductViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     """ GET /api/products/ """
     # Chỉ lấy sản phẩm còn hàng
     queryset = TuiXach.objects.filter(so_luong_ton__gt=0).order_by('-ngay_tao')
     serializer_class = TuiXachSerializer
+    fast_serializer = fast_serializers.TUI_XACH
     permission_classes = [AllowAny]
     
     # Cấu hình bộ lọc, tìm kiếm, sắp xếp
@@ -373,6 +485,25 @@ class PublicProductViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['ten_tui', 'mo_ta']         # ?search=Chanel
     ordering_fields = ['gia_tien', 'ngay_tao']   # ?ordering=-gia_tien
 
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        GET /api/products/facets/?search=&danh_muc=&gia_tien__gte=&gia_tien__lte=
+        Số sản phẩm theo danh mục / khoảng giá / còn-hết hàng cho bộ lọc hiện tại, 1 query (xem api/facets.py)
+        """
+        # Dùng đúng filterset của list để đọc + kiểm tra tham số (sai định dạng -> 400 giống list)
+        filterset = DjangoFilterBackend().get_filterset(request, self.queryset, self)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        loc = filterset.form.cleaned_data
+        search = request.query_params.get('search', '')
+        queryset = filters.SearchFilter().filter_queryset(request, TuiXach.objects.all(), self)
+        danh_muc = loc.get('danh_muc')
+        return Response(facets.dem_co_cache(
+            queryset, search, danh_muc.id if danh_muc else None,
+            loc.get('gia_tien__gte'), loc.get('gia_tien__lte'),
+        ))
+
 # =========================================================
 # 2. NHÓM AUTH (ĐĂNG KÝ, ĐĂNG NHẬP, PROFILE)
 # =========================================================
@@ -416,8 +547,9 @@ class KhachHangProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        # Lấy profile của chính user đang login
-        return get_object_or_404(KhachHang, user=self.request.user)
+        # Lấy profile của chính user đang login. Đọc dòng mới từ DB (không dùng bản cache):
+        # save() cả object cũ sẽ ghi đè tong_chi_tieu vừa được cộng bằng F()
+        return get_object_or_404(KhachHang.objects.select_related('user'), user_id=self.request.user.id)
 
     def update(self, request, *args, **kwargs):
         # Custom response để trả về đẹp hơn
@@ -431,9 +563,35 @@ class KhachHangProfileView(generics.RetrieveUpdateAPIView):
             "data": serializer.data
         })
 
-class QuanLyDonHangViewSet(viewsets.ModelViewSet):
+def _doi_trang_thai_don(don_hang, trang_thai_moi, **fields):
+    """
+    Đổi trạng thái bằng UPDATE có điều kiện trên trạng thái vừa đọc: 2 request đồng thời (bấm 2 lần) chỉ 1 request
+    đổi được -> bộ đếm doanh số, sự kiện, điểm tích lũy chỉ ghi 1 lần.
+    Trả về trạng thái cũ, None nếu request khác đã đổi trạng thái trước.
+    """
+    trang_thai_cu = don_hang.trang_thai
+    fields = {'ngay_cap_nhat': timezone.now(), **fields}  # update() không chạy auto_now
+    if not HoaDon.objects.filter(pk=don_hang.pk, trang_thai=trang_thai_cu).update(trang_thai=trang_thai_moi, **fields):
+        return None
+    don_hang.trang_thai = trang_thai_moi
+    for field, value in fields.items():
+        setattr(don_hang, field, value)
+    return trang_thai_cu
+
+
+def _cong_chi_tieu(don_hang):
+    # Cộng bằng F() trên DB: object khach_hang đọc lúc lấy đơn có thể đã cũ
+    if don_hang.khach_hang_id:
+        KhachHang.objects.filter(pk=don_hang.khach_hang_id).update(tong_chi_tieu=F('tong_chi_tieu') + don_hang.thanh_tien)
+        caching.xoa_khach_hang(don_hang.khach_hang.user_id)
+
+
+class QuanLyDonHangViewSet(FastListMixin, viewsets.ModelViewSet):
     permission_classes = [IsStaffOrOwner]
     serializer_class = QuanLyHoaDonSerializer 
+    fast_serializer = fast_serializers.QUAN_LY_HOA_DON
+    # ?fields=... không kèm chi_tiet thì bỏ qua query chi tiết đơn
+    expandable_fields = ('chi_tiet',)
 
     # Cấu hình tìm kiếm
     filter_backends = [filters.SearchFilter]
@@ -448,7 +606,7 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
         elif user.is_staff:
             queryset = queryset.filter(
                 Q(loai_hoa_don='ONLINE') | 
-                Q(loai_hoa_don='OFFLINE', nhan_vien=user)
+                Q(loai_hoa_don='OFFLINE', nhan_vien_id=user.id)
             )
         else:
             return HoaDon.objects.none()
@@ -493,7 +651,7 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
                     return Response({"error": f"Sản phẩm '{tui.ten_tui}' hết hàng (Còn: {tui.so_luong_ton})"}, status=400)
                 # Trừ kho
                 tui.so_luong_ton -= qty
-                tui.save()
+                tui.save(update_fields=['so_luong_ton'])
 
                 # Cộng tiền
                 total_money += tui.gia_tien * qty
@@ -506,21 +664,31 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
             if khach_id:
                 khach_hang = get_object_or_404(KhachHang, pk=khach_id)
             elif new_phone and new_name:
-                existing_khach = KhachHang.objects.filter(so_dien_thoai=new_phone).first()
+                # Tra theo SĐT đã chuẩn hóa (unique index): "+84 912..." và "0912..." là cùng 1 khách
+                sdt = chuan_hoa_sdt(new_phone)
+                existing_khach = KhachHang.objects.filter(sdt_chuan_hoa=sdt).first() if sdt else None
                 
                 if existing_khach:
                     khach_hang = existing_khach # Nếu SĐT đã có -> Dùng lại khách cũ
                 else:
                     email_to_save = new_email if new_email and new_email.strip() else None
 
-                    khach_hang = KhachHang.objects.create(
-                        ho_ten=new_name,
-                        so_dien_thoai=new_phone,
-                        dia_chi=new_address if new_address else "",
-                        email=email_to_save,     
-                        tong_chi_tieu=0,    # Mới tạo nên chưa tiêu gì
-                        user=None           # Khách tại quầy chưa có tài khoản web
-                    )
+                    try:
+                        with transaction.atomic():
+                            khach_hang = KhachHang.objects.create(
+                                ho_ten=new_name,
+                                so_dien_thoai=new_phone,
+                                dia_chi=new_address if new_address else "",
+                                email=email_to_save,     
+                                tong_chi_tieu=0,    # Mới tạo nên chưa tiêu gì
+                                user=None           # Khách tại quầy chưa có tài khoản web
+                            )
+                    except IntegrityError:
+                        # Quầy khác vừa tạo khách cùng SĐT -> dùng lại
+                        khach_hang = KhachHang.objects.filter(sdt_chuan_hoa=sdt).first() if sdt else None
+                        if khach_hang is None:
+                            transaction.set_rollback(True)  # Hoàn lại số lượng tồn đã trừ ở trên
+                            return Response({"error": "Không tạo được khách hàng mới, vui lòng thử lại."}, status=400)
             giam_gia = 0
             muc_giam_percent = 0
             
@@ -535,10 +703,10 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
             final_phone = khach_hang.so_dien_thoai if khach_hang else ""
 
             hoa_don = HoaDon.objects.create(
-                ma_hoa_don=f"LXB-{int(timezone.now().timestamp())}",
+                ma_hoa_don=tao_ma_hoa_don(),
                 loai_hoa_don='OFFLINE',
                 trang_thai='CHO_THANH_TOAN', # Tạo xong chờ thu tiền
-                nhan_vien=request.user,
+                nhan_vien_id=request.user.id,
                 khach_hang=khach_hang, # Null nếu là khách lẻ
                 
                 ho_ten_nguoi_nhan=final_name,
@@ -547,15 +715,20 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
                 tong_tien_hang=total_money,
                 giam_gia=giam_gia,
                 thanh_tien=total_money - giam_gia,
-                ghi_chu=data.get('ghi_chu', 'Bán hàng tại quầy')
+                ghi_chu=data.get('ghi_chu', 'Bán hàng tại quầy'),
+                so_san_pham=sum(d['qty'] for d in details_buffer),
+                anh_dai_dien=details_buffer[0]['tui'].hinh_anh if details_buffer else '',
             )
             for d in details_buffer:
                 ChiTietHoaDon.objects.create(
                     hoa_don=hoa_don,
                     tui_xach=d['tui'],
                     so_luong=d['qty'],
-                    don_gia_luc_ban=d['price']
+                    don_gia_luc_ban=d['price'],
+                    ten_san_pham=d['tui'].ten_tui,
+                    anh_san_pham=d['tui'].hinh_anh,
                 )
+            events.bao_thay_doi_don(hoa_don)
             response_data = QuanLyHoaDonSerializer(hoa_don).data
             # Gửi thêm thông tin khách hàng để Frontend hiển thị popup "Khách VIP"
             if khach_hang:
@@ -577,15 +750,13 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
         if don_hang.trang_thai == 'CHO_THANH_TOAN':
             with transaction.atomic():
                 # 1. Đổi trạng thái sang HOÀN THÀNH luôn (Không giao vận gì cả)
-                don_hang.trang_thai = 'HOAN_THANH'
-                don_hang.save()
-                
-                # 2. Cộng tích lũy doanh số cho khách (Nếu có thành viên)
-                if don_hang.khach_hang:
-                    don_hang.khach_hang.tong_chi_tieu += don_hang.thanh_tien
-                    don_hang.khach_hang.save()
-                    
-            return Response({"msg": "Thanh toán thành công!", "status": "HOAN_THANH"})
+                if _doi_trang_thai_don(don_hang, 'HOAN_THANH'):
+                    sales_counters.ghi_nhan_hoan_thanh(don_hang)
+                    events.bao_thay_doi_don(don_hang, 'CHO_THANH_TOAN')
+
+                    # 2. Cộng tích lũy doanh số cho khách (Nếu có thành viên)
+                    _cong_chi_tieu(don_hang)
+                    return Response({"msg": "Thanh toán thành công!", "status": "HOAN_THANH"})
             
         return Response({"error": "Đơn hàng này không ở trạng thái chờ thanh toán"}, status=400)
     # =========================================================
@@ -601,19 +772,22 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
         if don_hang.trang_thai in allowed:
             ly_do = request.data.get('ly_do', 'Khách đổi ý')
             with transaction.atomic():
-                # 1. Hoàn lại tồn kho (Vì lúc tạo đơn đã trừ rồi)
-                for chi_tiet in don_hang.chi_tiet.all():
-                    tui = chi_tiet.tui_xach
-                    tui.so_luong_ton += chi_tiet.so_luong
-                    tui.save()
-                
-                # 2. Cập nhật trạng thái
-                don_hang.trang_thai = 'DA_HUY'
-                don_hang.ghi_chu = f"{don_hang.ghi_chu or ''} | Hủy: {ly_do}"
-                don_hang.nhan_vien = request.user
-                don_hang.save()
-                
-            return Response({"msg": "Đã hủy đơn và hoàn kho", "status": "DA_HUY"}) 
+                # 1. Cập nhật trạng thái (request khác vừa xác nhận / hủy trước -> không hủy, không hoàn kho)
+                trang_thai_cu = _doi_trang_thai_don(
+                    don_hang, 'DA_HUY',
+                    ghi_chu=f"{don_hang.ghi_chu or ''} | Hủy: {ly_do}", nhan_vien_id=request.user.id,
+                )
+                if trang_thai_cu:
+                    # 2. Hoàn lại tồn kho (Vì lúc tạo đơn đã trừ rồi)
+                    for chi_tiet in don_hang.chi_tiet.all():
+                        # Cộng bằng F() trên DB: object tui_xach chưa khóa, save() cả object sẽ ghi đè da_ban/tồn kho mới
+                        TuiXach.objects.filter(pk=chi_tiet.tui_xach_id).update(
+                            so_luong_ton=F('so_luong_ton') + chi_tiet.so_luong
+                        )
+                    transaction.on_commit(caching.tang_phien_ban_san_pham)  # update() không phát signal
+                    sales_counters.ghi_nhan_huy(don_hang, trang_thai_cu)
+                    events.bao_thay_doi_don(don_hang, trang_thai_cu)
+                    return Response({"msg": "Đã hủy đơn và hoàn kho", "status": "DA_HUY"})
         return Response({"error": "Đơn hàng đã hoàn thành hoặc đang giao, không thể hủy"}, status=400)
     # =========================================================
     # 4. DUYỆT ĐƠN HÀNG (Bước 1 của đơn Online)
@@ -626,12 +800,11 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
         """
         don_hang = self.get_object()
         
-        if don_hang.trang_thai == 'CHO_XAC_NHAN':
-            # Cập nhật trạng thái
-            don_hang.trang_thai = 'DA_XAC_NHAN'
-            # Ghi nhận nhân viên nào duyệt đơn
-            don_hang.nhan_vien = request.user 
-            don_hang.save()
+        # Cập nhật trạng thái, ghi nhận nhân viên nào duyệt đơn
+        if don_hang.trang_thai == 'CHO_XAC_NHAN' and _doi_trang_thai_don(
+            don_hang, 'DA_XAC_NHAN', nhan_vien_id=request.user.id
+        ):
+            events.bao_thay_doi_don(don_hang, 'CHO_XAC_NHAN')
             
             return Response({
                 "msg": "Đã duyệt đơn hàng, chuyển sang đóng gói.", 
@@ -651,9 +824,8 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
         """
         don_hang = self.get_object()
         
-        if don_hang.trang_thai == 'DA_XAC_NHAN':
-            don_hang.trang_thai = 'DANG_GIAO'
-            don_hang.save()
+        if don_hang.trang_thai == 'DA_XAC_NHAN' and _doi_trang_thai_don(don_hang, 'DANG_GIAO'):
+            events.bao_thay_doi_don(don_hang, 'DA_XAC_NHAN')
             
             return Response({
                 "msg": "Đơn hàng đang được vận chuyển.", 
@@ -675,45 +847,99 @@ class QuanLyDonHangViewSet(viewsets.ModelViewSet):
         
         if don_hang.trang_thai == 'DANG_GIAO':
             with transaction.atomic():
-                # 1. Đổi trạng thái
-                don_hang.trang_thai = 'HOAN_THANH'
-                don_hang.ngay_cap_nhat = timezone.now() # Cập nhật thời gian hoàn thành
-                don_hang.save()
-                
-                # 2. Cộng điểm tích lũy (Tổng chi tiêu) cho khách
-                if don_hang.khach_hang:
-                    don_hang.khach_hang.tong_chi_tieu += don_hang.thanh_tien
-                    don_hang.khach_hang.save()
-            
-            return Response({
-                "msg": "Giao hàng thành công! Đã cộng điểm tích lũy.", 
-                "status": "HOAN_THANH"
-            })
+                # 1. Đổi trạng thái (ngay_cap_nhat = thời gian hoàn thành)
+                if _doi_trang_thai_don(don_hang, 'HOAN_THANH'):
+                    sales_counters.ghi_nhan_hoan_thanh(don_hang)
+                    events.bao_thay_doi_don(don_hang, 'DANG_GIAO')
+
+                    # 2. Cộng điểm tích lũy (Tổng chi tiêu) cho khách
+                    _cong_chi_tieu(don_hang)
+                    return Response({
+                        "msg": "Giao hàng thành công! Đã cộng điểm tích lũy.", 
+                        "status": "HOAN_THANH"
+                    })
             
         return Response({"error": "Đơn hàng chưa ở trạng thái đang giao"}, status=400)
 # =========================================================
 # 3. NHÓM ĐƠN HÀNG (CLIENT ORDER)
 # =========================================================
+class DonCuaToiPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def _nap_tui_dong_chua_snapshot(orders):
+    """ Dòng chi tiết chưa backfill snapshot đọc tên/ảnh từ tui_xach: nạp túi 1 query cho cả lô, tránh N+1 """
+    dong = [ct for order in orders for ct in order.chi_tiet.all() if not ct.ten_san_pham]
+    prefetch_related_objects(dong, 'tui_xach')
+
+
 class ClientOrderViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
+    def _khach_hang_id(self, request):
+        """ ID hồ sơ khách: lấy từ claim trong JWT (MyTokenSerializer), token cũ không có claim thì đọc cache """
+        auth = request.auth
+        if auth is not None and hasattr(auth, 'get') and auth.get('khach_hang_id'):
+            return auth['khach_hang_id']
+        khach = caching.lay_khach_hang(request.user.id)
+        return khach['id'] if khach else None
+
     def list(self, request):
-        """ Lấy lịch sử mua hàng của tôi """
-        try:
-            khach = KhachHang.objects.get(user=request.user)
-            orders = HoaDon.objects.filter(khach_hang=khach).order_by('-ngay_tao')
-            
-            # Truyền context để serializer render full URL ảnh
-            serializer = HoaDonSerializer(orders, many=True, context={'request': request})
-            return Response({"success": True, "data": serializer.data})
-        except KhachHang.DoesNotExist:
+        """
+        Lấy lịch sử mua hàng của tôi.
+        ?tom_tat=1: chỉ header + so_san_pham + anh_dai_dien, phân trang (?page=, ?page_size=);
+        chi tiết từng đơn lấy qua retrieve khi mở đơn
+        """
+        khach_id = self._khach_hang_id(request)
+        tom_tat = request.query_params.get('tom_tat') in ('1', 'true')
+        if khach_id is None:
+            if tom_tat:
+                return Response({"success": True, "count": 0, "next": None, "previous": None, "data": []})
             return Response({"success": True, "data": []})
+        # Gồm cả đơn cũ đã chuyển sang bảng lưu trữ
+        orders = HoaDonTatCa.objects.filter(khach_hang_id=khach_id).order_by('-ngay_tao', '-id')
+        if tom_tat:
+            return self._tom_tat(request, orders)
+        
+        # Truyền context để serializer render full URL ảnh
+        if settings.FAST_LIST_SERIALIZERS:
+            fast = fast_serializers.HOA_DON_TAT_CA
+            data = fast.many(fast.values(orders), {'request': request})
+            return Response({"success": True, "data": data})
+        orders = list(orders.prefetch_related('chi_tiet'))
+        _nap_tui_dong_chua_snapshot(orders)
+        serializer = HoaDonSerializer(orders, many=True, context={'request': request})
+        return Response({"success": True, "data": serializer.data})
+
+    def _tom_tat(self, request, orders):
+        # Đọc cột tóm tắt ghi sẵn trên hóa đơn: 1 query COUNT + 1 query trang, không join chi tiết / sản phẩm
+        paginator = DonCuaToiPagination()
+        context = {'request': request}
+        if settings.FAST_LIST_SERIALIZERS:
+            fast = fast_serializers.HOA_DON_TOM_TAT
+            data = fast.many(paginator.paginate_queryset(fast.values(orders), request, view=self), context)
+        else:
+            page = paginator.paginate_queryset(orders, request, view=self)
+            data = HoaDonTomTatSerializer(page, many=True, context=context).data
+        return Response({
+            "success": True,
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "data": data,
+        })
 
     def retrieve(self, request, pk=None):
         """ Xem chi tiết 1 đơn hàng """
+        khach_id = self._khach_hang_id(request)
+        if khach_id is None:
+            # Tài khoản không có hồ sơ khách (vd nhân viên): khach_hang_id=None sẽ thành IS NULL -> lộ đơn tại quầy
+            return Response({"error": "Không tìm thấy đơn hàng"}, status=404)
         try:
-            khach = KhachHang.objects.get(user=request.user)
-            order = get_object_or_404(HoaDon, pk=pk, khach_hang=khach)
+            order = get_object_or_404(HoaDonTatCa.objects.prefetch_related('chi_tiet'), pk=pk, khach_hang_id=khach_id)
+            _nap_tui_dong_chua_snapshot([order])
             
             serializer = HoaDonSerializer(order, context={'request': request})
             return Response({"success": True, "data": serializer.data})
@@ -725,10 +951,9 @@ class ClientOrderViewSet(viewsets.ViewSet):
         user = request.user
         data = request.data
         
-        # 1. Kiểm tra tài khoản khách hàng
-        try:
-            khach_hang = KhachHang.objects.get(user=user)
-        except KhachHang.DoesNotExist:
+        # 1. Kiểm tra tài khoản khách hàng: đọc dòng mới từ DB, mức giảm giá phải theo tong_chi_tieu hiện tại
+        khach_hang = KhachHang.objects.filter(user_id=user.id).first()
+        if khach_hang is None:
             return Response({"error": "Tài khoản chưa có thông tin khách hàng"}, status=400)
 
         # 2. Kiểm tra giỏ hàng
@@ -754,7 +979,7 @@ class ClientOrderViewSet(viewsets.ViewSet):
                 
                 # Trừ kho ngay lập tức
                 tui.so_luong_ton -= qty
-                tui.save()
+                tui.save(update_fields=['so_luong_ton'])
 
                 thanh_tien_item = tui.gia_tien * qty
                 total_money += thanh_tien_item
@@ -776,7 +1001,7 @@ class ClientOrderViewSet(viewsets.ViewSet):
             ghi_chu_he_thong = f"VIP: Giảm {phan_tram_giam}%" if phan_tram_giam > 0 else ""
             
             hoa_don = HoaDon.objects.create(
-                ma_hoa_don=f"LXB-{int(timezone.now().timestamp())}",
+                ma_hoa_don=tao_ma_hoa_don(),
                 khach_hang=khach_hang,
                 loai_hoa_don='ONLINE',
                 trang_thai='CHO_XAC_NHAN',
@@ -792,7 +1017,10 @@ class ClientOrderViewSet(viewsets.ViewSet):
                 giam_gia=tien_giam_gia,
                 thanh_tien=tien_thanh_toan,
                 
-                ghi_chu=f"{ghi_chu_user} | {ghi_chu_he_thong}".strip(" | ")
+                ghi_chu=f"{ghi_chu_user} | {ghi_chu_he_thong}".strip(" | "),
+                # Tóm tắt cho danh sách đơn của tôi (?tom_tat=1)
+                so_san_pham=sum(d['qty'] for d in details_buffer),
+                anh_dai_dien=details_buffer[0]['tui'].hinh_anh,
             )
 
             # --- BƯỚC 4: TẠO CHI TIẾT HÓA ĐƠN (ITEMS) ---
@@ -801,12 +1029,17 @@ class ClientOrderViewSet(viewsets.ViewSet):
                     hoa_don=hoa_don,               # Field name: hoa_don
                     tui_xach=detail['tui'],        # Field name: tui_xach
                     so_luong=detail['qty'],        # Field name: so_luong
-                    don_gia_luc_ban=detail['price'] # Field name: don_gia_luc_ban (QUAN TRỌNG)
+                    don_gia_luc_ban=detail['price'], # Field name: don_gia_luc_ban (QUAN TRỌNG)
+                    # Snapshot tên/ảnh lúc bán: đổi tên sản phẩm sau này không làm sai hóa đơn
+                    ten_san_pham=detail['tui'].ten_tui,
+                    anh_san_pham=detail['tui'].hinh_anh,
                 )
 
             # --- BƯỚC 5: CẬP NHẬT TỔNG CHI TIÊU KHÁCH ---
-            khach_hang.tong_chi_tieu += tien_thanh_toan
-            khach_hang.save()
+            # Cộng trực tiếp trên DB (F) thay vì save() cả object đang nằm trong cache
+            KhachHang.objects.filter(pk=khach_hang.pk).update(tong_chi_tieu=F('tong_chi_tieu') + tien_thanh_toan)
+            caching.xoa_khach_hang(user.id)
+            events.bao_thay_doi_don(hoa_don)
 
             return Response({
                 "success": True,
@@ -822,27 +1055,36 @@ class ClientOrderViewSet(viewsets.ViewSet):
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """ HỦY ĐƠN HÀNG """
+        khach_id = self._khach_hang_id(request)
+        if khach_id is None:
+            return Response({"error": "Không tìm thấy đơn hàng"}, status=404)
         try:
-            khach = KhachHang.objects.get(user=request.user)
-            order = get_object_or_404(HoaDon, pk=pk, khach_hang=khach)
+            order = get_object_or_404(HoaDon, pk=pk, khach_hang_id=khach_id)
             
             if order.trang_thai == 'CHO_XAC_NHAN':
                 with transaction.atomic():
+                    # Đổi trạng thái trước: nhân viên vừa duyệt / request hủy khác chạy trước -> không hoàn kho 2 lần
+                    trang_thai_cu = _doi_trang_thai_don(
+                        order, 'DA_HUY', ghi_chu=(order.ghi_chu or "") + " | Khách tự hủy"
+                    )
+                    if not trang_thai_cu:
+                        return Response({"error": "Đơn hàng đang xử lý, không thể hủy"}, status=400)
+
                     # 1. Hoàn lại kho
                     for chi_tiet in order.chi_tiet.all():
-                        tui = chi_tiet.tui_xach
-                        tui.so_luong_ton += chi_tiet.so_luong
-                        tui.save()
+                        TuiXach.objects.filter(pk=chi_tiet.tui_xach_id).update(
+                            so_luong_ton=F('so_luong_ton') + chi_tiet.so_luong
+                        )
+                    transaction.on_commit(caching.tang_phien_ban_san_pham)  # update() không phát signal
                     
-                    # 2. Trừ lại điểm tích lũy
-                    khach.tong_chi_tieu -= order.thanh_tien
-                    if khach.tong_chi_tieu < 0: khach.tong_chi_tieu = 0
-                    khach.save()
+                    # 2. Trừ lại điểm tích lũy (không âm)
+                    KhachHang.objects.filter(pk=khach_id).update(
+                        tong_chi_tieu=Greatest(F('tong_chi_tieu') - order.thanh_tien, Value(0))
+                    )
+                    caching.xoa_khach_hang(request.user.id)
                     
-                    # 3. Đổi trạng thái
-                    order.trang_thai = 'DA_HUY'
-                    order.ghi_chu = (order.ghi_chu or "") + " | Khách tự hủy"
-                    order.save()
+                    sales_counters.ghi_nhan_huy(order, trang_thai_cu)
+                    events.bao_thay_doi_don(order, trang_thai_cu)
                     
                 return Response({"success": True, "message": "Đã hủy đơn hàng"})
             else:
@@ -853,142 +1095,139 @@ class ClientOrderViewSet(viewsets.ViewSet):
 
 
 class ThongKeViewSet(viewsets.ViewSet):
+    """ Báo cáo theo khoảng ngày tùy chọn: đọc HoaDonTatCa / ChiTietHoaDonTatCa (gồm cả đơn đã lưu trữ) """
     permission_classes = [IsOwnerUser]
     # --- HÀM PHỤ: Xử lý lọc ngày & Ngoại lệ E1 ---
-    def _get_date_range(self, request):
-        now = timezone.now()
-        start_str = request.query_params.get('from_date')
-        end_str = request.query_params.get('to_date')
-
-        # Mặc định: 30 ngày gần nhất nếu không chọn ngày
-        end_date = now
-        start_date = now - timedelta(days=30)
-
+    def _get_day_range(self, request, params=None):
+        """ Khoảng ngày (date) theo REPORT_TIME_ZONE, gồm cả 2 đầu; mặc định 30 ngày gần nhất """
+        params = request.query_params if params is None else params
+        today = timezone.localdate(timezone=ZoneInfo(settings.REPORT_TIME_ZONE))
+        start_date, end_date = today - timedelta(days=30), today
         try:
-            if start_str:
-                start_date = datetime.strptime(start_str, '%Y-%m-%d')
-            if end_str:
-                end_date = datetime.strptime(end_str, '%Y-%m-%d')
-                # Chỉnh về cuối ngày (23:59:59) để lấy trọn vẹn dữ liệu ngày kết thúc
-                end_date = end_date.replace(hour=23, minute=59, second=59)
-        except ValueError:
+            if params.get('from_date'):
+                start_date = datetime.strptime(params['from_date'], '%Y-%m-%d').date()
+            if params.get('to_date'):
+                end_date = datetime.strptime(params['to_date'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
             pass # Lỗi định dạng ngày thì dùng mặc định
 
-        # NGOẠI LỆ E1: Ngày bắt đầu > Ngày kết thúc -> Báo lỗi
         if start_date > end_date:
             return None, None, "Ngày bắt đầu không được lớn hơn ngày kết thúc."
-
         return start_date, end_date, None
     @action(detail=False, methods=['get'])
     def tong_quan(self, request):
-        start_date, end_date, error = self._get_date_range(request)
+        """
+        Doanh thu, số đơn, giá trị đơn TB, giảm giá của kỳ chọn so với kỳ trước liền kề (cùng số ngày)
+        và cùng kỳ năm trước (?nam_truoc=1). 1 query cho mọi kỳ (xem api/comparison.py)
+        """
+        start_date, end_date, error = self._get_day_range(request)
         if error: return Response({"error": error}, status=400)
-        # 1. Tính doanh thu kỳ này (Chỉ tính đơn HOAN_THANH)
-        current_revenue = HoaDon.objects.filter(
-            ngay_tao__range=[start_date, end_date], 
-            trang_thai='HOAN_THANH'
-        ).aggregate(total=Sum('thanh_tien'))['total'] or 0
-        # 2. Tính doanh thu kỳ trước (Để so sánh %)
-        # Logic: Nếu lọc 10 ngày, thì lấy 10 ngày trước đó để so sánh
-        duration = end_date - start_date
-        prev_end = start_date - timedelta(seconds=1)
-        prev_start = prev_end - duration
-        
-        prev_revenue = HoaDon.objects.filter(
-            ngay_tao__range=[prev_start, prev_end], 
-            trang_thai='HOAN_THANH'
-        ).aggregate(total=Sum('thanh_tien'))['total'] or 0
-
-        # 3. Tính % Tăng trưởng
-        growth_percent = 0
-        if prev_revenue > 0:
-            growth_percent = ((current_revenue - prev_revenue) / prev_revenue) * 100
-        elif current_revenue > 0:
-            growth_percent = 100 # Trước đó 0, giờ có -> Tăng trưởng tuyệt đối
-
-        return Response({
-            "ky_nay": {
-                "range": f"{start_date.date()} -> {end_date.date()}",
-                "doanh_thu": current_revenue
-            },
-            "ky_truoc": {
-                "range": f"{prev_start.date()} -> {prev_end.date()}",
-                "doanh_thu": prev_revenue
-            },
-            "tang_truong": round(growth_percent, 2) # Làm tròn 2 số lẻ (Ví dụ: 12.55%)
-        })
+        nam_truoc = request.query_params.get('nam_truoc') in ('1', 'true')
+
+        ket_qua = comparison.so_sanh(start_date, end_date, nam_truoc)
+        data = dict(ket_qua, tang_truong=comparison.tang_truong(
+            ket_qua['ky_nay']['doanh_thu'], ket_qua['ky_truoc']['doanh_thu']
+        ))
+        if nam_truoc:
+            data['tang_truong_nam'] = comparison.tang_truong(
+                ket_qua['ky_nay']['doanh_thu'], ket_qua['cung_ky_nam_truoc']['doanh_thu']
+            )
+        return Response(data)
     @action(detail=False, methods=['get'])
     def bieu_do_cot(self, request):
-        """ Trả về doanh thu của từng ngày trong khoảng thời gian chọn """
-        start_date, end_date, error = self._get_date_range(request)
+        """
+        Doanh thu + số đơn theo từng ngày/tuần/tháng (?granularity=day|week|month) trong khoảng chọn,
+        chia theo múi giờ REPORT_TIME_ZONE, bucket không có đơn = 0 (xem api/timeseries.py)
+        """
+        start_date, end_date, error = self._get_day_range(request)
         if error: return Response({"error": error}, status=400)
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in timeseries.GRANULARITY:
+            return Response({"error": "granularity phải là day, week hoặc month."}, status=400)
 
-        data = (
-            HoaDon.objects
-            .filter(ngay_tao__range=[start_date, end_date], trang_thai='HOAN_THANH')
-            .annotate(date=TruncDate('ngay_tao')) # Gom nhóm theo ngày
-            .values('date')
-            .annotate(doanh_thu=Sum('thanh_tien'))
-            .order_by('date')
-        )
-
-        return Response({"data": list(data)})
+        return Response({
+            "granularity": granularity,
+            "time_zone": settings.REPORT_TIME_ZONE,
+            "data": timeseries.doanh_thu(start_date, end_date, granularity),
+        })
     @action(detail=False, methods=['get'])
     def bieu_do_tron(self, request):
-        """ Thống kê xem mỗi Danh mục túi xách chiếm bao nhiêu % doanh thu """
-        start_date, end_date, error = self._get_date_range(request)
+        """ Thống kê xem mỗi Danh mục túi xách chiếm bao nhiêu % doanh thu (chia shard, xem api/reports.py) """
+        start_date, end_date, error = self._get_day_range(request)
         if error: return Response({"error": error}, status=400)
-
-        # Join bảng: ChiTiet -> TuiXach -> DanhMuc -> Group by Tên danh mục
-        data = (
-            ChiTietHoaDon.objects
-            .filter(
-                hoa_don__ngay_tao__range=[start_date, end_date],
-                hoa_don__trang_thai='HOAN_THANH'
-            )
-            .values('tui_xach__danh_muc__ten_danh_muc') 
-            .annotate(value=Sum(F('so_luong') * F('don_gia_luc_ban')))
-            .order_by('-value')
-        )
-        
-        # Format dữ liệu chuẩn để Frontend vẽ
-        formatted_data = [
-            {"name": item['tui_xach__danh_muc__ten_danh_muc'], "value": item['value']}
-            for item in data
-        ]
-        return Response({"data": formatted_data})
+        return Response(reports.tinh('DANH_MUC', start_date, end_date))
     @action(detail=False, methods=['get'])
     def du_lieu_xuat_excel(self, request):
-        """ Trả về dữ liệu chi tiết để xuất file Excel """
-        start_date, end_date, error = self._get_date_range(request)
+        """ Trả về dữ liệu chi tiết để xuất file Excel. Khoảng dài nên dùng job nền (POST bao-cao/) """
+        start_date, end_date, error = self._get_day_range(request)
         if error: return Response({"error": error}, status=400)
 
-        # Lấy danh sách đơn hàng
-        orders = HoaDon.objects.filter(
-            ngay_tao__range=[start_date, end_date], 
-            trang_thai='HOAN_THANH'
-        ).select_related('khach_hang', 'nhan_vien').order_by('-ngay_tao')
-        if not orders.exists():
+        data = reports.tinh('XUAT_EXCEL', start_date, end_date)
+        if not data['data']:
             return Response({"error": "Không có dữ liệu đơn hàng nào để xuất báo cáo."}, status=404)
-        export_data = []
-        for o in orders:
-            export_data.append({
-                "Mã HĐ": o.ma_hoa_don,
-                "Ngày GD": o.ngay_tao.strftime("%d/%m/%Y %H:%M"),
-                "Khách Hàng": o.ho_ten_nguoi_nhan,
-                "SĐT": o.sdt_nguoi_nhan,
-                "Tổng Tiền": o.tong_tien_hang,
-                "Giảm Giá": o.giam_gia,
-                "Thực Thu": o.thanh_tien,
-                "Loại Đơn": o.get_loai_hoa_don_display(),
-                "Người Tạo": o.nhan_vien.username if o.nhan_vien else "Web Online"
-            })
+        return Response(data)
+    @action(detail=False, methods=['post'], url_path='bao-cao')
+    def tao_bao_cao(self, request):
+        """
+        Tạo job báo cáo nền: {"loai": "DANH_MUC" | "XUAT_EXCEL", "from_date", "to_date"} -> 202 + id.
+        Hỏi trạng thái ở bao-cao/<id>/, tải kết quả ở bao-cao/<id>/tai-ve/ khi trang_thai = XONG.
+        """
+        loai = request.data.get('loai')
+        if loai not in reports.LOAI:
+            return Response({"error": f"loai phải là 1 trong: {', '.join(reports.LOAI)}."}, status=400)
+        start_date, end_date, error = self._get_day_range(request, request.data)
+        if error: return Response({"error": error}, status=400)
 
-        return Response({
-            "success": True, 
-            "file_name": f"Bao_Cao_Doanh_Thu_{start_date.date()}_{end_date.date()}.xlsx",
-            "data": export_data
-        })
+        job = reports.tao_job(loai, start_date, end_date, request.user)
+        return Response(BaoCaoJobSerializer(job).data, status=202)
+    def _get_job(self, request, job_id):
+        return get_object_or_404(BaoCaoJob, pk=job_id, nguoi_tao=request.user)
+    @action(detail=False, methods=['get'], url_path=r'bao-cao/(?P<job_id>[0-9a-f-]{36})')
+    def trang_thai_bao_cao(self, request, job_id=None):
+        return Response(BaoCaoJobSerializer(self._get_job(request, job_id)).data)
+    @action(detail=False, methods=['get'], url_path=r'bao-cao/(?P<job_id>[0-9a-f-]{36})/tai-ve')
+    def tai_bao_cao(self, request, job_id=None):
+        job = self._get_job(request, job_id)
+        if job.trang_thai != 'XONG':
+            return Response({"error": "Báo cáo chưa xong.", "trang_thai": job.trang_thai}, status=409)
+        return Response(job.ket_qua)
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Xuất 1 bảng dạng cột cho phân tích offline (xem api/analytics_export.py), stream theo từng row group.
+        ?table=orders|line_items|products|customers &dinh_dang=parquet|arrow &since=<ISO 8601, lọc ngay_cap_nhat>
+        (không dùng ?format=: DRF dành tham số đó cho chọn renderer)
+        Header X-Export-Until: dùng làm ?since= cho lần xuất tăng dần kế tiếp.
+        """
+        bang = request.query_params.get('table', 'orders')
+        dinh_dang = request.query_params.get('dinh_dang', 'parquet')
+        if bang not in analytics_export.BANG:
+            return Response({"error": f"table phải là 1 trong: {', '.join(analytics_export.BANG)}."}, status=400)
+        if dinh_dang not in analytics_export.DINH_DANG:
+            return Response({"error": "dinh_dang phải là parquet hoặc arrow."}, status=400)
+        since = None
+        if request.query_params.get('since'):
+            since = parse_datetime(request.query_params['since'])
+            if since is None:
+                return Response({"error": "since không đúng định dạng ISO 8601."}, status=400)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, ZoneInfo(settings.REPORT_TIME_ZONE))
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return Response({"error": "Server chưa cài pyarrow."}, status=501)
+
+        until = timezone.now()
+        if bang not in analytics_export.BANG_TANG_DAN:
+            since = until = None  # Không có cột cập nhật -> luôn xuất toàn bộ
+        duoi, content_type = analytics_export.DINH_DANG[dinh_dang]
+        response = StreamingHttpResponse(
+            analytics_export.stream(bang, dinh_dang, since, until), content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{bang}.{duoi}"'
+        if until is not None:
+            response['X-Export-Until'] = until.isoformat()
+        return response
 
 
 
@@ -1034,7 +1273,7 @@ class StaffCollectionViewSet(viewsets.ModelViewSet):
         # 3. Lưu vào Database
         try:
             ban_thiet_ke = BanThietKe.objects.create(
-                nguoi_so_huu=request.user,    
+                nguoi_so_huu_id=request.user.id,
                 drive_url=drive_link,         
                 ghi_chu=request.data.get('ghi_chu', ''),
                 trang_thai='BO_SUU_TAP'       
@@ -1076,4 +1315,89 @@ class StaffCollectionViewSet(viewsets.ModelViewSet):
             return super().destroy(request, *args, **kwargs)
             
         except Exception as e:
-            return Response({"error": f"Lỗi khi xóa: {str(e)}"}, status=500)
\ No newline at end of file
+            return Response({"error": f"Lỗi khi xóa: {str(e)}"}, status=500)
+
+
+class PerfHistogramView(APIView):
+    """
+    GET: Histogram thời gian xử lý theo từng view (do PerformanceMiddleware ghi lại, chỉ trong process hiện tại)
+    DELETE: Xóa số liệu để đo lại từ đầu
+    """
+    permission_classes = [IsOwnerUser]
+
+    def get(self, request):
+        return Response({
+            "sample_rate": settings.PERF_SAMPLE_RATE,
+            "views": perf.snapshot()
+        })
+
+    def delete(self, request):
+        perf.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class QueryReportView(APIView):
+    """
+    GET: Báo cáo N+1 / query chậm gom từ các request (cần QUERY_INSPECTOR_ENABLED=1)
+    DELETE: Xóa báo cáo
+    """
+    permission_classes = [IsOwnerUser]
+
+    def get(self, request):
+        return Response({
+            "enabled": settings.QUERY_INSPECTOR_ENABLED,
+            "findings": query_inspector.report.as_list()
+        })
+
+    def delete(self, request):
+        query_inspector.report.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# =========================================================
+# DASHBOARD REALTIME (SERVER-SENT EVENTS)
+# =========================================================
+def _xac_thuc_stream(raw_token):
+    auth = StatelessJWTAuthentication()
+    token = auth.get_validated_token(raw_token)
+    return auth.get_user(token), token['exp']
+
+
+async def _token_con_hieu_luc(raw_token):
+    # Gọi lại mỗi heartbeat: token bị thu hồi (logout) / tài khoản bị khóa -> đóng luồng
+    try:
+        await sync_to_async(_xac_thuc_stream)(raw_token)
+    except AuthenticationFailed:
+        return False
+    return True
+
+
+async def dashboard_events(request):
+    """
+    GET /api/events/dashboard/?token=<access token> - luồng delta KPI cho dashboard chủ cửa hàng (api/events.py).
+    View async thuần Django (DRF chưa hỗ trợ async view), phải chạy qua ASGI: mỗi kết nối là 1 coroutine,
+    dưới WSGI 1 kết nối sẽ giữ chết 1 worker.
+    Luồng đóng khi access token hết hạn hoặc bị thu hồi (event 'het_han') -> client refresh token rồi kết nối lại.
+    ?token= bị config.asgi chuyển sang header Authorization và xóa khỏi query string trước khi uvicorn ghi access
+    log; reverse proxy phía trước phải tự không ghi query string của đường dẫn này (nginx: dùng $uri, không $request_uri).
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Luồng sự kiện chỉ phục vụ qua ASGI (config.asgi)."}, status=501)
+
+    header = request.headers.get('Authorization', '')
+    raw_token = request.GET.get('token') or (header[7:] if header.startswith('Bearer ') else '')
+    try:
+        user, het_han = await sync_to_async(_xac_thuc_stream)(raw_token)
+    except AuthenticationFailed as e:
+        return JsonResponse({"detail": str(e.detail)}, status=401)
+    if not user.is_superuser:  # Giống IsOwnerUser
+        return JsonResponse({"detail": "Bạn không có quyền xem dashboard."}, status=403)
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    await events.dam_bao_nhan()
+    sub, missed = events.broker.subscribe(int(last_id) if last_id and last_id.isdigit() else None)
+    noi_dung = events.stream(sub, missed, het_han=het_han, con_hieu_luc=lambda: _token_con_hieu_luc(raw_token))
+    response = StreamingHttpResponse(noi_dung, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx không gom buffer
+    return response
@@ -0,0 +1,86 @@
+"""
+Làm nóng process trước request đầu tiên (gọi từ gunicorn.conf.py).
+
+Request đầu tiên của 1 worker mới phải trả: compile regex URL, DRF dựng field cho serializer,
+mở kết nối DB, cache rỗng. Sau deploy/autoscale đây là các spike p99. lam_nong() làm sẵn các
+bước đó; với preload_app thì phần lớn chạy 1 lần ở master rồi fork (worker dùng chung bộ nhớ
+theo copy-on-write), worker chỉ còn mở kết nối DB của riêng nó.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.urls import URLResolver, get_resolver
+
+from . import drive_service, perf
+from .sparse_fields import _fields_of
+
+logger = logging.getLogger(__name__)
+
+
+def _compile_urls(resolver=None):
+    """ Truy cập .regex của mọi pattern -> compile sẵn (Django compile lười ở lần resolve đầu) """
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            _compile_urls(pattern)
+
+
+def _serializers():
+    """ Dựng field của serializer mọi ViewSet trong router (kèm cache field của SparseFieldsMixin) """
+    from .urls import router
+
+    for _, viewset, _ in router.registry:
+        serializer_class = getattr(viewset, 'serializer_class', None)
+        if serializer_class is not None:
+            _fields_of(serializer_class)
+
+
+def _ket_noi_db():
+    for conn in connections.all():
+        conn.ensure_connection()
+
+
+def _requests():
+    """ Gọi nội bộ qua toàn bộ middleware/view: nạp cache danh mục, cache bytes đã nén của catalog... """
+    client = Client(HTTP_ACCEPT_ENCODING='br, gzip')
+    for url in getattr(settings, 'WARMUP_URLS', ()):
+        response = client.get(url)
+        if response.status_code >= 400:
+            logger.warning("Warm-up %s -> HTTP %s", url, response.status_code)
+    perf.reset()  # Không tính request làm nóng vào histogram
+
+
+def lam_nong(trong_master=False, chi_ket_noi=False):
+    """
+    trong_master: chạy ở gunicorn master (preload) -> không giữ kết nối DB qua fork, nạp sẵn thư viện Drive
+    chi_ket_noi: worker đã được fork từ master đã làm nóng -> chỉ cần mở kết nối DB
+    Trả về {bước: ms}.
+    """
+    if chi_ket_noi:
+        buoc = [('db', _ket_noi_db)]
+    else:
+        buoc = [('urls', _compile_urls), ('serializers', _serializers), ('requests', _requests)]
+        if trong_master:
+            if drive_service.da_cau_hinh():
+                buoc.append(('drive', drive_service.nap_truoc))
+        else:
+            buoc.append(('db', _ket_noi_db))
+
+    ket_qua = {}
+    for ten, ham in buoc:
+        t0 = time.perf_counter()
+        try:
+            ham()
+        except Exception:
+            # Làm nóng thất bại (DB chưa sẵn sàng...) không được chặn worker khởi động
+            logger.exception("Warm-up '%s' lỗi", ten)
+        ket_qua[ten] = round((time.perf_counter() - t0) * 1000, 1)
+
+    if trong_master:
+        # Kết nối DB không được dùng chung giữa các process sau fork
+        connections.close_all()
+    return ket_qua
@@ -8,9 +8,31 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
 import os
+from urllib.parse import parse_qsl, urlencode
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+def an_token_query_string(app):
+    """
+    EventSource không gửi được header -> dashboard SSE truyền access token qua ?token=.
+    Chuyển token sang header Authorization và xóa khỏi query string ngay trên scope (uvicorn ghi access log
+    từ chính dict scope này) -> token không nằm trong access log.
+    """
+    async def wrapper(scope, receive, send):
+        if scope['type'] == 'http' and b'token=' in scope.get('query_string', b''):
+            params = parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+            token = next((v for k, v in params if k == 'token'), '')
+            scope['query_string'] = urlencode([(k, v) for k, v in params if k != 'token']).encode('latin-1')
+            if token:
+                headers = [(k, v) for k, v in scope['headers'] if k != b'authorization']
+                scope['headers'] = headers + [(b'authorization', f'Bearer {token}'.encode('latin-1'))]
+        await app(scope, receive, send)
+    return wrapper
+
+
+application = an_token_query_string(django_application)
@@ -10,11 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from corsheaders.defaults import default_headers
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "ngrok-skip-browser-warning",
 ]
+# Cho frontend đọc mốc xuất tăng dần của /api/thong-ke/export/
+CORS_EXPOSE_HEADERS = ["X-Export-Until"]
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -56,14 +59,43 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.PerformanceMiddleware',
+    'api.query_inspector.QueryInspectorMiddleware',
 ]
 
+# Cache dùng chung giữa các worker/process (Redis). Không đặt REDIS_URL -> LocMemCache riêng từng process
+# (chỉ hợp cho dev/test: xóa cache, thu hồi token, tăng phiên bản báo cáo không tới được process khác)
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Nén response API (api.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = 1024
+# Response chứa token: không nén (tránh tấn công BREACH)
+COMPRESSION_EXCLUDE_PATHS = ('/api/login/', '/api/token/refresh/', '/api/register/')
+# Catalog: cache bytes đã nén theo hash nội dung, không nén lại mỗi lần
+COMPRESSION_CACHE_PATHS = ('/api/products/', '/api/categories/')
+COMPRESSION_CACHE_TTL = 300
+
+# Đo hiệu năng từng request (Server-Timing + log + histogram theo view)
+# 0 = tắt, 1 = đo tất cả, 0.1 = đo ngẫu nhiên 10% request
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', '0'))
+PERF_HISTOGRAM_WINDOW = 1000  # Số mẫu gần nhất giữ lại để tính p50/p95/p99
+
+# Phát hiện N+1 / query chậm (chỉ nên bật ở dev/staging)
+QUERY_INSPECTOR_ENABLED = os.environ.get('QUERY_INSPECTOR_ENABLED') == '1'
+QUERY_INSPECTOR_THRESHOLD = 3   # Cùng 1 dạng query lặp >= 3 lần trong 1 request -> nghi N+1
+QUERY_INSPECTOR_SLOW_MS = 100   # Query chạy lâu hơn 100ms -> query chậm
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -96,6 +128,9 @@ DATABASES = {
         # 'HOST': '127.0.0.1',    
         'HOST': 'db',       
         'PORT': '3306',           
+        # Giữ kết nối giữa các request (warm-up mở sẵn kết nối cho worker), kiểm tra lại trước khi dùng
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'charset': 'utf8mb4',  
@@ -103,10 +138,30 @@ DATABASES = {
     }
 }
 
+# Chạy local / benchmark không cần MySQL: DJANGO_DB_ENGINE=sqlite python manage.py ...
+if os.environ.get('DJANGO_DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
 # Cấu hình DRF để sử dụng JWT Authentication
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Đọc quyền từ claim trong token, không query auth_user mỗi request (xem api/authentication.py)
+        'api.authentication.StatelessJWTAuthentication',
+    ),
+    # JSON qua orjson (tự rơi về json của Python nếu chưa cài), giữ Browsable API để debug
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
     # Tuỳ chọn: Mặc định API nào cũng cần đăng nhập (nếu muốn)
     # 'DEFAULT_PERMISSION_CLASSES': (
@@ -119,7 +174,44 @@ from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60), # Token sống 60 phút
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),    # Refresh token sống 1 ngày
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.MyTokenRefreshSerializer',
 }
+# False -> quay về cách cũ: load User từ DB ở mỗi request có token
+JWT_STATELESS_AUTH = True
+# Trạng thái user (khóa/đổi quyền) được cache tối đa 30 giây trước khi kiểm tra lại DB;
+# không có cache dùng chung thì access token logout ở process khác cũng bị từ chối chậm nhất sau chừng đó
+JWT_REVOCATION_CHECK_TTL = 30
+# Bloom filter blacklist refresh token (api/tokens.py): nạp lại tối đa sau 30 giây, chứa ~100k jti
+JWT_BLACKLIST_FILTER_TTL = 30
+JWT_BLACKLIST_FILTER_CAPACITY = 100000
+# API danh sách chỉ đọc dựng JSON từ .values() (api/fast_serializers.py); False -> dùng ModelSerializer như cũ
+FAST_LIST_SERIALIZERS = True
+# `python manage.py check_startup`: ngưỡng boot/RSS của 1 worker và các module phải import lười (chỉ load khi dùng)
+STARTUP_MAX_BOOT_MS = 1000
+STARTUP_MAX_RSS_MB = 90
+STARTUP_LAZY_MODULES = ('googleapiclient', 'google.oauth2', 'google_auth_oauthlib')
+# api/warmup.py gọi sẵn các URL này khi worker khởi động (nạp cache danh mục + catalog đã nén)
+WARMUP_URLS = ('/api/categories/', '/api/products/')
+# Dashboard realtime (api/events.py): "host:port" UDP của process ASGI phục vụ /api/events/,
+# để trống -> phân phối trong process (chạy cả API lẫn stream trên cùng 1 process ASGI)
+SSE_BROKER_ADDR = os.environ.get('SSE_BROKER_ADDR', '')
+SSE_HEARTBEAT = 15  # giây
+# Đơn đã đóng cũ hơn số tháng này được chuyển sang bảng lưu trữ (`python manage.py archive_orders`)
+ORDER_ARCHIVE_MONTHS = 18
+# Số thread upload ảnh lên Drive song song khi nhập sản phẩm hàng loạt (api/bulk_import.py)
+IMPORT_UPLOAD_WORKERS = 8
+# Số dòng tối đa mỗi lần gọi POST /api/tui-xach/dieu-chinh/
+BULK_ADJUST_MAX_ITEMS = 5000
+# Mốc khoảng giá cho /api/products/facets/ (khoảng cuối: từ mốc cuối trở lên)
+FACET_PRICE_BUCKETS = (0, 1000000, 2000000, 5000000, 10000000)
+# Cache so sánh kỳ đã đóng (api/comparison.py): 1 ngày với cache dùng chung, 60 giây khi chỉ có LocMemCache
+COMPARISON_CACHE_TTL = 86400
+COMPARISON_LOCAL_CACHE_TTL = 60
+# Múi giờ dùng để chia ngày/tuần/tháng trong báo cáo doanh thu (server vẫn lưu UTC)
+REPORT_TIME_ZONE = 'Asia/Ho_Chi_Minh'
+# Báo cáo khoảng dài (api/reports.py): chia shard N ngày, chạy song song trên N thread (mỗi thread 1 connection DB)
+REPORT_SHARD_DAYS = 31
+REPORT_SHARD_WORKERS = 4
 
 
 # Password validation
@@ -164,3 +256,14 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.perf': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -0,0 +1,29 @@
+"""
+Cấu hình gunicorn, tự được đọc khi chạy `gunicorn config.wsgi:application` trong thư mục gốc project.
+
+preload_app: load Django và làm nóng 1 lần ở master (api/warmup.py) rồi mới fork ->
+worker mới (deploy, autoscale, max_requests) sẵn sàng ngay, bộ nhớ đã import dùng chung giữa các worker.
+Tắt bằng GUNICORN_PRELOAD=0 (mỗi worker tự load + làm nóng).
+"""
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    # Chạy ở master sau khi app đã load (preload), trước khi fork worker
+    if not server.cfg.preload_app:
+        return
+    from api.warmup import lam_nong
+
+    server.log.info("Warm-up master: %s", lam_nong(trong_master=True))
+    # Đưa object đã có vào generation vĩnh viễn: GC của worker không chạm vào (không ghi refcount/gc header)
+    # -> các trang nhớ dùng chung không bị copy-on-write tách ra
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    from api.warmup import lam_nong
+
+    worker.log.info("Warm-up worker %s: %s", worker.pid, lam_nong(chi_ket_noi=worker.cfg.preload_app))